@@ -0,0 +1,133 @@
+# applier.py
+# Settings changes for main.py, off the polling path. Each miner has its own apply
+# queue with at most one request in flight and one change waiting behind it:
+# - a newer decision merges into the waiting change (latest target wins), so only
+#   one POST goes out; a change whose settings all get overwritten is reported
+#   superseded;
+# - a failed request is retried at a later tick with exponential backoff, at most
+#   `retries` times, then reported failed;
+# - a request that went through is checked against the device's next status poll:
+#   confirmed, or failed_verify when the miner reports other settings;
+# - when a reload removes the miner, whatever is still pending is reported superseded.
+# Nothing here sleeps, blocks or writes logs: main.py calls step() once per poll of
+# the device and logs the outcomes, so ticks stay on time however many miners are
+# being retuned.
+from __future__ import annotations
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from bitaxe_api import BitaxeAPI
+from models import Sample
+
+# Settings being changed: {"frequency": MHz} and/or {"core_voltage": mV}
+Target = Dict[str, int]
+# (outcome, target), outcome = confirmed | failed_verify | failed | superseded
+Outcome = Tuple[str, Target]
+
+_SAMPLE_FIELDS = {"frequency": "freq", "core_voltage": "vcore"}
+
+def _covers(new: Target, old: Target) -> bool:
+    return old.keys() <= new.keys()
+
+class DeviceApplier:
+    def __init__(self, api: BitaxeAPI, submit: Callable[..., Future], retries: int = 2,
+                 backoff_s: float = 5.0, max_backoff_s: float = 60.0):
+        self.api = api
+        self.retries = retries
+        self.backoff_s = backoff_s
+        self.max_backoff_s = max_backoff_s
+        self._submit = submit
+        self._inflight: Optional[Future] = None
+        self._sending: Optional[Target] = None  # in flight, or waiting for a retry
+        self._queued: Optional[Target] = None   # newer change behind the request in flight
+        self._verify: Optional[Target] = None   # sent, waiting for the next poll
+        self._attempts = 0
+        self._retry_at = 0.0
+
+    def pending(self) -> Target:
+        """Settings the miner is being moved to and not confirmed yet (newest wins)."""
+        out: Target = {}
+        for t in (self._verify, self._sending, self._queued):
+            if t:
+                out.update(t)
+        return out
+
+    def request(self, target: Target, t: float) -> List[Outcome]:
+        """Queue a change decided at epoch t; returns the outcomes it settles (superseded)."""
+        out: List[Outcome] = []
+        if self._inflight is not None:
+            self._queued = self._merge(self._queued, target, out)
+            return out
+        self._sending = self._merge(self._sending, target, out)
+        self._attempts = 0
+        self._supersede_verify(out)
+        self._send()
+        return out
+
+    def step(self, sample: Optional[Sample], t: float) -> List[Outcome]:
+        """Advance after a poll of the device (sample None = no answer) at epoch t."""
+        out: List[Outcome] = []
+        if self._verify is not None and sample is not None:
+            # The apply had finished before this poll was sent
+            ok = all(getattr(sample, _SAMPLE_FIELDS[k]) == v for k, v in self._verify.items())
+            out.append(("confirmed" if ok else "failed_verify", self._verify))
+            self._verify = None
+
+        fut = self._inflight
+        if fut is not None and fut.done():
+            self._inflight = None
+            if fut.exception() is None:
+                self._verify, self._sending, self._attempts = self._sending, None, 0
+            else:
+                self._attempts += 1
+                if self._attempts > self.retries:
+                    out.append(("failed", self._sending))
+                    self._sending, self._attempts = None, 0
+                else:
+                    self._retry_at = t + min(self.max_backoff_s, self.backoff_s * 2 ** (self._attempts - 1))
+
+        if self._inflight is None:
+            if self._queued is not None:
+                # A newer decision goes out now, replacing any retry still waiting
+                self._sending = self._merge(self._sending, self._queued, out)
+                self._queued = None
+                self._attempts = 0
+                self._supersede_verify(out)
+                self._send()
+            elif self._sending is not None and t >= self._retry_at:
+                self._send()
+        return out
+
+    def when_idle(self, fn: Callable[[], Any]) -> None:
+        """Run fn now, or once the request in flight has finished."""
+        if self._inflight is None or self._inflight.done():
+            fn()
+        else:
+            self._inflight.add_done_callback(lambda _: fn())
+
+    def abandon(self) -> List[Outcome]:
+        """Give up on every change not confirmed yet (device removed); reported superseded.
+
+        A request in flight still finishes, but its result is not checked.
+        """
+        out: List[Outcome] = [("superseded", t) for t in (self._verify, self._sending, self._queued) if t]
+        self._verify = self._sending = self._queued = None
+        self._attempts = 0
+        return out
+
+    def _merge(self, old: Optional[Target], new: Target, out: List[Outcome]) -> Target:
+        if old is None:
+            return dict(new)
+        if _covers(new, old):
+            out.append(("superseded", old))
+        return {**old, **new}
+
+    def _supersede_verify(self, out: List[Outcome]) -> None:
+        # The next poll may already show the newer settings
+        if self._verify is not None and _covers(self._sending, self._verify):
+            out.append(("superseded", self._verify))
+            self._verify = None
+
+    def _send(self) -> None:
+        tgt = self._sending
+        self._inflight = self._submit(self.api.set_settings, tgt.get("frequency"), tgt.get("core_voltage"))
@@ -2,89 +2,119 @@
 # Offline analysis/backtest from metrics logs, using the same decision engine as main.py.
 # Usage:
 #   python3 backtest.py --log bitaxe_logs/<name>/20260116.log --out decisions.csv
+#   python3 backtest.py --device-dir bitaxe_logs/<name> --from 2026-01-01 --to 2026-01-31
+#   python3 backtest.py --log ... --engine numpy   # vectorized replay (needs numpy)
+#   python3 backtest.py --device-dir ... --format bin --engine numpy   # memory-mapped .bin columns
+# A --device-dir range is streamed across daily files (constant memory with the
+# scalar engine) and the FIFO window carries over at midnight.
 from __future__ import annotations
 import argparse
-from datetime import datetime
-from typing import List, Optional
 from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List
 import csv
 
 from models import Sample
 from decision_engine import decide
+from rules import compile_rules
+from history import MultiResHistory
+from log_reader import daily_files, iter_device_samples, iter_log_file, iter_samples, parse_when
+
+def read_samples(path: str) -> List[Sample]:
+    return list(iter_log_file(path))
+
+# Default cfg aligned with what we discussed; tune later
+DEFAULT_CFG: Dict[str, Any] = {
+    "freq_min": 400,
+    "freq_max": 1100,
+    "vcore_min": 1000,
+    "vcore_max": 1400,
+    "freq_step": 25,
+    "vcore_step": 10,
+    "asic_soft": 65.0,
+    "asic_hard": 68.0,
+    "vr_soft": 78.0,
+    "vr_hard": 82.0,
+    "err_low": 0.6,
+    "err_high": 1.0,
+    "err_crit": 1.3,
+    "slope_limit": 0.01,
+    "drift_horizon_s": 0,  # drift rule off; > 0 replays it with a MultiResHistory (scalar engine)
+    "allow_ramp_up": False,
+}
+
+CSV_HEADER = ["ts","tempAvg","vrTempAvg","errAvg","slope","freq","vcore","decision","newFreq","newVcore","reason"]
 
-def _parse_ts(s: str) -> float:
-    # "YYYY-MM-DD HH:MM:SS"
-    return datetime.strptime(s, "%Y-%m-%d %H:%M:%S").timestamp()
+def _engine_cfg(window: int) -> Dict[str, Any]:
+    cfg = dict(DEFAULT_CFG)
+    cfg["window_n_min_valid"] = max(8, window // 2)
+    return cfg
 
-def _read_samples(path: str) -> List[Sample]:
-    out: List[Sample] = []
-    with open(path, "r", encoding="utf-8") as f:
-        header = f.readline().strip()
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            parts = line.split(";")
-            if len(parts) != 6:
-                continue
-            ts, temp, vr, err, freq, vcore = parts
-            if temp == "NA" or vr == "NA" or err == "NA" or freq == "NA" or vcore == "NA":
-                continue
-            out.append(Sample(
-                ts=_parse_ts(ts),
-                temp=float(temp),
-                vr_temp=float(vr),
-                err=float(err),
-                freq=int(freq),
-                vcore=int(vcore),
-            ))
-    return out
+def scalar_rows(samples: Iterable[Sample], cfg: Dict[str, Any], window: int, apply_every: int) -> Iterator[list]:
+    # Two-pass reference statistics: this path is what --engine numpy is checked against
+    fifo = deque(maxlen=window)
+    history = MultiResHistory() if cfg.get("drift_horizon_s", 0) > 0 else None
+    # A custom rule table (engine "rules") runs compiled; the default table is decide() itself
+    engine = compile_rules(cfg) if "rules" in cfg else None
+    for i, s in enumerate(samples, start=1):
+        fifo.append(s)
+        if history is not None:
+            history.append(s)
+        if i % apply_every != 0:
+            continue
+        d = engine.decide(list(fifo), cfg, history) if engine is not None else decide(list(fifo), cfg, history)
+        yield [
+            datetime.fromtimestamp(s.ts).strftime("%Y-%m-%d %H:%M:%S"),
+            d.temp_avg, d.vr_temp_avg, d.err_avg, d.slope,
+            s.freq, s.vcore,
+            d.action, d.new_freq, d.new_vcore, d.reason
+        ]
 
 def main():
     p = argparse.ArgumentParser(description="BitaxeLiveOptimizer - backtest decisions on a metrics log")
-    p.add_argument("--log", required=True, help="Path to a metrics log file (timestamp;temp;vrTemp;...)")
+    src = p.add_mutually_exclusive_group(required=True)
+    src.add_argument("--log", help="Path to a metrics log file (timestamp;temp;vrTemp;...)")
+    src.add_argument("--device-dir", help="Device folder of daily logs (<logs_dir>/<name>), read across days")
+    p.add_argument("--from", dest="start", default=None, help="Start, inclusive (YYYY-MM-DD[ HH:MM:SS])")
+    p.add_argument("--to", dest="end", default=None, help="End, exclusive; a bare date includes that day")
+    p.add_argument("--format", choices=["log", "bin"], default="log", help="Daily file format for --device-dir (default log)")
     p.add_argument("--out", default="decisions.csv", help="Output CSV (default decisions.csv)")
     p.add_argument("--apply-every", type=int, default=12, help="Apply/decide every N samples (default 12)")
     p.add_argument("--window", type=int, default=12, help="FIFO window size N (default 12)")
+    p.add_argument("--engine", choices=["scalar", "numpy"], default="scalar",
+                   help="scalar = decide() per step; numpy = vectorized replay, same rows (default scalar)")
     args = p.parse_args()
 
-    # Default cfg aligned with what we discussed; tune later
-    cfg = {
-        "freq_min": 400,
-        "freq_max": 1100,
-        "vcore_min": 1000,
-        "vcore_max": 1400,
-        "freq_step": 25,
-        "vcore_step": 10,
-        "window_n_min_valid": max(8, args.window // 2),
-        "asic_soft": 65.0,
-        "asic_hard": 68.0,
-        "vr_soft": 78.0,
-        "vr_hard": 82.0,
-        "err_low": 0.6,
-        "err_high": 1.0,
-        "err_crit": 1.3,
-        "slope_limit": 0.01,
-        "allow_ramp_up": False,
-    }
+    cfg = _engine_cfg(args.window)
+    start = parse_when(args.start) if args.start else None
+    end = parse_when(args.end, end=True) if args.end else None
+    t0 = start.timestamp() if start else None
+    t1 = end.timestamp() if end else None
+    suffix = "." + args.format
+    if args.device_dir:
+        samples = iter_device_samples(args.device_dir, start, end, suffix)
+    else:
+        samples = iter_samples(args.log, t0, t1)
 
-    samples = _read_samples(args.log)
-    fifo = deque(maxlen=args.window)
+    if args.engine == "numpy":
+        try:
+            from backtest_numpy import numpy_rows
+        except ImportError:
+            p.error("--engine numpy requires numpy (pip install numpy)")
+        bin_files = daily_files(args.device_dir, start, end, suffix) if args.device_dir else [Path(args.log)]
+        if all(f.suffix == ".bin" for f in bin_files):
+            # Straight from the memory-mapped columns, no Sample objects
+            from metrics_bin import load_columns
+            samples = load_columns(bin_files, t0, t1)
+        rows = numpy_rows(samples, cfg, args.window, args.apply_every)
+    else:
+        rows = scalar_rows(samples, cfg, args.window, args.apply_every)
 
     with open(args.out, "w", newline="", encoding="utf-8") as f:
         w = csv.writer(f)
-        w.writerow(["ts","tempAvg","vrTempAvg","errAvg","slope","freq","vcore","decision","newFreq","newVcore","reason"])
-        for i, s in enumerate(samples, start=1):
-            fifo.append(s)
-            if i % args.apply_every != 0:
-                continue
-            d = decide(list(fifo), cfg)
-            w.writerow([
-                datetime.fromtimestamp(s.ts).strftime("%Y-%m-%d %H:%M:%S"),
-                d.temp_avg, d.vr_temp_avg, d.err_avg, d.slope,
-                s.freq, s.vcore,
-                d.action, d.new_freq, d.new_vcore, d.reason
-            ])
+        w.writerow(CSV_HEADER)
+        w.writerows(rows)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,217 @@
+# backtest_numpy.py
+# Vectorized backtest engine (optional, needs numpy).
+#
+# Samples are loaded into column arrays; rolling means and least-squares slopes at
+# every decision point come from cumulative sums, and the rule cascade of
+# decision_engine.decide is evaluated for all decision points at once with the same
+# priority order. The rows produced are the ones backtest.scalar_rows would write:
+# same decision points, actions, new settings and reasons; averages agree within
+# 1e-9 relative and slopes within 1e-10 °C/s. Decision points whose stats
+# land within _GUARD of a threshold (e.g. an error average of exactly 1.0) are
+# re-run through decide() itself, so rounding can never flip a decision.
+#
+# Cumulative sums are taken per chunk, with time and values relative to the start of
+# the chunk, so precision does not degrade over months of samples.
+from __future__ import annotations
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator
+
+import numpy as np
+
+from decision_engine import decide
+from models import Sample
+
+ACTIONS = ("NO_CHANGE", "FREQ_DOWN", "VCORE_DOWN", "FREQ_UP")
+REASONS = (
+    "window_insufficient",
+    "temp_hard",
+    "at_min_limits_temp_hard",
+    "slope_exceeded",
+    "err_crit",
+    "at_min_limits_err_crit",
+    "err_high",
+    "margin",
+    "stable",
+)
+
+# Samples per cumulative-sum chunk (at least a few windows long)
+_CHUNK = 8192
+# Stats closer than this to a threshold are re-checked with the scalar engine
+_GUARD = 1e-9
+
+def load_columns(samples: Iterable[Sample]) -> Dict[str, np.ndarray]:
+    samples = list(samples)
+    n = len(samples)
+    return {
+        "ts": np.fromiter((s.ts for s in samples), dtype=np.float64, count=n),
+        "temp": np.fromiter((s.temp for s in samples), dtype=np.float64, count=n),
+        "vr_temp": np.fromiter((s.vr_temp for s in samples), dtype=np.float64, count=n),
+        "err": np.fromiter((s.err for s in samples), dtype=np.float64, count=n),
+        "freq": np.fromiter((s.freq for s in samples), dtype=np.int64, count=n),
+        "vcore": np.fromiter((s.vcore for s in samples), dtype=np.int64, count=n),
+    }
+
+def rolling_stats(cols: Dict[str, np.ndarray], ends: np.ndarray, window: int) -> Dict[str, np.ndarray]:
+    """Window stats for windows ending at sample indices `ends` (inclusive)."""
+    starts = np.maximum(ends - window + 1, 0)
+    m = len(ends)
+    out = {
+        "n": (ends - starts + 1).astype(np.int64),
+        "temp_avg": np.empty(m),
+        "vr_avg": np.empty(m),
+        "err_avg": np.empty(m),
+        "slope_temp": np.empty(m),
+        "slope_vr": np.empty(m),
+    }
+    chunk = max(_CHUNK, 4 * window)
+    a = 0
+    while a < m:
+        # Decision points whose windows end inside this chunk of samples
+        b = int(np.searchsorted(ends, ends[a] + chunk, side="left"))
+        b = max(b, a + 1)
+        lo = int(starts[a])
+        hi = int(ends[b - 1]) + 1
+        s = starts[a:b] - lo
+        e = ends[a:b] - lo + 1
+        n = out["n"][a:b].astype(np.float64)
+
+        t = cols["ts"][lo:hi] - cols["ts"][lo]
+        cs_t = np.concatenate(([0.0], np.cumsum(t)))
+        cs_tt = np.concatenate(([0.0], np.cumsum(t * t)))
+        st = cs_t[e] - cs_t[s]
+        stt = cs_tt[e] - cs_tt[s]
+        den = n * stt - st * st
+        flat = den <= 1e-12 * n * stt
+
+        for metric, avg_key, slope_key in (
+            ("temp", "temp_avg", "slope_temp"),
+            ("vr_temp", "vr_avg", "slope_vr"),
+            ("err", "err_avg", None),
+        ):
+            y0 = cols[metric][lo]
+            y = cols[metric][lo:hi] - y0
+            cs_y = np.concatenate(([0.0], np.cumsum(y)))
+            sy = cs_y[e] - cs_y[s]
+            out[avg_key][a:b] = y0 + sy / n
+            if slope_key is not None:
+                cs_ty = np.concatenate(([0.0], np.cumsum(t * y)))
+                sty = cs_ty[e] - cs_ty[s]
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    sl = (n * sty - st * sy) / den
+                sl[flat | (n < 2)] = 0.0
+                out[slope_key][a:b] = sl
+        a = b
+    return out
+
+def _clamp(v: np.ndarray, lo: int, hi: int) -> np.ndarray:
+    return np.clip(v, lo, hi)
+
+def evaluate(cols: Dict[str, np.ndarray], cfg: Dict[str, Any], window: int, apply_every: int) -> Dict[str, np.ndarray]:
+    """Run the decide() cascade at every apply_every-th sample."""
+    ends = np.arange(apply_every - 1, len(cols["ts"]), apply_every, dtype=np.int64)
+    st = rolling_stats(cols, ends, window)
+    temp_avg, vr_avg, err_avg = st["temp_avg"], st["vr_avg"], st["err_avg"]
+    slope = np.maximum(st["slope_temp"], st["slope_vr"])
+    freq = cols["freq"][ends]
+    vcore = cols["vcore"][ends]
+
+    f_down = _clamp(freq - cfg["freq_step"], cfg["freq_min"], cfg["freq_max"])
+    f_up = _clamp(freq + cfg["freq_step"], cfg["freq_min"], cfg["freq_max"])
+    v_down = _clamp(vcore - cfg["vcore_step"], cfg["vcore_min"], cfg["vcore_max"])
+    can_fd = f_down != freq
+    can_vd = v_down != vcore
+    can_fu = f_up != freq
+
+    insufficient = st["n"] < cfg["window_n_min_valid"]
+    hard = (temp_avg >= cfg["asic_hard"]) | (vr_avg >= cfg["vr_hard"])
+    soft = (temp_avg >= cfg["asic_soft"]) | (vr_avg >= cfg["vr_soft"])
+    slope_hit = (slope >= cfg["slope_limit"]) & soft & can_fd
+    crit = err_avg >= cfg["err_crit"]
+    high = (err_avg >= cfg["err_high"]) & can_fd
+    if cfg.get("allow_ramp_up", False):
+        up = (err_avg <= cfg["err_low"]) & (temp_avg <= cfg["asic_soft"]) & (vr_avg <= cfg["vr_soft"]) & (slope < cfg["slope_limit"]) & can_fu
+    else:
+        up = np.zeros(len(ends), dtype=bool)
+
+    # Same priority order as decision_engine.decide; first match wins
+    cascade = [
+        (insufficient, 0, 0),
+        (hard & can_fd, 1, 1),
+        (hard & can_vd, 2, 1),
+        (hard, 0, 2),
+        (slope_hit, 1, 3),
+        (crit & can_fd, 1, 4),
+        (crit & can_vd, 2, 4),
+        (crit, 0, 5),
+        (high, 1, 6),
+        (up, 3, 7),
+    ]
+    conds = [c for c, _, _ in cascade]
+
+    near = np.zeros(len(ends), dtype=bool)
+    for x, keys in (
+        (temp_avg, ("asic_hard", "asic_soft")),
+        (vr_avg, ("vr_hard", "vr_soft")),
+        (err_avg, ("err_crit", "err_high", "err_low")),
+        (slope, ("slope_limit",)),
+    ):
+        for k in keys:
+            near |= np.abs(x - cfg[k]) <= _GUARD * max(1.0, abs(cfg[k]))
+    near &= ~insufficient
+
+    action = np.select(conds, [a for _, a, _ in cascade], default=0)
+    reason = np.select(conds, [r for _, _, r in cascade], default=8)
+
+    return {
+        "idx": ends,
+        "insufficient": insufficient,
+        "near": near,
+        "temp_avg": temp_avg,
+        "vr_avg": vr_avg,
+        "err_avg": err_avg,
+        "slope": slope,
+        "freq": freq,
+        "vcore": vcore,
+        "action": action,
+        "reason": reason,
+        "new_freq": np.where(action == 3, f_up, f_down),
+        "new_vcore": v_down,
+    }
+
+def _window_samples(cols: Dict[str, np.ndarray], end: int, window: int) -> list:
+    return [
+        Sample(ts=float(cols["ts"][i]), temp=float(cols["temp"][i]), vr_temp=float(cols["vr_temp"][i]),
+               err=float(cols["err"][i]), freq=int(cols["freq"][i]), vcore=int(cols["vcore"][i]))
+        for i in range(max(0, end - window + 1), end + 1)
+    ]
+
+def numpy_rows(samples: Iterable[Sample], cfg: Dict[str, Any], window: int, apply_every: int) -> Iterator[list]:
+    if cfg.get("drift_horizon_s", 0) > 0:
+        raise ValueError("the numpy engine does not replay the drift rule; use the scalar engine")
+    if "rules" in cfg:
+        raise ValueError("the numpy engine only replays the default rules; use the scalar engine")
+    cols = samples if isinstance(samples, dict) else load_columns(samples)
+    r = evaluate(cols, cfg, window, apply_every)
+    ts = cols["ts"]
+    for k in range(len(r["idx"])):
+        end = int(r["idx"][k])
+        ts_s = datetime.fromtimestamp(float(ts[end])).strftime("%Y-%m-%d %H:%M:%S")
+        freq, vcore = int(r["freq"][k]), int(r["vcore"][k])
+        if r["near"][k]:
+            d = decide(_window_samples(cols, end, window), cfg)
+            yield [ts_s, d.temp_avg, d.vr_temp_avg, d.err_avg, d.slope, freq, vcore,
+                   d.action, d.new_freq, d.new_vcore, d.reason]
+            continue
+        action = ACTIONS[r["action"][k]]
+        stats = [None] * 4 if r["insufficient"][k] else [
+            float(r["temp_avg"][k]), float(r["vr_avg"][k]), float(r["err_avg"][k]), float(r["slope"][k])
+        ]
+        yield [
+            ts_s,
+            *stats,
+            freq, vcore,
+            action,
+            int(r["new_freq"][k]) if action in ("FREQ_DOWN", "FREQ_UP") else None,
+            int(r["new_vcore"][k]) if action == "VCORE_DOWN" else None,
+            REASONS[r["reason"][k]],
+        ]
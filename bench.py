@@ -0,0 +1,257 @@
+# bench.py
+# Benchmarks of the optimizer's hot paths, saved as JSON baselines and compared
+# across versions / machines (run before and after an upgrade on the same board).
+#
+# Cases:
+#   decide/list/<n>, decide/rolling/<n>   decision_engine.decide at window sizes 12..100k
+#   read/<days>d, read_dir/<days>d        backtest.read_samples / iter_device_samples on synthetic logs
+#   write/<devices>x/<policy>             DailyFileWriter.write, one line per device per call
+#   tick/<miners>                         one tick of main.run (poll, logs, rules, applies) against simulator.py
+# Times are seconds per call, best (min) and median of the repeats; lower is better.
+# compare uses the best time by default: it is the least sensitive to other load on the board.
+#
+# Usage:
+#   python3 bench.py run --out bench/before.json [--quick] [--only decide,read]
+#   python3 bench.py compare bench/before.json bench/after.json [--threshold 0.10]
+# compare exits with status 1 when a case got slower by more than the threshold.
+from __future__ import annotations
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import timeit
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from backtest import DEFAULT_CFG, read_samples
+from decision_engine import decide
+from log_reader import iter_device_samples
+from log_utils import METRICS_HEADER, DailyFileWriter, fmt_ts
+from models import Sample
+from rolling import RollingWindow
+
+CASES = ("decide", "read", "write", "tick")
+
+def _measure(fn: Callable[[], Any], repeat: int = 5) -> Dict[str, Any]:
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    times = [t / number for t in timer.repeat(repeat, number)]
+    return {"median_s": statistics.median(times), "min_s": min(times), "number": number, "repeat": repeat}
+
+def _synthetic(n: int, t0: float = 1.7e9, step_s: float = 5.0, seed: int = 1) -> List[Sample]:
+    rng = random.Random(seed)
+    temp, vr = 60.0, 70.0
+    out = []
+    for i in range(n):
+        temp += rng.gauss(0, 0.05) - (temp - 60.0) * 0.01
+        vr += rng.gauss(0, 0.05) - (vr - 70.0) * 0.01
+        out.append(Sample(t0 + i * step_s, round(temp, 2), round(vr, 2), round(abs(rng.gauss(0.3, 0.1)), 3), 525, 1150))
+    return out
+
+def _bench_decide(quick: bool, **_: Any) -> Dict[str, Dict[str, Any]]:
+    sizes = [12, 120, 1000, 10000] + ([] if quick else [100000])
+    cfg = dict(DEFAULT_CFG, window_n_min_valid=8)
+    res = {}
+    for n in sizes:
+        samples = _synthetic(n)
+        win = RollingWindow(n)
+        for s in samples:
+            win.append(s)
+        res[f"decide/list/{n}"] = _measure(lambda: decide(samples, cfg))
+        res[f"decide/rolling/{n}"] = _measure(lambda: decide(win, cfg))
+    return res
+
+def _write_log(folder: Path, samples: List[Sample], daily: bool) -> None:
+    folder.mkdir(parents=True, exist_ok=True)
+    fh, day = None, None
+    for s in samples:
+        now = datetime.fromtimestamp(s.ts)
+        d = now.strftime("%Y%m%d") if daily else "all"
+        if d != day:
+            if fh:
+                fh.close()
+            fh = open(folder / f"{d}.log", "w", encoding="utf-8", newline="\n")
+            fh.write(METRICS_HEADER + "\n")
+            day = d
+        fh.write(f"{fmt_ts(now)};{s.temp};{s.vr_temp};{s.err};{s.freq};{s.vcore}\n")
+    if fh:
+        fh.close()
+
+def _bench_read(quick: bool, tmp: Path, **_: Any) -> Dict[str, Dict[str, Any]]:
+    days = 1 if quick else 3
+    samples = _synthetic(days * 17280)  # 5 s polls
+    _write_log(tmp / "read_one", samples, daily=False)
+    _write_log(tmp / "read_dir", samples, daily=True)
+    one = str(tmp / "read_one" / "all.log")
+    return {
+        f"read/{days}d": _measure(lambda: read_samples(one), repeat=3),
+        f"read_dir/{days}d": _measure(lambda: sum(1 for _ in iter_device_samples(tmp / "read_dir")), repeat=3),
+    }
+
+def _bench_write(quick: bool, tmp: Path, **_: Any) -> Dict[str, Dict[str, Any]]:
+    devices = 20 if quick else 100
+    line = "2026-01-01 00:00:00;60.25;70.5;0.31;525;1150"
+    now = datetime.now()
+    res = {}
+    for policy, kw in (("every_line", {}), ("buffered", {"flush_lines": 50, "flush_bytes": 65536})):
+        writers = [DailyFileWriter(tmp / f"write_{policy}", f"dev{i:03d}", METRICS_HEADER, **kw) for i in range(devices)]
+
+        def one_round():
+            for w in writers:
+                w.write(now, line)
+
+        res[f"write/{devices}x/{policy}"] = _measure(one_round)
+        for w in writers:
+            w.close()
+    return res
+
+class _BenchDone(Exception):
+    pass
+
+class _BenchTicks:
+    """main.run tick scheduler that fires at once and times each tick (wait() to on_tick)."""
+    def __init__(self, ticks: int):
+        self.ticks = ticks
+        self.times: List[float] = []
+        self._k = 0
+        self._t = 0.0
+
+    def wait(self):
+        if self._k > self.ticks:
+            raise _BenchDone()
+        self._k += 1
+        self._t = time.perf_counter()
+        return self._t, 0
+
+    def done(self) -> None:
+        # The first tick probes endpoints and opens connections: not timed
+        if self._k > 1:
+            self.times.append(time.perf_counter() - self._t)
+
+def _bench_tick(quick: bool, tmp: Path, sim_port: int, **_: Any) -> Dict[str, Dict[str, Any]]:
+    import signal
+    import main
+    from simulator import SimFleet
+
+    miners = 10 if quick else 50
+    ticks = 20 if quick else 50
+    fleet = SimFleet(miners, sim_port, seed=1)
+    # The real loop: concurrent polls, metrics and decisions writers, batched rule table
+    # and the apply queues (a decision every tick, so applies are part of the cost)
+    cfg = {
+        "logs_dir": str(tmp / "tick"),
+        "log_metrics": True,
+        "timeout_s": 2,
+        "tick_deadline_s": 2,
+        "window_n": 12,
+        "apply_every_n": 1,
+        "devices": fleet.devices(),
+        "engine": dict(DEFAULT_CFG, window_n_min_valid=1),
+    }
+    sched = _BenchTicks(ticks)
+    sigterm = signal.getsignal(signal.SIGTERM)
+    try:
+        main.run(cfg, ticks=sched, on_tick=sched.done)
+    except _BenchDone:
+        pass
+    finally:
+        signal.signal(signal.SIGTERM, sigterm)
+        fleet.stop()
+    times = sorted(sched.times)
+    return {f"tick/{miners}": {
+        "median_s": statistics.median(times), "min_s": times[0],
+        "p95_s": times[min(len(times) - 1, int(0.95 * len(times)))], "number": 1, "repeat": len(times),
+    }}
+
+def run(only: List[str], quick: bool, sim_port: int) -> Dict[str, Any]:
+    benches = {"decide": _bench_decide, "read": _bench_read, "write": _bench_write, "tick": _bench_tick}
+    results: Dict[str, Dict[str, Any]] = {}
+    with tempfile.TemporaryDirectory(prefix="bxbench_") as tmp:
+        for name in only:
+            t = time.perf_counter()
+            results.update(benches[name](quick=quick, tmp=Path(tmp), sim_port=sim_port))
+            print(f"[bench] {name} done in {time.perf_counter() - t:.1f}s", file=sys.stderr)
+    return {
+        "meta": {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "quick": quick,
+        },
+        "results": results,
+    }
+
+def _fmt(s: float) -> str:
+    if s >= 1:
+        return f"{s:.3f}s"
+    if s >= 1e-3:
+        return f"{s * 1e3:.3f}ms"
+    return f"{s * 1e6:.2f}us"
+
+def compare(base: Dict[str, Any], new: Dict[str, Any], threshold: float, stat: str = "min_s") -> int:
+    b, n = base["results"], new["results"]
+    regressions = 0
+    print(f"{'case':32} {'base':>12} {'new':>12} {'ratio':>7}")
+    for case in sorted(set(b) | set(n)):
+        if case not in b or case not in n:
+            print(f"{case:32} {'only in ' + ('base' if case in b else 'new'):>33}")
+            continue
+        old_s, new_s = b[case][stat], n[case][stat]
+        ratio = new_s / old_s if old_s > 0 else float("inf")
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        elif ratio < 1 - threshold:
+            flag = "  faster"
+        print(f"{case:32} {_fmt(old_s):>12} {_fmt(new_s):>12} {ratio:>6.2f}x{flag}")
+    if base["meta"].get("machine") != new["meta"].get("machine") or base["meta"].get("python") != new["meta"].get("python"):
+        print(f"note: base ran on {base['meta'].get('machine')} / Python {base['meta'].get('python')}, "
+              f"new on {new['meta'].get('machine')} / Python {new['meta'].get('python')}")
+    print(f"{regressions} regression(s) beyond {threshold:.0%}")
+    return 1 if regressions else 0
+
+def main():
+    p = argparse.ArgumentParser(description="BitaxeLiveOptimizer - benchmarks")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    r = sub.add_parser("run", help="Run the benchmarks and save a JSON baseline")
+    r.add_argument("--out", default=None, help="Write results to this JSON file")
+    r.add_argument("--only", default=",".join(CASES), help=f"Comma-separated cases (default {','.join(CASES)})")
+    r.add_argument("--quick", action="store_true", help="Smaller sizes (skips the 100k window, fewer miners)")
+    r.add_argument("--sim-port", type=int, default=18500, help="First localhost port for the tick case (default 18500)")
+    c = sub.add_parser("compare", help="Compare two baselines")
+    c.add_argument("base")
+    c.add_argument("new")
+    c.add_argument("--threshold", type=float, default=0.10, help="Relative slowdown reported as regression (default 0.10)")
+    c.add_argument("--stat", choices=["min", "median"], default="min", help="Time compared per case (default min)")
+    args = p.parse_args()
+
+    if args.cmd == "compare":
+        base = json.loads(Path(args.base).read_text(encoding="utf-8"))
+        new = json.loads(Path(args.new).read_text(encoding="utf-8"))
+        sys.exit(compare(base, new, args.threshold, args.stat + "_s"))
+
+    only = [x.strip() for x in args.only.split(",") if x.strip()]
+    unknown = set(only) - set(CASES)
+    if unknown:
+        p.error(f"unknown case(s): {', '.join(sorted(unknown))}")
+    data = run(only, args.quick, args.sim_port)
+    print(f"{'case':32} {'best':>12} {'median':>12}")
+    for case, res in data["results"].items():
+        print(f"{case:32} {_fmt(res['min_s']):>12} {_fmt(res['median_s']):>12}")
+    if args.out:
+        Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.out).write_text(json.dumps(data, indent=2), encoding="utf-8")
+        print(f"Saved to {args.out}")
+
+if __name__ == "__main__":
+    main()
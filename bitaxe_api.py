@@ -1,35 +1,146 @@
 # bitaxe_api.py
 # Minimal AxeOS HTTP client. Endpoints can vary by firmware; we try common ones.
+# The first endpoint that answers is remembered per miner (and so is the field-name
+# dialect of its status payload), so a steady-state poll is a single request.
+# Endpoints are probed again after repeated failures or a firmware version change.
+# Requests, errors and probes are recorded in instrument.STATS (no-op unless enabled).
+# get_status/set_settings run on poller threads while pick_fields runs on the loop
+# thread, so the remembered endpoints and dialect are only replaced under _lock.
 from __future__ import annotations
-from dataclasses import dataclass
-from typing import Any, Dict, Optional
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Tuple
 import requests
 
+from instrument import STATS
+
+STATUS_ENDPOINTS = ["/api/system/status", "/api/status", "/api/v1/status"]
+SETTINGS_ENDPOINTS = ["/api/system/settings", "/api/settings", "/api/v1/settings"]
+
+# Status field -> accepted keys, in preference order
+STATUS_FIELDS = {
+    "temp": ("temp", "asicTemp", "asic_temp"),
+    "vr": ("vrTemp", "vrmTemp", "vr_temp", "vrm_temp"),
+    "err": ("errorPercentage", "errorPercent", "error_percentage", "errPercent"),
+    "freq": ("frequency", "freq", "asicFrequency"),
+    "vcore": ("coreVoltage", "core_voltage", "vcore", "voltage"),
+}
+
 @dataclass
 class BitaxeAPI:
     ip: str
     timeout_s: float = 5.0
     session: Optional[requests.Session] = None
+    # Consecutive failures of the remembered status endpoint before probing again
+    reprobe_after: int = 3
+    # Label for instrumentation (config name); defaults to the IP
+    name: str = ""
+
+    _status_ep: Optional[str] = None
+    _settings_ep: Optional[str] = None
+    # Status field -> (remembered key, keys preferred over it)
+    _dialect: Optional[Dict[str, Tuple[str, Tuple[str, ...]]]] = None
+    _firmware: Optional[str] = None
+    _failures: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
 
     def __post_init__(self):
         if self.session is None:
             self.session = requests.Session()
 
+    def close(self) -> None:
+        """Close the HTTP session (pooled connections to the miner)."""
+        self.session.close()
+
     def _base(self) -> str:
         return f"http://{self.ip}"
 
+    def forget_endpoints(self) -> None:
+        with self._lock:
+            self._status_ep = None
+            self._settings_ep = None
+            self._dialect = None
+            self._failures = 0
+
+    def _label(self) -> str:
+        return self.name or self.ip
+
+    def _get_json(self, ep: str) -> Dict[str, Any]:
+        with STATS.time("bitaxe_status_seconds", device=self._label()):
+            r = self.session.get(self._base() + ep, timeout=self.timeout_s)
+        r.raise_for_status()
+        return r.json()
+
+    def _seen_firmware(self, status: Dict[str, Any]) -> None:
+        fw = status.get("version")
+        if fw != self._firmware:
+            with self._lock:
+                if self._firmware is not None:
+                    # The status endpoint obviously still works; the rest may have moved
+                    self._settings_ep = None
+                    self._dialect = None
+                self._firmware = fw
+
     def get_status(self) -> Dict[str, Any]:
-        endpoints = ["/api/system/status", "/api/status", "/api/v1/status"]
+        if self._status_ep is not None:
+            try:
+                status = self._get_json(self._status_ep)
+            except Exception as e:
+                STATS.inc("bitaxe_status_errors_total", device=self._label(), error=type(e).__name__)
+                with self._lock:
+                    self._failures += 1
+                    reprobe = self._failures >= self.reprobe_after
+                if reprobe:
+                    self.forget_endpoints()
+                raise RuntimeError(f"Unable to fetch status from {self.ip}: {e}")
+            with self._lock:
+                self._failures = 0
+            self._seen_firmware(status)
+            return status
+
+        STATS.inc("bitaxe_endpoint_probes_total", device=self._label(), kind="status")
         last = None
-        for ep in endpoints:
+        for ep in STATUS_ENDPOINTS:
             try:
-                r = self.session.get(self._base() + ep, timeout=self.timeout_s)
-                r.raise_for_status()
-                return r.json()
+                status = self._get_json(ep)
             except Exception as e:
                 last = e
+                continue
+            with self._lock:
+                self._status_ep = ep
+                self._failures = 0
+            self._seen_firmware(status)
+            return status
+        STATS.inc("bitaxe_status_errors_total", device=self._label(), error=type(last).__name__)
         raise RuntimeError(f"Unable to fetch status from {self.ip}: {last}")
 
+    def pick_fields(self, status: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Return raw {temp, vr, err, freq, vcore} values, or None if a field is missing."""
+        cached = self._dialect
+        if cached is not None:
+            out = {}
+            for name, (key, better) in cached.items():
+                v = status.get(key)
+                # A preferred key showing up again wins over the remembered one
+                if v is None or any(status.get(b) is not None for b in better):
+                    break
+                out[name] = v
+            else:
+                return out
+        dialect: Dict[str, Tuple[str, Tuple[str, ...]]] = {}
+        out = {}
+        for name, keys in STATUS_FIELDS.items():
+            for i, k in enumerate(keys):
+                if status.get(k) is not None:
+                    dialect[name] = (k, keys[:i])
+                    out[name] = status[k]
+                    break
+            else:
+                return None
+        with self._lock:
+            self._dialect = dialect
+        return out
+
     def set_settings(self, frequency: Optional[int] = None, core_voltage: Optional[int] = None) -> None:
         payload: Dict[str, Any] = {}
         if frequency is not None:
@@ -38,13 +149,28 @@ class BitaxeAPI:
             payload["coreVoltage"] = int(core_voltage)
         if not payload:
             return
-        endpoints = ["/api/system/settings", "/api/settings", "/api/v1/settings"]
+        # Applies are rare, so a failing remembered endpoint falls back to a full probe at once
+        remembered = self._settings_ep
+        endpoints = list(SETTINGS_ENDPOINTS)
+        if remembered is not None:
+            endpoints.remove(remembered)
+            endpoints.insert(0, remembered)
+        else:
+            STATS.inc("bitaxe_endpoint_probes_total", device=self._label(), kind="settings")
         last = None
         for ep in endpoints:
             try:
-                r = self.session.post(self._base() + ep, json=payload, timeout=self.timeout_s)
+                with STATS.time("bitaxe_settings_seconds", device=self._label()):
+                    r = self.session.post(self._base() + ep, json=payload, timeout=self.timeout_s)
                 r.raise_for_status()
+                with self._lock:
+                    self._settings_ep = ep
                 return
             except Exception as e:
+                if ep == remembered:
+                    STATS.inc("bitaxe_endpoint_probes_total", device=self._label(), kind="settings")
                 last = e
+        STATS.inc("bitaxe_settings_errors_total", device=self._label(), error=type(last).__name__)
+        with self._lock:
+            self._settings_ep = None
         raise RuntimeError(f"Unable to set settings on {self.ip}: {last}")
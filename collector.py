@@ -1,41 +1,82 @@
 # collector.py
 # Generates metrics logs for later analysis/backtest.
-# Usage: python3 collector.py <IP> --duration 24h --interval 5
+# Usage:
+#   python3 collector.py <IP> --duration 24h --interval 5 [--format log|bin|both]
+#   python3 collector.py --config config.json --duration 7d [--stagger]   # every device of config.json
+#
+# Polls run at a fixed rate on the monotonic clock (see scheduler.py): the period
+# does not stretch with request latency, rows carry the scheduled tick time, and
+# ticks that cannot be served (previous poll of that miner still running, or the
+# process fell behind) are written as NA and reported as missed.
 from __future__ import annotations
 import argparse
+import signal
+import sys
 import time
-from datetime import datetime, timedelta
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from datetime import datetime
 from pathlib import Path
 from typing import Any, Dict, Optional
 
 from bitaxe_api import BitaxeAPI
-from log_utils import DailyFileWriter, METRICS_HEADER, fmt_ts
+from config_loader import load_config
+from log_utils import BackgroundWriter, DailyFileWriter, METRICS_HEADER, fmt_ts
+from metrics_bin import DailyBinaryWriter
+from rollup import compact_metrics
+from scheduler import FleetScheduler
 from timeparse import parse_duration_to_seconds
 
-def _extract(status: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-    def pick(*keys):
-        for k in keys:
-            if k in status and status[k] is not None:
-                return status[k]
-        return None
+def _extract(api: BitaxeAPI, status: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     try:
-        temp = pick("temp", "asicTemp", "asic_temp")
-        vr = pick("vrTemp", "vrmTemp", "vr_temp", "vrm_temp")
-        err = pick("errorPercentage", "errorPercent", "error_percentage", "errPercent")
-        freq = pick("frequency", "freq", "asicFrequency")
-        vcore = pick("coreVoltage", "core_voltage", "vcore", "voltage")
-        if None in (temp, vr, err, freq, vcore):
+        f = api.pick_fields(status)
+        if f is None:
             return None
         return {
-            "temp": float(temp),
-            "vrTemp": float(vr),
-            "errorPercentage": float(err),
-            "frequency": int(freq),
-            "coreVoltage": int(vcore),
+            "temp": float(f["temp"]),
+            "vrTemp": float(f["vr"]),
+            "errorPercentage": float(f["err"]),
+            "frequency": int(f["freq"]),
+            "coreVoltage": int(f["vcore"]),
         }
     except Exception:
         return None
 
+def _row(now: datetime, fields: Optional[Dict[str, Any]]) -> str:
+    if not fields:
+        return f"{fmt_ts(now)};NA;NA;NA;NA;NA"
+    return (
+        f"{fmt_ts(now)};"
+        f"{fields['temp']};{fields['vrTemp']};{fields['errorPercentage']};"
+        f"{fields['frequency']};{fields['coreVoltage']}"
+    )
+
+def _collect(st: Dict[str, Any], now: datetime) -> None:
+    fields = None
+    try:
+        status = st["api"].get_status()
+        fields = _extract(st["api"], status)
+    except Exception:
+        fields = None
+    with st["lock"]:
+        for writer in st["writers"]:
+            writer.write(now, _row(now, fields))
+        # Ticks skipped while this poll was running come after it in the file
+        for gap in st["gaps"]:
+            for writer in st["writers"]:
+                writer.write(gap, _row(gap, None))
+        st["gaps"].clear()
+        st["busy"] = False
+
+def _gap(st: Dict[str, Any], now: datetime) -> None:
+    # Caller holds st["lock"]
+    if st["busy"]:
+        st["gaps"].append(now)
+    else:
+        for writer in st["writers"]:
+            writer.write(now, _row(now, None))
+
 def main():
     p = argparse.ArgumentParser(
         description=(
@@ -43,43 +84,106 @@ def main():
             "Duration default unit is seconds if digits only (e.g. 3600). You can also use 5s, 10min, 2h, 1d."
         )
     )
-    p.add_argument("ip", help="Bitaxe IP address")
+    p.add_argument("ip", nargs="?", default=None, help="Bitaxe IP address (or use --config)")
+    p.add_argument("--config", default=None, help="Collect every device of this config.json")
     p.add_argument("--name", default=None, help="Bitaxe name (folder). Default: IP")
-    p.add_argument("--outdir", default="bitaxe_logs", help="Base directory for logs")
-    p.add_argument("--interval", type=float, default=5.0, help="Poll interval (default 5s)")
+    p.add_argument("--outdir", default=None, help="Base directory for logs (default: logs_dir of --config, else bitaxe_logs)")
+    p.add_argument("--interval", type=float, default=None, help="Poll interval (default: poll_interval_s of --config, else 5s)")
     p.add_argument("--duration", default="24h", help="How long to run (default 24h)")
-    p.add_argument("--timeout", type=float, default=5.0, help="HTTP timeout (default 5s)")
-    p.add_argument("--keep-days", type=int, default=30, help="Keep last N daily files (default 30)")
+    p.add_argument("--timeout", type=float, default=None, help="HTTP timeout (default: timeout_s of --config, else 5s)")
+    p.add_argument("--keep-days", type=int, default=None, help="Keep last N daily files (default: keep_days of --config, else 30)")
+    p.add_argument("--stagger", action="store_true", help="Spread device polls evenly across the interval")
+    p.add_argument("--format", choices=["log", "bin", "both"], default="log",
+                   help="log = YYYYMMDD.log, bin = compact YYYYMMDD.bin (see metrics_bin.py), both (default log)")
+    p.add_argument("--flush-lines", type=int, default=1, help="Flush after N lines (default 1 = every line)")
+    p.add_argument("--flush-latency", type=float, default=0.0, help="Also flush lines older than N seconds (default off)")
+    p.add_argument("--rollup", action="store_true",
+                   help="Roll expiring daily files into 1m/1h aggregates before deleting them (default: rollup section of --config)")
     args = p.parse_args()
 
-    api = BitaxeAPI(args.ip, timeout_s=args.timeout)
-    name = args.name or args.ip
-    writer = DailyFileWriter(Path(args.outdir), name, METRICS_HEADER, keep_days=args.keep_days)
+    if (args.ip is None) == (args.config is None):
+        p.error("give either an IP or --config")
+    cfg = load_config(args.config) if args.config else {}
+    devices = cfg.get("devices") or [{"name": args.name or args.ip, "ip": args.ip}]
 
-    end = datetime.now() + timedelta(seconds=parse_duration_to_seconds(args.duration))
+    def opt(value, key, default):
+        return value if value is not None else cfg.get(key, default)
 
-    try:
-        while datetime.now() < end:
-            now = datetime.now()
-            fields = None
-            try:
-                status = api.get_status()
-                fields = _extract(status)
-            except Exception:
-                fields = None
+    outdir = Path(opt(args.outdir, "logs_dir", "bitaxe_logs"))
+    interval = float(opt(args.interval, "poll_interval_s", 5.0))
+    timeout = float(opt(args.timeout, "timeout_s", 5.0))
+    keep_days = int(opt(args.keep_days, "keep_days", 30))
+    rollup_cfg = cfg.get("rollup")
+    if args.rollup and rollup_cfg is None:
+        rollup_cfg = {}
+    on_expire = None
+    if rollup_cfg is not None:
+        keep_1m = int(rollup_cfg.get("keep_1m_months", 12))
+        on_expire = partial(compact_metrics, keep_1m_months=keep_1m)
+
+    # Polls complete on pool threads, so all disk I/O goes through one writer thread
+    bg = BackgroundWriter()
+    flush_kw = {"flush_lines": args.flush_lines, "flush_latency_s": args.flush_latency}
+    state: Dict[str, Dict[str, Any]] = {}
+    sched = FleetScheduler()
+    start = time.monotonic()
+    for i, d in enumerate(devices):
+        writers = []
+        if args.format in ("log", "both"):
+            writers.append(bg.wrap(DailyFileWriter(outdir, d["name"], METRICS_HEADER, keep_days=keep_days,
+                                                   on_expire=on_expire, **flush_kw)))
+        if args.format in ("bin", "both"):
+            # With both formats the text file already feeds the rollup
+            writers.append(bg.wrap(DailyBinaryWriter(outdir, d["name"], keep_days=keep_days,
+                                                     on_expire=on_expire if args.format == "bin" else None, **flush_kw)))
+        state[d["name"]] = {
+            "api": BitaxeAPI(d["ip"], timeout_s=timeout),
+            "writers": writers,
+            "lock": threading.Lock(),
+            "busy": False,
+            "gaps": [],
+        }
+        sched.add(d["name"], interval, phase_s=(i * interval / len(devices)) if args.stagger else 0.0)
 
-            if not fields:
-                row = f"{fmt_ts(now)};NA;NA;NA;NA;NA"
-            else:
-                row = (
-                    f"{fmt_ts(now)};"
-                    f"{fields['temp']};{fields['vrTemp']};{fields['errorPercentage']};"
-                    f"{fields['frequency']};{fields['coreVoltage']}"
-                )
-            writer.write(now, row)
-            time.sleep(max(0.0, args.interval))
+    pool = ThreadPoolExecutor(max_workers=min(256, len(devices)), thread_name_prefix="collect")
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+    # Wall-clock timestamps derived from the monotonic schedule, so rows of all miners line up
+    wall_offset = time.time() - time.monotonic()
+    end = start + parse_duration_to_seconds(args.duration)
+
+    try:
+        while True:
+            fired = sched.wait()
+            if not fired:
+                continue
+            if fired[0][1] >= end:
+                break
+            for name, tick, missed in fired:
+                st = state[name]
+                now = datetime.fromtimestamp(wall_offset + tick)
+                with st["lock"]:
+                    if missed:
+                        print(f"[collector] {name}: {missed} tick(s) missed, process fell behind", file=sys.stderr)
+                        for k in range(missed, 0, -1):
+                            _gap(st, datetime.fromtimestamp(wall_offset + tick - k * interval))
+                    if st["busy"]:
+                        # Miner still answering an earlier tick: record the gap instead of queueing
+                        sched.missed[name] += 1
+                        print(f"[collector] {name}: tick missed, previous poll still running", file=sys.stderr)
+                        _gap(st, now)
+                        continue
+                    st["busy"] = True
+                pool.submit(_collect, st, now)
     finally:
-        writer.close()
+        pool.shutdown(wait=True, cancel_futures=True)
+        for st in state.values():
+            for writer in st["writers"]:
+                writer.close()
+        bg.close()
+        total = sum(sched.missed.values())
+        if total:
+            print("[collector] missed ticks: " + ", ".join(f"{k}={v}" for k, v in sched.missed.items() if v), file=sys.stderr)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,61 @@
+# config_loader.py
+# Loads config.json. The file is documented inline with // comments, which plain
+# json.loads rejects, so comments are stripped first (text inside strings is kept).
+from __future__ import annotations
+import json
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple, Union
+
+def strip_comments(text: str) -> str:
+    out = []
+    i, n = 0, len(text)
+    in_str = False
+    while i < n:
+        c = text[i]
+        if in_str:
+            out.append(c)
+            if c == "\\" and i + 1 < n:
+                out.append(text[i + 1])
+                i += 2
+                continue
+            if c == '"':
+                in_str = False
+        elif c == '"':
+            in_str = True
+            out.append(c)
+        elif c == "/" and text.startswith("//", i):
+            nl = text.find("\n", i)
+            i = n if nl < 0 else nl
+            continue
+        else:
+            out.append(c)
+        i += 1
+    return "".join(out)
+
+def load_config(path: Union[str, Path]) -> Dict[str, Any]:
+    return json.loads(strip_comments(Path(path).read_text(encoding="utf-8")))
+
+class ConfigWatcher:
+    """Change detection for a config file: one stat() per check (mtime and size)."""
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self._sig = self._stat()
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = self.path.stat()
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def changed(self) -> Optional[Dict[str, Any]]:
+        """The new config if the file changed since the last call, else None.
+
+        Raises what load_config raises. The change is consumed either way: a file
+        caught half-written is retried when the editor's next write lands.
+        """
+        sig = self._stat()
+        if sig is None or sig == self._sig:
+            return None
+        self._sig = sig
+        return load_config(self.path)
@@ -3,10 +3,12 @@
 # You will tune thresholds later; for now it avoids stupid moves.
 from __future__ import annotations
 from dataclasses import dataclass
-from typing import Deque, Dict, Any, List, Tuple
+from typing import Deque, Dict, Any, List, Optional, Tuple, Union
 import math
 
 from models import Sample, Decision
+from rolling import RollingWindow
+from history import MultiResHistory
 
 def _linreg_slope(ts: List[float], ys: List[float]) -> float:
     n = len(ts)
@@ -21,22 +23,35 @@ def _linreg_slope(ts: List[float], ys: List[float]) -> float:
 def _clamp(v: int, lo: int, hi: int) -> int:
     return max(lo, min(hi, v))
 
-def decide(window: List[Sample], cfg: Dict[str, Any]) -> Decision:
-    """Return a Decision based on a FIFO window of valid samples."""
+def decide(window: Union[List[Sample], RollingWindow], cfg: Dict[str, Any],
+           history: Optional[MultiResHistory] = None) -> Decision:
+    """Return a Decision based on a FIFO window of valid samples.
+
+    A RollingWindow is read in O(1) from its running sums; a plain list is
+    reduced with the two-pass reference formulas. The optional long-horizon
+    history only feeds the drift rule (enabled by cfg["drift_horizon_s"] > 0).
+    """
     if len(window) < cfg["window_n_min_valid"]:
         return Decision(action="NO_CHANGE", reason="window_insufficient")
 
-    temps = [s.temp for s in window]
-    vrs = [s.vr_temp for s in window]
-    errs = [s.err for s in window]
-    ts = [s.ts for s in window]
+    if isinstance(window, RollingWindow):
+        temp_avg = window.mean("temp")
+        vr_avg = window.mean("vr_temp")
+        err_avg = window.mean("err")
+        slope_asic = window.slope("temp")
+        slope_vr = window.slope("vr_temp")
+    else:
+        temps = [s.temp for s in window]
+        vrs = [s.vr_temp for s in window]
+        errs = [s.err for s in window]
+        ts = [s.ts for s in window]
 
-    temp_avg = sum(temps) / len(temps)
-    vr_avg = sum(vrs) / len(vrs)
-    err_avg = sum(errs) / len(errs)
+        temp_avg = sum(temps) / len(temps)
+        vr_avg = sum(vrs) / len(vrs)
+        err_avg = sum(errs) / len(errs)
 
-    slope_asic = _linreg_slope(ts, temps)
-    slope_vr = _linreg_slope(ts, vrs)
+        slope_asic = _linreg_slope(ts, temps)
+        slope_vr = _linreg_slope(ts, vrs)
     slope = max(slope_asic, slope_vr)
 
     cur = window[-1]
@@ -75,11 +90,66 @@ def decide(window: List[Sample], cfg: Dict[str, Any]) -> Decision:
         if new_freq != freq:
             return Decision("FREQ_DOWN", new_freq=new_freq, reason="err_high", temp_avg=temp_avg, vr_temp_avg=vr_avg, err_avg=err_avg, slope=slope)
 
+    # --- Priority 4: slow ambient drift (optional, needs the multi-resolution history) ---
+    # The long-horizon warming rate is projected drift_horizon_s ahead of the current averages.
+    drifting = False
+    if history is not None and cfg.get("drift_horizon_s", 0) > 0:
+        level = cfg.get("drift_level", "15m")
+        a = history.stats(level, "temp")
+        v = history.stats(level, "vr_temp")
+        if a is not None and v is not None and a.buckets >= cfg.get("drift_min_buckets", 4):
+            proj_a = temp_avg + max(0.0, a.slope) * cfg["drift_horizon_s"]
+            proj_v = vr_avg + max(0.0, v.slope) * cfg["drift_horizon_s"]
+            drifting = proj_a >= cfg["asic_soft"] or proj_v >= cfg["vr_soft"]
+            if proj_a >= cfg["asic_hard"] or proj_v >= cfg["vr_hard"]:
+                new_freq = _clamp(freq - cfg["freq_step"], cfg["freq_min"], cfg["freq_max"])
+                if new_freq != freq:
+                    return Decision("FREQ_DOWN", new_freq=new_freq, reason="drift", temp_avg=temp_avg, vr_temp_avg=vr_avg, err_avg=err_avg, slope=slope)
+
     # --- Optional gentle up (disabled by default) ---
-    if cfg.get("allow_ramp_up", False):
+    if cfg.get("allow_ramp_up", False) and not drifting:
         if err_avg <= cfg["err_low"] and temp_avg <= cfg["asic_soft"] and vr_avg <= cfg["vr_soft"] and slope < cfg["slope_limit"]:
             new_freq = _clamp(freq + cfg["freq_step"], cfg["freq_min"], cfg["freq_max"])
             if new_freq != freq:
                 return Decision("FREQ_UP", new_freq=new_freq, reason="margin", temp_avg=temp_avg, vr_temp_avg=vr_avg, err_avg=err_avg, slope=slope)
 
     return Decision("NO_CHANGE", reason="stable", temp_avg=temp_avg, vr_temp_avg=vr_avg, err_avg=err_avg, slope=slope)
+
+# Engine keys poll_interval() reads; main.py requires them when adaptive_poll is on
+POLL_INTERVAL_KEYS = ("asic_soft", "vr_soft", "err_low", "err_high")
+
+def poll_interval(window: Union[List[Sample], RollingWindow], cfg: Dict[str, Any],
+                  min_s: float, max_s: float, margin_c: float = 10.0) -> float:
+    """Poll period for a device: max_s while well inside the limits, min_s near them.
+
+    Pressure (0..1) is the higher of: ASIC/VR temperature within margin_c below its
+    soft limit, error rate between err_low and err_high. Temperatures are projected
+    max_s ahead along the warming slope, so a miner heating toward the limits
+    speeds up before it gets there (sensor noise on a cool miner does not). The
+    period is interpolated geometrically. Too few samples polls at min_s.
+    """
+    if len(window) < cfg["window_n_min_valid"]:
+        return min_s
+    if isinstance(window, RollingWindow):
+        temp_avg = window.mean("temp")
+        vr_avg = window.mean("vr_temp")
+        err_avg = window.mean("err")
+        slope = max(window.slope("temp"), window.slope("vr_temp"))
+    else:
+        n = len(window)
+        ts = [s.ts for s in window]
+        temp_avg = sum(s.temp for s in window) / n
+        vr_avg = sum(s.vr_temp for s in window) / n
+        err_avg = sum(s.err for s in window) / n
+        slope = max(_linreg_slope(ts, [s.temp for s in window]), _linreg_slope(ts, [s.vr_temp for s in window]))
+
+    def frac(v: float, lo: float, hi: float) -> float:
+        return 1.0 if hi <= lo else min(1.0, max(0.0, (v - lo) / (hi - lo)))
+
+    ahead = max(0.0, slope) * max_s
+    pressure = max(
+        frac(temp_avg + ahead, cfg["asic_soft"] - margin_c, cfg["asic_soft"]),
+        frac(vr_avg + ahead, cfg["vr_soft"] - margin_c, cfg["vr_soft"]),
+        frac(err_avg, cfg["err_low"], cfg["err_high"]),
+    )
+    return min_s * (max_s / min_s) ** (1.0 - pressure)
@@ -0,0 +1,150 @@
+# history.py
+# Multi-resolution per-device history for slow (ambient, day/night) drift.
+# The decision window keeps the last window_n raw samples; this keeps hours to
+# days of history as fixed-size rings of closed buckets at coarser resolutions:
+#
+#   level  bucket  buckets  horizon
+#   1m       60 s      120     2 h
+#   15m     900 s       96    24 h
+#   1h     3600 s      168     7 d
+#
+# Every bucket holds the sample count, the summed timestamp offset and, per metric
+# (temp, vr_temp, err), sum/min/max: 12 doubles. The rings are preallocated, so a
+# device costs HISTORY_BYTES (~36 KB) whatever its uptime or the poll interval.
+# append() is O(levels); stats() is O(buckets of one level), called once per decision.
+from __future__ import annotations
+from array import array
+from dataclasses import dataclass
+from typing import Dict, Optional, Sequence, Tuple
+
+from models import Sample
+from rolling import METRICS
+
+LEVELS: Tuple[Tuple[str, float, int], ...] = (("1m", 60.0, 120), ("15m", 900.0, 96), ("1h", 3600.0, 168))
+
+# Bucket layout: start, n, sum(t - start), then sum/min/max per metric
+_FIELDS = 3 + 3 * len(METRICS)
+
+@dataclass(frozen=True)
+class LevelStats:
+    mean: float
+    min: float
+    max: float
+    slope: float  # per second, least squares over bucket means
+    buckets: int
+    span_s: float
+
+class Level:
+    def __init__(self, name: str, res_s: float, capacity: int):
+        if res_s <= 0 or capacity < 1:
+            raise ValueError("res_s must be > 0 and capacity >= 1")
+        self.name = name
+        self.res_s = res_s
+        self.capacity = capacity
+        self._ring = array("d", bytes(8 * _FIELDS * capacity))
+        self._head = 0   # next slot to write
+        self._size = 0
+        self._cur = array("d", bytes(8 * _FIELDS))
+        self._cur_open = False
+
+    def __len__(self) -> int:
+        """Closed buckets plus the open one."""
+        return self._size + (1 if self._cur_open else 0)
+
+    def nbytes(self) -> int:
+        return (len(self._ring) + len(self._cur)) * self._ring.itemsize
+
+    def push(self, s: Sample) -> None:
+        start = (s.ts // self.res_s) * self.res_s
+        cur = self._cur
+        if self._cur_open and start > cur[0]:
+            self._close()
+        if not self._cur_open:
+            cur[0], cur[1], cur[2] = start, 0.0, 0.0
+            for i, m in enumerate(METRICS):
+                y = getattr(s, m)
+                cur[3 + 3 * i] = 0.0
+                cur[4 + 3 * i] = y
+                cur[5 + 3 * i] = y
+            self._cur_open = True
+        # A sample older than the open bucket (clock step back) is folded into it
+        cur[1] += 1
+        cur[2] += s.ts - cur[0]
+        for i, m in enumerate(METRICS):
+            y = getattr(s, m)
+            cur[3 + 3 * i] += y
+            if y < cur[4 + 3 * i]:
+                cur[4 + 3 * i] = y
+            if y > cur[5 + 3 * i]:
+                cur[5 + 3 * i] = y
+
+    def _close(self) -> None:
+        o = self._head * _FIELDS
+        self._ring[o:o + _FIELDS] = self._cur
+        self._head = (self._head + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+        self._cur_open = False
+
+    def _buckets(self):
+        # Oldest first; the open bucket last. While it is open the oldest closed
+        # bucket is dropped, so the level never spans more than capacity buckets.
+        size = self._size
+        if self._cur_open and size == self.capacity:
+            size -= 1
+        for k in range(size):
+            o = ((self._head - size + k) % self.capacity) * _FIELDS
+            yield self._ring[o:o + _FIELDS]
+        if self._cur_open:
+            yield self._cur
+
+    def stats(self, metric: str) -> Optional[LevelStats]:
+        i = METRICS.index(metric)
+        n_b = 0
+        count = 0.0
+        total = 0.0
+        lo = float("inf")
+        hi = float("-inf")
+        t0 = None
+        # Regression of bucket means on their mean timestamps (relative to the first)
+        st = stt = sy = sty = 0.0
+        t_last = 0.0
+        for b in self._buckets():
+            n = b[1]
+            if n <= 0:
+                continue
+            t_abs = b[0] + b[2] / n
+            if t0 is None:
+                t0 = t_abs
+            t = t_abs - t0
+            y = b[3 + 3 * i] / n
+            n_b += 1
+            count += n
+            total += b[3 + 3 * i]
+            lo = min(lo, b[4 + 3 * i])
+            hi = max(hi, b[5 + 3 * i])
+            st += t
+            stt += t * t
+            sy += y
+            sty += t * y
+            t_last = t
+        if n_b == 0:
+            return None
+        den = n_b * stt - st * st
+        slope = 0.0 if n_b < 2 or den <= 1e-12 * n_b * stt else (n_b * sty - st * sy) / den
+        return LevelStats(total / count, lo, hi, slope, n_b, t_last)
+
+class MultiResHistory:
+    def __init__(self, levels: Sequence[Tuple[str, float, int]] = LEVELS):
+        self.levels: Dict[str, Level] = {name: Level(name, res, cap) for name, res, cap in levels}
+
+    def append(self, s: Sample) -> None:
+        for lv in self.levels.values():
+            lv.push(s)
+
+    def stats(self, level: str, metric: str) -> Optional[LevelStats]:
+        return self.levels[level].stats(metric)
+
+    def nbytes(self) -> int:
+        return sum(lv.nbytes() for lv in self.levels.values())
+
+HISTORY_BYTES = MultiResHistory().nbytes()
@@ -0,0 +1,207 @@
+# instrument.py
+# Optional instrumentation of the live loop: counters and latency histograms.
+# STATS is disabled by default and every call returns at once, so the API client,
+# writers and engine can be instrumented unconditionally. main.py enables it when
+# a "metrics" config section or --profile is given, then exposes it as
+# Prometheus text on a localhost port (GET /metrics) and/or a periodic stats table.
+#
+# Metric names (label "device" = config name, or IP when unnamed):
+#   bitaxe_status_seconds / bitaxe_settings_seconds     request latency histograms
+#   bitaxe_status_errors_total{error} / bitaxe_settings_errors_total{error}
+#   bitaxe_endpoint_probes_total{kind}                  endpoint (re)discovery runs
+#   bitaxe_poll_late_total / bitaxe_poll_skipped_total  missed tick deadline / still stuck on an older poll
+#   bitaxe_apply_total{outcome}                         settings changes: confirmed|failed_verify|failed|superseded
+#   bitaxe_decide_seconds                               rule table run over every device due this tick
+#                                                       (one batch, so no device label)
+#   bitaxe_log_flush_seconds                            writer I/O
+#   bitaxe_phase_seconds{phase=wait|poll|process|tick}  one loop iteration, per phase
+#   bitaxe_ticks_missed_total                           loop fell a whole interval behind
+from __future__ import annotations
+import bisect
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+class Histogram:
+    __slots__ = ("counts", "count", "sum", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, v: float) -> None:
+        self.counts[bisect.bisect_left(BUCKETS, v)] += 1
+        self.count += 1
+        self.sum += v
+        if v > self.max:
+            self.max = v
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile (capped at the max seen)."""
+        rank = q * self.count
+        acc = 0
+        for i, c in enumerate(self.counts):
+            acc += c
+            if acc >= rank and c:
+                return min(BUCKETS[i], self.max) if i < len(BUCKETS) else self.max
+        return self.max
+
+class _NoTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NO_TIMER = _NoTimer()
+
+class _Timer:
+    __slots__ = ("_reg", "_key", "_t")
+
+    def __init__(self, reg: "Registry", key: Key):
+        self._reg = reg
+        self._key = key
+
+    def __enter__(self):
+        self._t = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._reg._observe(self._key, time.perf_counter() - self._t)
+        return False
+
+def _key(name: str, labels: Dict[str, str]) -> Key:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+class Registry:
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._counters: Dict[Key, float] = {}
+        self._hists: Dict[Key, Histogram] = {}
+
+    def inc(self, name: str, n: float = 1, **labels: str) -> None:
+        if not self.enabled:
+            return
+        k = _key(name, labels)
+        with self._lock:
+            self._counters[k] = self._counters.get(k, 0) + n
+
+    def observe(self, name: str, seconds: float, **labels: str) -> None:
+        if self.enabled:
+            self._observe(_key(name, labels), seconds)
+
+    def _observe(self, k: Key, seconds: float) -> None:
+        with self._lock:
+            h = self._hists.get(k)
+            if h is None:
+                h = self._hists[k] = Histogram()
+            h.observe(seconds)
+
+    def time(self, name: str, **labels: str):
+        """Context manager observing the elapsed time of its block (also when it raises)."""
+        if not self.enabled:
+            return _NO_TIMER
+        return _Timer(self, _key(name, labels))
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._hists.clear()
+
+    def render(self) -> str:
+        """Prometheus text exposition format (0.0.4)."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            hists = sorted((k, list(h.counts), h.count, h.sum) for k, h in self._hists.items())
+        out: List[str] = []
+        typed = set()
+        for (name, labels), v in counters:
+            if name not in typed:
+                typed.add(name)
+                out.append(f"# TYPE {name} counter")
+            out.append(f"{name}{_fmt_labels(labels)} {v:g}")
+        for (name, labels), counts, count, total in hists:
+            if name not in typed:
+                typed.add(name)
+                out.append(f"# TYPE {name} histogram")
+            acc = 0
+            for bound, c in zip(BUCKETS + (float("inf"),), counts):
+                acc += c
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                out.append(f"{name}_bucket{_fmt_labels(labels + (('le', le),))} {acc}")
+            out.append(f"{name}_sum{_fmt_labels(labels)} {total:.6f}")
+            out.append(f"{name}_count{_fmt_labels(labels)} {count}")
+        return "\n".join(out) + "\n"
+
+    def table(self, prefix: str = "") -> str:
+        """Human-readable summary: histograms (count, mean, p95, max, total) then counters."""
+        with self._lock:
+            hists = sorted((k, h.count, h.sum, h.quantile(0.95), h.max) for k, h in self._hists.items() if k[0].startswith(prefix))
+            counters = sorted((k, v) for k, v in self._counters.items() if k[0].startswith(prefix))
+        lines = [f"{'timer':60} {'count':>8} {'mean':>9} {'p95<=':>9} {'max':>9} {'total':>9}"]
+        for (name, labels), count, total, p95, mx in hists:
+            mean = total / count if count else 0.0
+            lines.append(f"{name + _fmt_labels(labels):60} {count:>8} {_ms(mean):>9} {_ms(p95):>9} {_ms(mx):>9} {total:>8.2f}s")
+        for (name, labels), v in counters:
+            lines.append(f"{name + _fmt_labels(labels):60} {v:>8g}")
+        return "\n".join(lines)
+
+def _fmt_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_esc(v)}"' for k, v in labels) + "}"
+
+def _esc(v: str) -> str:
+    return v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _ms(s: float) -> str:
+    return f"{s * 1e3:.2f}ms"
+
+STATS = Registry()
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = STATS.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def serve(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve STATS on http://host:port/metrics from a daemon thread."""
+    srv = ThreadingHTTPServer((host, port), _MetricsHandler)
+    srv.daemon_threads = True
+    threading.Thread(target=srv.serve_forever, name="metrics-http", daemon=True).start()
+    return srv
+
+class StatsLog:
+    """Prints STATS.table() to a stream every interval_s (checked from the caller's loop)."""
+    def __init__(self, interval_s: float, stream=None, clock=time.monotonic):
+        self.interval_s = interval_s
+        self._stream = stream
+        self._clock = clock
+        self._next = clock() + interval_s
+
+    def maybe_dump(self, force: bool = False) -> Optional[str]:
+        if not force and self._clock() < self._next:
+            return None
+        self._next = self._clock() + self.interval_s
+        text = STATS.table()
+        if self._stream is not None:
+            print(text, file=self._stream, flush=True)
+        return text
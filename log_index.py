@@ -0,0 +1,145 @@
+# log_index.py
+# Sidecar timestamp index of the daily text logs, for fast --from/--to reads.
+#
+# Next to every YYYYMMDD.log, DailyFileWriter appends YYYYMMDD.idx: one 16-byte
+# record (ts float64, byte offset uint64) for the first line of each index_every_s
+# period (default one per minute, ~23 KB/day). Readers bisect the index and seek
+# straight to the range instead of scanning the day. The index is only a hint:
+# a missing, stale or torn index falls back to a scan from the start of the file.
+# Binary .bin files need no index (fixed-width records are bisected directly).
+#
+# Usage:
+#   python3 log_index.py build bitaxe_logs/<name>            # index existing daily logs
+#   python3 log_index.py show bitaxe_logs --device bitaxe-1 --at "2026-01-20 14:32" [--before 10min --after 5min]
+from __future__ import annotations
+import argparse
+import bisect
+import io
+import struct
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import BinaryIO, Iterator, List, Optional, Tuple, Union
+
+IDX = struct.Struct("<dQ")
+
+def index_path(log_path: Union[str, Path]) -> Path:
+    return Path(log_path).with_suffix(".idx")
+
+def open_index(log_path: Union[str, Path], every_s: float, reset: bool = False) -> Tuple[BinaryIO, Optional[float]]:
+    """Open the sidecar for appending; return it with the last indexed period (ts // every_s)."""
+    p = index_path(log_path)
+    fh = open(p, "ab")
+    size = fh.seek(0, 2)
+    if reset and size:
+        fh.truncate(0)
+        size = 0
+    elif size % IDX.size:
+        # Torn record from a crash
+        size -= size % IDX.size
+        fh.truncate(size)
+    last = None
+    if size:
+        with open(p, "rb") as r:
+            r.seek(size - IDX.size)
+            ts, _ = IDX.unpack(r.read(IDX.size))
+        last = ts // every_s
+    return fh, last
+
+def read_index(log_path: Union[str, Path]) -> List[Tuple[float, int]]:
+    try:
+        data = index_path(log_path).read_bytes()
+    except OSError:
+        return []
+    return list(IDX.iter_unpack(data[: len(data) - len(data) % IDX.size]))
+
+def index_offset(log_path: Union[str, Path], ts: float) -> int:
+    """Byte offset of a line at or before the first line with timestamp >= ts (0 = scan from the start)."""
+    entries = read_index(log_path)
+    k = bisect.bisect_right([e[0] for e in entries], ts) - 1
+    if k < 0:
+        return 0
+    offset = entries[k][1]
+    try:
+        size = Path(log_path).stat().st_size
+    except OSError:
+        return 0
+    # An index flushed ahead of its log (crash) or left from an older file is ignored
+    return offset if offset < size else 0
+
+def build_index(log_path: Union[str, Path], every_s: float = 60.0) -> int:
+    """(Re)build the sidecar of an existing log; return the number of entries."""
+    from log_reader import parse_ts
+    n = 0
+    last = None
+    offset = 0
+    with open(log_path, "rb") as f, open(index_path(log_path), "wb") as out:
+        for k, raw in enumerate(f):
+            if k > 0:
+                try:
+                    ts = parse_ts(raw.split(b";", 1)[0].decode("ascii"))
+                except (ValueError, UnicodeDecodeError):
+                    ts = None
+                if ts is not None and (last is None or ts // every_s > last):
+                    out.write(IDX.pack(ts, offset))
+                    last = ts // every_s
+                    n += 1
+            offset += len(raw)
+    return n
+
+def iter_lines(log_path: Union[str, Path], start: Optional[float] = None, end: Optional[float] = None) -> Iterator[Tuple[float, str]]:
+    """(timestamp, line) of any daily log (metrics or decisions) with start <= ts < end."""
+    from log_reader import parse_ts
+    offset = index_offset(log_path, start) if start is not None else 0
+    with open(log_path, "rb") as raw:
+        raw.seek(offset)
+        f = io.TextIOWrapper(raw, encoding="utf-8")
+        if offset == 0:
+            f.readline()  # header
+        for line in f:
+            line = line.rstrip("\n")
+            try:
+                ts = parse_ts(line.split(";", 1)[0])
+            except ValueError:
+                continue
+            if start is not None and ts < start:
+                continue
+            if end is not None and ts >= end:
+                return
+            yield ts, line
+
+def main():
+    from log_reader import daily_files
+    from timeparse import parse_duration_to_seconds
+
+    p = argparse.ArgumentParser(description="BitaxeLiveOptimizer - daily log timestamp index")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build", help="Index the daily .log files of a folder")
+    b.add_argument("folder")
+    b.add_argument("--every", type=float, default=60.0, help="Seconds per index entry (default 60)")
+    s = sub.add_parser("show", help="Print the metrics and decisions lines around a moment")
+    s.add_argument("logs_dir")
+    s.add_argument("--device", required=True)
+    s.add_argument("--at", required=True, help="YYYY-MM-DD HH:MM[:SS]")
+    s.add_argument("--before", default="10min", help="Window before --at (default 10min)")
+    s.add_argument("--after", default="5min", help="Window after --at (default 5min)")
+    args = p.parse_args()
+
+    if args.cmd == "build":
+        files = daily_files(args.folder)
+        total = sum(build_index(f, args.every) for f in files)
+        print(f"{len(files)} file(s) indexed, {total} entries")
+        return
+
+    at = datetime.fromisoformat(args.at)
+    start = at - timedelta(seconds=parse_duration_to_seconds(args.before))
+    end = at + timedelta(seconds=parse_duration_to_seconds(args.after))
+    root = Path(args.logs_dir)
+    rows = []
+    for kind, folder in (("metrics", root / args.device), ("decision", root / "decisions" / args.device)):
+        for f in daily_files(folder, start, end):
+            rows += [(ts, kind, line) for ts, line in iter_lines(f, start.timestamp(), end.timestamp())]
+    for _, kind, line in sorted(rows, key=lambda r: r[0]):
+        print(f"{kind:8} {line}")
+
+if __name__ == "__main__":
+    main()
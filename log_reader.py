@@ -0,0 +1,149 @@
+# log_reader.py
+# Streaming reader for metrics logs written by DailyFileWriter.
+# Samples are yielded one at a time, in order, across the daily files of a device
+# folder (<logs_dir>/<name>/YYYYMMDD.log), so a range of weeks is read in constant memory.
+# Binary .bin files (see metrics_bin.py) are read the same way with suffix=".bin".
+# With a start bound, text logs are entered through their .idx sidecar (log_index.py).
+from __future__ import annotations
+import io
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Union
+
+from log_index import index_offset
+from models import Sample
+
+_HOUR_BASE: Dict[str, float] = {}
+
+def parse_ts(s: str) -> float:
+    """Parse local "YYYY-MM-DD HH:MM:SS" to an epoch timestamp.
+
+    Same result as datetime.strptime(s, ...).timestamp(): the epoch of each
+    (date, hour) is computed once by datetime and cached, minutes and seconds
+    are added as integers. DST transitions fall on whole hours, so the cache
+    stays exact across them.
+    """
+    if len(s) != 19 or s[4] != "-" or s[10] != " " or s[13] != ":":
+        return datetime.strptime(s, "%Y-%m-%d %H:%M:%S").timestamp()
+    key = s[:13]
+    base = _HOUR_BASE.get(key)
+    if base is None:
+        if len(_HOUR_BASE) > 4096:
+            _HOUR_BASE.clear()
+        base = datetime(int(s[0:4]), int(s[5:7]), int(s[8:10]), int(s[11:13])).timestamp()
+        _HOUR_BASE[key] = base
+    return base + int(s[14:16]) * 60 + int(s[17:19])
+
+def parse_when(value: str, end: bool = False) -> datetime:
+    """Parse a --from/--to value; a bare date as an end bound means the end of that day."""
+    dt = datetime.fromisoformat(value.strip())
+    if end and len(value.strip()) == 10:
+        dt += timedelta(days=1)
+    return dt
+
+def iter_log_file(path: Union[str, Path], start: Optional[float] = None, end: Optional[float] = None) -> Iterator[Sample]:
+    """Yield valid samples of one metrics log with start <= ts < end (NA rows are skipped)."""
+    offset = index_offset(path, start) if start is not None else 0
+    with open(path, "rb") as raw:
+        raw.seek(offset)
+        f = io.TextIOWrapper(raw, encoding="utf-8")
+        if offset == 0:
+            f.readline()  # header
+        for line in f:
+            parts = line.rstrip("\n").split(";")
+            if len(parts) != 6:
+                continue
+            ts, temp, vr, err, freq, vcore = parts
+            if "NA" in (temp, vr, err, freq, vcore):
+                continue
+            t = parse_ts(ts)
+            if start is not None and t < start:
+                continue
+            if end is not None and t >= end:
+                # Lines are written in time order
+                return
+            yield Sample(ts=t, temp=float(temp), vr_temp=float(vr), err=float(err), freq=int(freq), vcore=int(vcore))
+
+def daily_files(folder: Union[str, Path], start: Optional[datetime] = None, end: Optional[datetime] = None,
+                suffix: str = ".log") -> List[Path]:
+    """Daily logs of a device folder overlapping [start, end), oldest first."""
+    lo = start.strftime("%Y%m%d") if start else None
+    hi = end.strftime("%Y%m%d") if end else None
+    out = []
+    for p in sorted(Path(folder).glob(f"*{suffix}")):
+        day = p.stem
+        if len(day) != 8 or not day.isdigit():
+            continue
+        if lo is not None and day < lo:
+            continue
+        if hi is not None and day > hi:
+            continue
+        out.append(p)
+    return out
+
+def iter_samples(path: Union[str, Path], start: Optional[float] = None, end: Optional[float] = None) -> Iterator[Sample]:
+    """iter_log_file for .log paths, metrics_bin.iter_bin_file for .bin paths."""
+    if Path(path).suffix == ".bin":
+        from metrics_bin import iter_bin_file
+        return iter_bin_file(path, start, end)
+    return iter_log_file(path, start, end)
+
+def _parse_line(line: str) -> Optional[Sample]:
+    parts = line.rstrip("\r\n").split(";")
+    if len(parts) != 6 or "NA" in parts:
+        return None
+    try:
+        ts, temp, vr, err, freq, vcore = parts
+        return Sample(ts=parse_ts(ts), temp=float(temp), vr_temp=float(vr), err=float(err), freq=int(freq), vcore=int(vcore))
+    except ValueError:
+        return None  # header, or a line torn by a crash
+
+def tail_log_file(path: Union[str, Path], n: int, since: Optional[float] = None, block: int = 8192) -> List[Sample]:
+    """Last n valid samples with ts >= since, oldest first, reading backwards from the end of the file."""
+    out: List[Sample] = []
+    with open(path, "rb") as f:
+        pos = f.seek(0, 2)
+        rest = b""
+        while pos > 0 and len(out) < n:
+            step = min(block, pos)
+            pos -= step
+            f.seek(pos)
+            lines = (f.read(step) + rest).split(b"\n")
+            # The first piece may be the end of a line that starts in the previous block
+            rest = lines.pop(0) if pos > 0 else b""
+            for raw in reversed(lines):
+                s = _parse_line(raw.decode("utf-8", "replace"))
+                if s is None:
+                    continue
+                if since is not None and s.ts < since:
+                    out.reverse()
+                    return out
+                out.append(s)
+                if len(out) >= n:
+                    break
+    out.reverse()
+    return out
+
+def tail_device_samples(folder: Union[str, Path], n: int, since: Optional[float] = None,
+                        suffix: str = ".log") -> List[Sample]:
+    """Last n valid samples of a device folder with ts >= since, across daily files if needed."""
+    start = datetime.fromtimestamp(since) if since is not None else None
+    out: List[Sample] = []
+    for p in reversed(daily_files(folder, start, None, suffix)):
+        if suffix == ".bin":
+            from metrics_bin import tail_bin_file
+            chunk = tail_bin_file(p, n - len(out), since)
+        else:
+            chunk = tail_log_file(p, n - len(out), since)
+        out = chunk + out
+        if len(out) >= n:
+            break
+    return out
+
+def iter_device_samples(folder: Union[str, Path], start: Optional[datetime] = None, end: Optional[datetime] = None,
+                        suffix: str = ".log") -> Iterator[Sample]:
+    """Stream samples of a device folder across day boundaries, in order."""
+    t0 = start.timestamp() if start else None
+    t1 = end.timestamp() if end else None
+    for p in daily_files(folder, start, end, suffix):
+        yield from iter_samples(p, t0, t1)
@@ -1,9 +1,16 @@
 # log_utils.py
 from __future__ import annotations
+import queue
+import sys
+import threading
+import time
 from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
-from typing import Optional, TextIO
+from typing import Any, BinaryIO, Callable, ClassVar, Dict, List, Optional, TextIO
+
+from instrument import STATS
+from log_index import IDX, open_index
 
 METRICS_HEADER = "timestamp;temp;vrTemp;errorPercentage;frequency;coreVoltage"
 DECISIONS_HEADER = "timestamp;tempAvg;vrTempAvg;errAvg;slope;frequency;coreVoltage;decision;newFrequency;newCoreVoltage;reason"
@@ -17,9 +24,27 @@ class DailyFileWriter:
     bitaxe_name: str
     header: str
     keep_days: int = 30
+    # Flush policy: flush once any limit is reached (defaults = flush every line)
+    flush_lines: int = 1
+    flush_bytes: int = 0         # 0 = no byte limit
+    flush_latency_s: float = 0.0  # 0 = no age limit; checked by maybe_flush()
+    # Called with each expiring file before it is deleted (e.g. rollup.compact_metrics);
+    # if it raises, the file is kept and retried at the next daily prune
+    on_expire: Optional[Callable[[Path], None]] = None
+    # Sidecar YYYYMMDD.idx with the byte offset of the first line of every period (see log_index.py); 0 = off
+    index_every_s: float = 60.0
+
+    SUFFIX: ClassVar[str] = ".log"
 
     _current_date: Optional[str] = None
     _fh: Optional[TextIO] = None
+    _pruned_on: Optional[str] = None
+    _pending_lines: int = 0
+    _pending_bytes: int = 0
+    _pending_since: Optional[float] = None
+    _idx: Optional[BinaryIO] = None
+    _idx_last: Optional[float] = None
+    _offset: int = 0
 
     def _folder(self) -> Path:
         d = self.base_dir / self.bitaxe_name
@@ -27,7 +52,7 @@ class DailyFileWriter:
         return d
 
     def _path_for_date(self, yyyymmdd: str) -> Path:
-        return self._folder() / f"{yyyymmdd}.log"
+        return self._folder() / f"{yyyymmdd}{self.SUFFIX}"
 
     def _open_for(self, now: datetime) -> None:
         yyyymmdd = now.strftime("%Y%m%d")
@@ -41,25 +66,73 @@ class DailyFileWriter:
         if new_file:
             self._fh.write(self.header + "\n")
             self._fh.flush()
-        self._prune_old_files()
+        if self.index_every_s > 0:
+            self._offset = path.stat().st_size
+            self._idx, self._idx_last = open_index(path, self.index_every_s, reset=new_file)
+        # Rotation is the only time files expire: prune once per day, not per open
+        if self._pruned_on != yyyymmdd:
+            self._pruned_on = yyyymmdd
+            self._prune_old_files()
 
     def _prune_old_files(self) -> None:
-        files = sorted(self._folder().glob("*.log"))
+        files = sorted(self._folder().glob(f"*{self.SUFFIX}"))
         if len(files) <= self.keep_days:
             return
         for p in files[: max(0, len(files) - self.keep_days)]:
+            if self.on_expire is not None:
+                try:
+                    self.on_expire(p)
+                except Exception as e:
+                    print(f"[log] {p}: rollup failed, file kept: {e}", file=sys.stderr)
+                    continue
             try:
                 p.unlink()
+                p.with_suffix(".idx").unlink(missing_ok=True)
             except OSError:
                 pass
 
+    def _written(self, nbytes: int) -> None:
+        self._pending_lines += 1
+        self._pending_bytes += nbytes
+        if self._pending_since is None:
+            self._pending_since = time.monotonic()
+        if self._pending_lines >= self.flush_lines or (self.flush_bytes and self._pending_bytes >= self.flush_bytes):
+            self.flush()
+        else:
+            self.maybe_flush()
+
     def write(self, now: datetime, line: str) -> None:
         self._open_for(now)
         assert self._fh is not None
-        self._fh.write(line + "\n")
-        self._fh.flush()
+        data = line + "\n"
+        if self._idx is not None:
+            ts = now.timestamp()
+            if self._idx_last is None or ts // self.index_every_s > self._idx_last:
+                self._idx.write(IDX.pack(ts, self._offset))
+                self._idx_last = ts // self.index_every_s
+            self._offset += len(data) if data.isascii() else len(data.encode("utf-8"))
+        self._fh.write(data)
+        self._written(len(data))
+
+    def flush(self) -> None:
+        if self._fh:
+            with STATS.time("bitaxe_log_flush_seconds", device=self.bitaxe_name):
+                self._fh.flush()
+                if self._idx is not None:
+                    self._idx.flush()
+        self._pending_lines = 0
+        self._pending_bytes = 0
+        self._pending_since = None
+
+    def maybe_flush(self) -> None:
+        if self._pending_since is not None and self.flush_latency_s > 0 \
+                and time.monotonic() - self._pending_since >= self.flush_latency_s:
+            self.flush()
 
     def close(self) -> None:
+        self._pending_lines = 0
+        self._pending_bytes = 0
+        self._pending_since = None
         if self._fh:
             try:
                 self._fh.flush()
@@ -70,4 +143,94 @@ class DailyFileWriter:
             except Exception:
                 pass
         self._fh = None
+        if self._idx is not None:
+            try:
+                self._idx.close()
+            except Exception:
+                pass
+        self._idx = None
         self._current_date = None
+
+def flush_policy(cfg: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """DailyFileWriter kwargs from a config "log_flush" section ({lines, bytes, latency_s})."""
+    if not cfg:
+        return {}
+    return {
+        "flush_lines": int(cfg.get("lines", 1)),
+        "flush_bytes": int(cfg.get("bytes", 0)),
+        "flush_latency_s": float(cfg.get("latency_s", 0.0)),
+    }
+
+_STOP = object()
+
+class QueuedWriter:
+    """Same interface as DailyFileWriter; the I/O happens on a BackgroundWriter thread."""
+    def __init__(self, bg: "BackgroundWriter", writer: DailyFileWriter):
+        self._bg = bg
+        self.writer = writer
+
+    def write(self, now: datetime, line: str) -> None:
+        self._bg._q.put((self.writer, now, line))
+
+    def close(self) -> None:
+        # now=None marks a close request
+        self._bg._q.put((self.writer, None, None))
+
+class BackgroundWriter:
+    """One thread owning the disk I/O of many writers, so the polling loop never blocks on it.
+
+    Lines are queued and written in order; each writer flushes by its own policy and
+    this thread checks flush_latency_s every poll_s. Crash bound, per file, for a hard
+    kill (plus anything still queued, which drains continuously):
+    - at most flush_lines - 1 written lines (nothing with the default lines = 1), and
+      with flush_bytes > 0 also fewer than flush_bytes bytes;
+    - with flush_latency_s > 0, also only lines from the last flush_latency_s + poll_s
+      seconds. With latency_s 0 there is no time bound: a quiet file keeps its
+      unflushed lines until the lines/bytes limit is reached or the writer closes.
+    close() drains the queue and closes every writer.
+    """
+    def __init__(self, poll_s: float = 0.5):
+        self.poll_s = poll_s
+        self._q: "queue.Queue[Any]" = queue.Queue()
+        self._writers: List[DailyFileWriter] = []
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def wrap(self, writer: DailyFileWriter) -> QueuedWriter:
+        self._writers.append(writer)
+        return QueuedWriter(self, writer)
+
+    def _run(self) -> None:
+        next_check = time.monotonic() + self.poll_s
+        while True:
+            try:
+                item = self._q.get(timeout=self.poll_s)
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                break
+            if item is not None:
+                writer, now, line = item
+                try:
+                    if now is None:
+                        writer.close()
+                        if writer in self._writers:
+                            self._writers.remove(writer)
+                    else:
+                        writer.write(now, line)
+                except Exception:
+                    # A full or failing disk must not kill the writer thread
+                    pass
+            if time.monotonic() >= next_check:
+                next_check = time.monotonic() + self.poll_s
+                for w in self._writers:
+                    try:
+                        w.maybe_flush()
+                    except Exception:
+                        pass
+        for w in self._writers:
+            w.close()
+
+    def close(self, timeout_s: float = 10.0) -> None:
+        self._q.put(_STOP)
+        self._thread.join(timeout_s)
@@ -3,96 +3,455 @@
 #
 # It reads config.json (IPs are fixed; no autodiscovery), polls every 5s,
 # uses a FIFO window (12 samples by default), and may apply changes every window.
+# All devices are polled concurrently with a per-tick deadline (see poller.py),
+# so one unreachable miner does not delay the others.
 #
 # Usage:
 #   python3 main.py --config config.json
+#   python3 main.py --config config.json --profile   # per-phase timings on stderr
+#
+# Instrumentation (see instrument.py) is off unless config.json has a "metrics"
+# section (Prometheus text on localhost and/or a periodic stats table) or --profile.
+#
+# Warm start ("warm_start" section): each window is seeded from the tail of the
+# device's metrics log (written by collector.py, or by main.py with "log_metrics")
+# and the decision counter phase comes back from a state file, so the first poll
+# after a restart can already make a real decision. Without either metrics log
+# the windows start empty.
+#
+# Adaptive polling ("adaptive_poll" section): each device is polled on its own
+# period, from max_interval_s while temperatures, errors and slope are well inside
+# the soft limits down to min_interval_s as they approach them
+# (decision_engine.poll_interval); decisions then run every decide_every_s seconds.
+#
+# Settings changes go through a per-device apply queue (applier.py) on the poller
+# pool: the decision line is written at once, a newer change replaces a queued one,
+# failed requests are retried with backoff ("apply" section) and every change is
+# checked on the device's next poll. Its outcome gets its own decisions log line
+# (decision APPLY, reason apply_confirmed / apply_failed_verify / apply_failed /
+# apply_superseded). Decisions step from the settings still on their way.
+#
+# Hot reload: the config file is checked (mtime) before every tick. A valid change
+# is applied between two ticks: devices are diffed by name (unchanged miners keep
+# window, counter and writers; new ones get their own state, removed ones have
+# their writers closed), engine limits/rules, window_n, apply_every_n and the
+# poll cadence are swapped in place. An invalid file is rejected and the running
+# config kept. Log, metrics and warm-start settings and poll_workers (and switching
+# adaptive_poll on or off) still need a restart. supervisor.py shards do not reload.
 #
 from __future__ import annotations
 import argparse
-import json
+import math
+import signal
+import sys
 import time
 from datetime import datetime
+from functools import partial
 from pathlib import Path
-from collections import deque
-from typing import Dict, Any
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 
+from applier import DeviceApplier, Outcome, Target
 from bitaxe_api import BitaxeAPI
-from models import Sample
-from decision_engine import decide
-from log_utils import DailyFileWriter, DECISIONS_HEADER, fmt_ts
-
-def _extract(status: Dict[str, Any]):
-    def pick(*keys):
-        for k in keys:
-            if k in status and status[k] is not None:
-                return status[k]
-        return None
-    temp = pick("temp", "asicTemp", "asic_temp")
-    vr = pick("vrTemp", "vrmTemp", "vr_temp", "vrm_temp")
-    err = pick("errorPercentage", "errorPercent", "error_percentage", "errPercent")
-    freq = pick("frequency", "freq", "asicFrequency")
-    vcore = pick("coreVoltage", "core_voltage", "vcore", "voltage")
-    if None in (temp, vr, err, freq, vcore):
+from models import Sample, Decision
+from decision_engine import POLL_INTERVAL_KEYS, poll_interval
+from rolling import RollingWindow
+from rules import compile_rules, window_stats
+from history import MultiResHistory
+from log_utils import BackgroundWriter, DailyFileWriter, DECISIONS_HEADER, METRICS_HEADER, flush_policy, fmt_ts
+from log_reader import tail_device_samples
+from config_loader import ConfigWatcher, load_config
+from rollup import compact_decisions, compact_metrics
+from state_store import StateStore
+from instrument import STATS, StatsLog, serve
+from poller import FleetPoller
+from scheduler import FixedRateScheduler, FleetScheduler
+
+def _extract(api: BitaxeAPI, status: Dict[str, Any]):
+    f = api.pick_fields(status)
+    if f is None:
         return None
-    return float(temp), float(vr), float(err), int(freq), int(vcore)
+    return float(f["temp"]), float(f["vr"]), float(f["err"]), int(f["freq"]), int(f["vcore"])
 
-def main():
-    p = argparse.ArgumentParser(description="BitaxeLiveOptimizer - LIVE optimizer (indefinite)")
-    p.add_argument("--config", default="config.json", help="Path to config.json (default ./config.json)")
-    args = p.parse_args()
+def _decision_line(now: datetime, d: Decision, cur: Sample) -> str:
+    return (
+        f"{fmt_ts(now)};"
+        f"{d.temp_avg if d.temp_avg is not None else 'NA'};"
+        f"{d.vr_temp_avg if d.vr_temp_avg is not None else 'NA'};"
+        f"{d.err_avg if d.err_avg is not None else 'NA'};"
+        f"{d.slope if d.slope is not None else 'NA'};"
+        f"{cur.freq};{cur.vcore};"
+        f"{d.action};"
+        f"{d.new_freq if d.new_freq is not None else 'NA'};"
+        f"{d.new_vcore if d.new_vcore is not None else 'NA'};"
+        f"{d.reason}"
+    )
+
+def _outcome_line(now: datetime, outcome: str, target: Target, cur: Optional[Sample]) -> str:
+    # Result of an earlier change; "APPLY" keeps these lines apart from decisions
+    return (
+        f"{fmt_ts(now)};NA;NA;NA;NA;"
+        f"{cur.freq if cur is not None else 'NA'};{cur.vcore if cur is not None else 'NA'};"
+        f"APPLY;{target.get('frequency', 'NA')};{target.get('core_voltage', 'NA')};apply_{outcome}"
+    )
+
+def _persisted(devices: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    return {name: {k: st[k] for k in ("counter", "next_decide")} for name, st in devices.items()}
 
-    cfg_path = Path(args.config)
-    cfg = json.loads(cfg_path.read_text(encoding="utf-8"))
+def _restore_counter(saved: Dict[str, Any], now: float, poll_interval_s: float, apply_every_n: int) -> int:
+    """Counter phase after a restart; a decision that fell due while down happens at the first poll."""
+    counter = int(saved.get("counter", 0))
+    elapsed = int(max(0.0, now - float(saved.get("saved_at", now))) // poll_interval_s)
+    next_due = (counter // apply_every_n + 1) * apply_every_n
+    if counter + elapsed + 1 >= next_due:
+        return next_due - 1
+    return counter + elapsed
 
+def open_writers(cfg: Dict[str, Any], name: str, flush_kw: Dict[str, Any]) -> Tuple[DailyFileWriter, Optional[DailyFileWriter]]:
+    """Decisions writer and (with "log_metrics") metrics writer of one device."""
     outdir = Path(cfg.get("logs_dir", "bitaxe_logs"))
-    window_n = int(cfg.get("window_n", 12))
-    apply_every_n = int(cfg.get("apply_every_n", 12))
-    poll_interval_s = float(cfg.get("poll_interval_s", 5.0))
-    timeout_s = float(cfg.get("timeout_s", 5.0))
+    keep_days = int(cfg.get("keep_days", 30))
+    decisions_writer = DailyFileWriter(outdir / "decisions", name, DECISIONS_HEADER, keep_days=keep_days,
+                                       on_expire=compact_decisions if "rollup" in cfg else None, **flush_kw)
+    metrics_writer = None
+    if cfg.get("log_metrics", False):
+        # Same files as collector.py; do not run both on one device
+        keep_1m = int((cfg.get("rollup") or {}).get("keep_1m_months", 12))
+        metrics_writer = DailyFileWriter(outdir, name, METRICS_HEADER, keep_days=keep_days,
+                                         on_expire=partial(compact_metrics, keep_1m_months=keep_1m) if "rollup" in cfg else None,
+                                         **flush_kw)
+    return decisions_writer, metrics_writer
 
-    engine_cfg = cfg["engine"]
-    engine_cfg["window_n_min_valid"] = int(engine_cfg.get("window_n_min_valid", max(8, window_n // 2)))
+# Read once at startup (files, threads, ports); a reload keeps the running values
+_RESTART_KEYS = ("logs_dir", "keep_days", "rollup", "log_flush", "log_metrics", "metrics", "warm_start", "poll_workers")
+
+def _log_outcomes(st: Dict[str, Any], now: datetime, outcomes: Iterable[Outcome]) -> None:
+    cur = st["fifo"][-1] if st["fifo"] else None
+    for outcome, target in outcomes:
+        STATS.inc("bitaxe_apply_total", device=st["name"], outcome=outcome)
+        st["writer"].write(now, _outcome_line(now, outcome, target, cur))
+
+class _Settings:
+    """Loop settings derived from a config, validated; a reload swaps the whole object."""
+    def __init__(self, cfg: Dict[str, Any]):
+        self.window_n = int(cfg.get("window_n", 12))
+        self.apply_every_n = int(cfg.get("apply_every_n", 12))
+        self.poll_interval_s = float(cfg.get("poll_interval_s", 5.0))
+        self.timeout_s = float(cfg.get("timeout_s", 5.0))
+        if self.window_n < 1 or self.apply_every_n < 1:
+            raise ValueError("window_n and apply_every_n must be >= 1")
+        if self.poll_interval_s <= 0 or self.timeout_s <= 0:
+            raise ValueError("poll_interval_s and timeout_s must be > 0")
+        names = [d["name"] for d in cfg["devices"]]
+        if not names or len(set(names)) != len(names) or not all(isinstance(d.get("ip"), str) for d in cfg["devices"]):
+            raise ValueError("devices: need at least one, with unique names and an ip each")
+        # Adaptive polling: per-device period between min and max from the thermal state,
+        # and decisions every decide_every_s seconds instead of every apply_every_n polls
+        adaptive = cfg.get("adaptive_poll")
+        self.adaptive = adaptive is not None
+        self.poll_min_s = self.poll_max_s = self.margin_c = self.decide_every_s = None
+        if adaptive is not None:
+            self.poll_min_s = float(adaptive.get("min_interval_s", self.poll_interval_s))
+            self.poll_max_s = max(self.poll_min_s, float(adaptive.get("max_interval_s", 6 * self.poll_interval_s)))
+            self.margin_c = float(adaptive.get("margin_c", 10.0))
+            self.decide_every_s = float(adaptive.get("decide_every_s", self.apply_every_n * self.poll_interval_s))
+            if self.poll_min_s <= 0 or self.decide_every_s <= 0:
+                raise ValueError("adaptive_poll: min_interval_s and decide_every_s must be > 0")
+            # A custom rules table may not reference them, so compile_rules() does not check
+            for key in POLL_INTERVAL_KEYS:
+                v = cfg["engine"].get(key)
+                if not isinstance(v, (int, float)) or isinstance(v, bool) or not math.isfinite(v):
+                    raise ValueError(f"adaptive_poll needs engine.{key} (a number)")
+        # How long a tick waits for status answers; late answers count as missed polls
+        fastest_s = self.poll_min_s if adaptive is not None else self.poll_interval_s
+        self.tick_deadline_s = float(cfg.get("tick_deadline_s", min(self.timeout_s, 0.8 * fastest_s)))
+        apply_cfg = cfg.get("apply") or {}
+        self.apply_retries = int(apply_cfg.get("retries", 2))
+        self.apply_backoff_s = float(apply_cfg.get("backoff_s", self.poll_interval_s))
+
+        self.engine_cfg = dict(cfg["engine"])
+        self.engine_cfg["window_n_min_valid"] = int(self.engine_cfg.get("window_n_min_valid", max(8, self.window_n // 2)))
+        self.engine = compile_rules(self.engine_cfg)
+
+def _pin_restart_keys(running: Dict[str, Any], new: Dict[str, Any]) -> Tuple[Dict[str, Any], List[str]]:
+    """new with the startup-only keys of the running config, and the names of those that differ."""
+    out = dict(new)
+    pinned = []
+    for key in _RESTART_KEYS + ("adaptive_poll",):
+        if key == "adaptive_poll" and (running.get(key) is None) == (new.get(key) is None):
+            continue  # tunable in place; only switching it on or off needs a restart
+        if running.get(key) != new.get(key):
+            pinned.append(key)
+        out.pop(key, None)
+        if key in running:
+            out[key] = running[key]
+    return out, pinned
+
+def _resized(fifo: RollingWindow, n: int) -> RollingWindow:
+    out = RollingWindow(n)
+    for s in list(fifo)[-n:]:
+        out.append(s)
+    return out
+
+def run(cfg: Dict[str, Any], profile: bool = False, sink: Any = None, store: Any = None,
+        on_tick: Optional[Callable[[], None]] = None, clock: Optional[Callable[[], float]] = None,
+        ticks: Any = None, make_api: Optional[Callable[[Dict[str, Any]], BitaxeAPI]] = None,
+        poller: Any = None, cfg_path: Optional[Path] = None, settings: Optional[_Settings] = None) -> None:
+    """The live loop over cfg["devices"], until SIGTERM / Ctrl+C.
+
+    supervisor.py runs one per shard and injects a sink (sink.writer(kind, name) replaces
+    the log files), a store (load/save like StateStore) and an on_tick heartbeat.
+    replay.py injects a wall clock (epoch seconds), the tick scheduler, the API of
+    each device and the poller; an exception raised by any of them ends the loop.
+    With cfg_path, changes to that file are applied between two ticks (hot reload).
+    settings: cfg already validated by the caller (_Settings(cfg)), built here otherwise.
+    """
+    wall = clock or time.time
+    outdir = Path(cfg.get("logs_dir", "bitaxe_logs"))
+    conf = settings if settings is not None else _Settings(cfg)
+    poll_workers = int(cfg.get("poll_workers", min(256, 2 * len(cfg["devices"]))))
+
+    # With a "log_flush" policy, disk writes move to a background thread
+    flush_kw = flush_policy(cfg.get("log_flush"))
+    bg = BackgroundWriter() if flush_kw and sink is None else None
+
+    metrics_cfg = cfg.get("metrics") or {}
+    STATS.enabled = bool(metrics_cfg) or profile
+    if metrics_cfg.get("port"):
+        serve(int(metrics_cfg["port"]), metrics_cfg.get("host", "127.0.0.1"))
+    stats_every_s = float(metrics_cfg.get("log_every_s", 60.0 if profile else 0.0))
+    stats_log = StatsLog(stats_every_s, sys.stderr) if stats_every_s > 0 else None
+
+    warm_cfg = cfg.get("warm_start")
+    saved: Dict[str, Dict[str, Any]] = {}
+    if warm_cfg is not None:
+        if store is None:
+            store = StateStore(warm_cfg.get("state_file", outdir / "state.json"))
+        saved = store.load()
+    max_age_s = float((warm_cfg or {}).get("max_age_s", 600))
 
     # Per-device state
-    devices = {}
-    for d in cfg["devices"]:
+    devices: Dict[str, Dict[str, Any]] = {}
+    apis: Dict[str, BitaxeAPI] = {}
+
+    def new_api(d: Dict[str, Any], c: _Settings) -> BitaxeAPI:
+        return make_api(d) if make_api is not None else BitaxeAPI(d["ip"], timeout_s=c.timeout_s, name=d["name"])
+
+    def close_device(st: Dict[str, Any]) -> None:
+        st["api"].close()
+        for w in (st["writer"], st["metrics_writer"]):
+            if w is not None:
+                w.close()
+
+    def new_device(d: Dict[str, Any], t0: float, c: _Settings) -> Dict[str, Any]:
+        """State of one miner under settings c, not in the loop yet; on error, closes what it opened."""
         name = d["name"]
-        ip = d["ip"]
-        api = BitaxeAPI(ip, timeout_s=timeout_s)
-        fifo = deque(maxlen=window_n)
-        decisions_writer = DailyFileWriter(outdir / "decisions", name, DECISIONS_HEADER, keep_days=int(cfg.get("keep_days", 30)))
-        devices[name] = {
+        api = new_api(d, c)
+        st = {
+            "name": name,
             "api": api,
-            "fifo": fifo,
-            "writer": decisions_writer,
+            "fifo": RollingWindow(c.window_n),
+            # 1m/15m/1h aggregates for the drift rule, fixed size (history.HISTORY_BYTES)
+            "history": MultiResHistory(),
+            "writer": None,
+            "metrics_writer": None,
             "counter": 0,
-            "last_freq": None,
-            "last_vcore": None,
+            "next_decide": t0 + c.decide_every_s if c.adaptive else None,
+            # Settings changes, sent off the polling path (applier.py)
+            "applier": DeviceApplier(api, poller.submit, c.apply_retries, c.apply_backoff_s),
         }
+        try:
+            if sink is not None:
+                st["writer"] = sink.writer("decisions", name)
+                st["metrics_writer"] = sink.writer("metrics", name) if cfg.get("log_metrics", False) else None
+            else:
+                st["writer"], st["metrics_writer"] = open_writers(cfg, name, flush_kw)
+                if bg is not None:
+                    st["writer"] = bg.wrap(st["writer"])
+                    if st["metrics_writer"] is not None:
+                        st["metrics_writer"] = bg.wrap(st["metrics_writer"])
+
+            if warm_cfg is not None:
+                since = t0 - max_age_s
+                seed = tail_device_samples(outdir / name, c.window_n, since, ".log") or \
+                    tail_device_samples(outdir / name, c.window_n, since, ".bin")
+                for smp in seed:
+                    st["fifo"].append(smp)
+                    st["history"].append(smp)
+                prev = saved.get(name, {})
+                if prev and t0 - float(prev.get("saved_at", 0)) <= max_age_s:
+                    st["counter"] = _restore_counter(prev, t0, c.poll_interval_s, c.apply_every_n)
+                    if c.adaptive and prev.get("next_decide") is not None:
+                        # Overdue while down: decide at the first poll
+                        st["next_decide"] = float(prev["next_decide"])
+                print(f"[main] warm start {name}: {len(seed)} sample(s), counter {st['counter']}", file=sys.stderr)
+        except BaseException:
+            close_device(st)
+            raise
+        return st
+
+    def add_device(st: Dict[str, Any]) -> None:
+        devices[st["name"]] = st
+        apis[st["name"]] = st["api"]
+
+    def drop_device(name: str, now: datetime) -> None:
+        st = devices.pop(name)
+        _log_outcomes(st, now, st["applier"].abandon())
+        apis.pop(name)
+        if sched is not None:
+            sched.remove(name)
+        st["applier"].when_idle(partial(close_device, st))
+
+    def stagger(names: List[str]) -> None:
+        # Start at poll_interval_s, staggered so the fleet does not poll in lockstep
+        start_s = min(conf.poll_max_s, max(conf.poll_min_s, conf.poll_interval_s))
+        for k, name in enumerate(names):
+            sched.add(name, start_s, phase_s=start_s * (k + 1) / len(names))
+
+    def reload() -> None:
+        """Swap in the changed config file, or keep the running config if it is invalid."""
+        nonlocal cfg, conf
+        try:
+            new_cfg = watcher.changed()
+            if new_cfg is None:
+                return
+            new_cfg, pinned = _pin_restart_keys(cfg, new_cfg)
+            new_conf = _Settings(new_cfg)
+        except Exception as e:
+            STATS.inc("bitaxe_config_reloads_total", result="rejected")
+            print(f"[main] config reload rejected, keeping the running config: {e}", file=sys.stderr)
+            return
+
+        old = {d["name"]: d for d in cfg["devices"]}
+        new = {d["name"]: d for d in new_cfg["devices"]}
+        t0 = wall()
+        # What can fail (writers, warm-start logs, APIs) happens before anything is
+        # swapped: on error the running config and devices stay as they were
+        added: Dict[str, Dict[str, Any]] = {}
+        moved: Dict[str, BitaxeAPI] = {}
+        try:
+            for name, d in new.items():
+                if name not in old:
+                    added[name] = new_device(d, t0, new_conf)
+                elif d["ip"] != old[name]["ip"]:
+                    moved[name] = new_api(d, new_conf)
+        except Exception as e:
+            for st in added.values():
+                close_device(st)
+            for api in moved.values():
+                api.close()
+            STATS.inc("bitaxe_config_reloads_total", result="rejected")
+            print(f"[main] config reload rejected, keeping the running config: {e}", file=sys.stderr)
+            return
+
+        old_conf = conf
+        cfg, conf = new_cfg, new_conf
+        removed = [name for name in old if name not in new]
+        for name in removed:
+            drop_device(name, datetime.fromtimestamp(t0).replace(microsecond=0))
+        for name, d in new.items():
+            if name in added:
+                add_device(added[name])
+                continue
+            # Same miner: window, history, counter and writers carry over
+            st = devices[name]
+            if name in moved:
+                # A request in flight finishes on the old session
+                st["applier"].when_idle(st["api"].close)
+                st["api"] = apis[name] = st["applier"].api = moved[name]
+            elif make_api is None:
+                st["api"].timeout_s = conf.timeout_s
+            st["applier"].retries = conf.apply_retries
+            st["applier"].backoff_s = conf.apply_backoff_s
+            if conf.window_n != old_conf.window_n:
+                st["fifo"] = _resized(st["fifo"], conf.window_n)
+            if conf.adaptive and conf.decide_every_s < old_conf.decide_every_s:
+                st["next_decide"] = min(st["next_decide"], t0 + conf.decide_every_s)
+        if sched is not None and added:
+            stagger(list(added))
+        if hasattr(ticks, "interval_s"):
+            ticks.interval_s = conf.poll_interval_s
+
+        STATS.inc("bitaxe_config_reloads_total", result="applied")
+        print(f"[main] config reloaded: {len(devices)} device(s) (+{len(added)} -{len(removed)})",
+              file=sys.stderr)
+        if pinned:
+            print(f"[main] config reload: {', '.join(pinned)} changed, applied on restart only", file=sys.stderr)
+
+    poller = poller or FleetPoller(poll_workers)
+    started = wall()
+    for d in cfg["devices"]:
+        add_device(new_device(d, started, conf))
+    if warm_cfg is not None and not cfg.get("log_metrics", False) and not any(st["fifo"] for st in devices.values()):
+        print("[main] warm start found no recent samples: it reads the metrics logs, written with "
+              "\"log_metrics\": true or by collector.py", file=sys.stderr)
+
+    # SIGTERM (systemd stop, docker stop) unwinds through the finally below like Ctrl+C
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+    ticks = ticks or FixedRateScheduler(conf.poll_interval_s)
+    sched = None
+    if conf.adaptive:
+        sched = FleetScheduler()
+        stagger(list(devices))
+    watcher = ConfigWatcher(cfg_path) if cfg_path is not None else None
 
     try:
         while True:
-            now = datetime.now()
-            for name, st in devices.items():
-                api: BitaxeAPI = st["api"]
+            if watcher is not None:
+                # Between two ticks: nothing of the old config is in use right now
+                reload()
+            # Fixed-rate ticks: the period does not stretch with request latency
+            t_wait = time.perf_counter()
+            if sched is None:
+                _, missed = ticks.wait()
+                due = apis
+            else:
+                fired = sched.wait()
+                missed = sum(m for _, _, m in fired)
+                due = {name: apis[name] for name, _, _ in fired}
+            t_poll = time.perf_counter()
+            if missed:
+                STATS.inc("bitaxe_ticks_missed_total", missed)
+                print(f"[main] {missed} tick(s) missed, loop fell behind", file=sys.stderr)
+            # Whole seconds, as logged: replay.py and backtest.py see the same sample times
+            now = datetime.fromtimestamp(wall()).replace(microsecond=0)
+            statuses = poller.poll(due, conf.tick_deadline_s)
+            t_process = time.perf_counter()
+
+            decided = False
+            batch = []
+            for name in due:
+                st = devices[name]
                 fifo = st["fifo"]
                 st["counter"] += 1
 
+                # Missed deadline, timeout or error: skip sample
+                status = statuses[name]
+                ex = None
                 sample = None
-                try:
-                    status = api.get_status()
-                    ex = _extract(status)
+                if status is not None:
+                    try:
+                        ex = _extract(st["api"], status)
+                    except Exception:
+                        ex = None
                     if ex:
                         temp, vr, err, freq, vcore = ex
                         sample = Sample(ts=now.timestamp(), temp=temp, vr_temp=vr, err=err, freq=freq, vcore=vcore)
                         fifo.append(sample)
-                except Exception:
-                    # Skip sample on timeout/error
-                    sample = None
+                        st["history"].append(sample)
+                if st["metrics_writer"] is not None:
+                    st["metrics_writer"].write(now, f"{fmt_ts(now)};" + (";".join(str(x) for x in ex) if ex else "NA;NA;NA;NA;NA"))
+                _log_outcomes(st, now, st["applier"].step(sample, now.timestamp()))
 
+                if sched is not None:
+                    sched.set_interval(name, poll_interval(fifo, conf.engine_cfg, conf.poll_min_s, conf.poll_max_s, conf.margin_c), reschedule=True)
+                    if now.timestamp() < st["next_decide"]:
+                        continue
+                    st["next_decide"] = now.timestamp() + conf.decide_every_s
                 # Decide/apply every N polls (roughly 60s at 5s interval)
-                if st["counter"] % apply_every_n != 0:
+                elif st["counter"] % conf.apply_every_n != 0:
                     continue
+                decided = True
 
                 if not fifo:
                     # Still log a decision line so you can see "why nothing happened"
@@ -100,41 +459,60 @@ def main():
                     st["writer"].write(now, line)
                     continue
 
-                d = decide(list(fifo), engine_cfg)
                 cur = fifo[-1]
+                stats = window_stats(fifo, conf.engine_cfg, st["history"])
+                pending = st["applier"].pending()
+                if stats is not None and pending:
+                    # Step from the settings on their way to the miner, not the ones it still reports
+                    stats.freq = pending.get("frequency", stats.freq)
+                    stats.vcore = pending.get("core_voltage", stats.vcore)
+                batch.append((st, cur, stats))
+
+            if batch:
+                # Every device due this tick goes through the compiled rule table in one call
+                with STATS.time("bitaxe_decide_seconds"):
+                    ds = conf.engine.evaluate_batch([stats for _, _, stats in batch])
+                for (st, cur, _), d in zip(batch, ds):
+                    st["writer"].write(now, _decision_line(now, d, cur))
+                    if d.action != "NO_CHANGE":
+                        # Queued per device; sent by the poller pool, outcome logged at a later poll
+                        target = {"frequency": d.new_freq} if d.new_freq is not None else {"core_voltage": d.new_vcore}
+                        _log_outcomes(st, now, st["applier"].request(target, now.timestamp()))
 
-                new_freq = d.new_freq
-                new_vcore = d.new_vcore
-
-                # Apply changes if needed
-                try:
-                    if d.action == "FREQ_DOWN" or d.action == "FREQ_UP":
-                        api.set_settings(frequency=new_freq)
-                    elif d.action == "VCORE_DOWN" or d.action == "VCORE_UP":
-                        api.set_settings(core_voltage=new_vcore)
-                    # NO_CHANGE: do nothing
-                except Exception:
-                    # If apply fails, keep decision but note it
-                    d = d.__class__(**{**d.__dict__, "reason": d.reason + "|apply_failed"})
-
-                line = (
-                    f"{fmt_ts(now)};"
-                    f"{d.temp_avg if d.temp_avg is not None else 'NA'};"
-                    f"{d.vr_temp_avg if d.vr_temp_avg is not None else 'NA'};"
-                    f"{d.err_avg if d.err_avg is not None else 'NA'};"
-                    f"{d.slope if d.slope is not None else 'NA'};"
-                    f"{cur.freq};{cur.vcore};"
-                    f"{d.action};"
-                    f"{new_freq if new_freq is not None else 'NA'};"
-                    f"{new_vcore if new_vcore is not None else 'NA'};"
-                    f"{d.reason}"
-                )
-                st["writer"].write(now, line)
-
-            time.sleep(max(0.0, poll_interval_s))
+            t_end = time.perf_counter()
+            STATS.observe("bitaxe_phase_seconds", t_poll - t_wait, phase="wait")
+            STATS.observe("bitaxe_phase_seconds", t_process - t_poll, phase="poll")
+            STATS.observe("bitaxe_phase_seconds", t_end - t_process, phase="process")
+            STATS.observe("bitaxe_phase_seconds", t_end - t_poll, phase="tick")
+            if stats_log is not None:
+                stats_log.maybe_dump()
+            if store is not None and decided:
+                store.save(_persisted(devices))
+            if on_tick is not None:
+                on_tick()
     finally:
+        poller.close()
+        if store is not None:
+            store.save(_persisted(devices))
         for st in devices.values():
-            st["writer"].close()
+            close_device(st)
+        if bg is not None:
+            bg.close()
+        if profile and stats_log is not None:
+            stats_log.maybe_dump(force=True)
+
+def main():
+    p = argparse.ArgumentParser(description="BitaxeLiveOptimizer - LIVE optimizer (indefinite)")
+    p.add_argument("--config", default="config.json", help="Path to config.json (default ./config.json)")
+    p.add_argument("--profile", action="store_true", help="Print per-phase timings to stderr every 60s and at exit")
+    args = p.parse_args()
+
+    cfg = load_config(Path(args.config))
+    try:
+        settings = _Settings(cfg)
+    except (KeyError, TypeError, ValueError) as e:
+        p.error(f"invalid config: {e}")
+    run(cfg, args.profile, cfg_path=Path(args.config), settings=settings)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,217 @@
+# metrics_bin.py
+# Compact binary metrics format (<logs_dir>/<name>/YYYYMMDD.bin), next to the text logs.
+#
+# File = 8-byte magic + fixed-width little-endian records (24 bytes, vs ~45 per text line):
+#   ts float64 | temp float32 | vrTemp float32 | errorPercentage float32 | frequency uint16 | coreVoltage uint16
+# Missed polls (NA) are kept as records with NaN temps/error and 0 freq/vcore.
+# Floats are read back as round(x * 1e4) / 1e4, which restores the logged values
+# exactly for readings with up to 4 decimals (AxeOS reports fewer).
+#
+# Usage:
+#   python3 metrics_bin.py convert bitaxe_logs/<name>            # every YYYYMMDD.log in the folder
+#   python3 metrics_bin.py convert bitaxe_logs/<name>/20260116.log
+from __future__ import annotations
+import argparse
+import math
+import mmap
+import struct
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, BinaryIO, ClassVar, Dict, Iterator, List, Optional, Union
+
+from log_utils import DailyFileWriter, METRICS_HEADER
+from log_reader import daily_files, parse_ts
+from models import Sample
+
+MAGIC = b"BXMETR01"
+RECORD = struct.Struct("<dfffHH")
+_NAN = float("nan")
+_DEC = 10000.0
+
+def _dtype():
+    import numpy as np
+    return np.dtype([("ts", "<f8"), ("temp", "<f4"), ("vr_temp", "<f4"), ("err", "<f4"), ("freq", "<u2"), ("vcore", "<u2")])
+
+def pack_row(ts: float, row: Optional[List[str]]) -> bytes:
+    """Pack the 5 value fields of a metrics row (None or any NA = missed poll)."""
+    if row is None or "NA" in row:
+        return RECORD.pack(ts, _NAN, _NAN, _NAN, 0, 0)
+    temp, vr, err, freq, vcore = row
+    return RECORD.pack(ts, float(temp), float(vr), float(err), int(freq), int(vcore))
+
+@dataclass
+class DailyBinaryWriter(DailyFileWriter):
+    """DailyFileWriter variant writing binary records; takes the same metrics lines."""
+    header: str = METRICS_HEADER
+
+    SUFFIX: ClassVar[str] = ".bin"
+
+    _fh: Optional[BinaryIO] = None
+
+    def _open_for(self, now: datetime) -> None:
+        yyyymmdd = now.strftime("%Y%m%d")
+        if self._current_date == yyyymmdd and self._fh is not None:
+            return
+        self.close()
+        self._current_date = yyyymmdd
+        path = self._path_for_date(yyyymmdd)
+        size = path.stat().st_size if path.exists() else 0
+        self._fh = open(path, "ab")
+        if size < len(MAGIC):
+            self._fh.truncate(0)
+            self._fh.write(MAGIC)
+            self._fh.flush()
+        elif (size - len(MAGIC)) % RECORD.size:
+            # Torn record from a crash: drop it so the file stays fixed-width
+            self._fh.truncate(size - (size - len(MAGIC)) % RECORD.size)
+        if self._pruned_on != yyyymmdd:
+            self._pruned_on = yyyymmdd
+            self._prune_old_files()
+
+    def write(self, now: datetime, line: str) -> None:
+        self._open_for(now)
+        assert self._fh is not None
+        parts = line.split(";")
+        self._fh.write(pack_row(now.timestamp(), parts[1:6] if len(parts) == 6 else None))
+        self._written(RECORD.size)
+
+def tail_bin_file(path: Union[str, Path], n: int, since: Optional[float] = None) -> List[Sample]:
+    """Last n valid samples with ts >= since, oldest first; only the tail records are touched."""
+    out: List[Sample] = []
+    with _records(path) as view:
+        if view is None:
+            return []
+        for k in range(len(view) // RECORD.size - 1, -1, -1):
+            ts, temp, vr, err, freq, vcore = RECORD.unpack_from(view, k * RECORD.size)
+            if since is not None and ts < since:
+                break
+            if math.isnan(temp) or math.isnan(vr) or math.isnan(err):
+                continue
+            out.append(Sample(ts=ts, temp=_decode(temp), vr_temp=_decode(vr), err=_decode(err), freq=freq, vcore=vcore))
+            if len(out) >= n:
+                break
+    out.reverse()
+    return out
+
+def _decode(x: float) -> float:
+    return round(x * _DEC) / _DEC
+
+@contextmanager
+def _records(path: Union[str, Path]) -> Iterator[Optional[memoryview]]:
+    """The memory-mapped records (None when there are none), unmapped on exit."""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path}: not a binary metrics file")
+        size = f.seek(0, 2)
+        n = (size - len(MAGIC)) // RECORD.size
+        if n == 0:
+            yield None
+            return
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(mm)[len(MAGIC): len(MAGIC) + n * RECORD.size]
+    try:
+        yield view
+    finally:
+        view.release()
+        try:
+            mm.close()
+        except BufferError:
+            pass  # a view escaped the block; the mapping goes away with it
+
+def iter_bin_file(path: Union[str, Path], start: Optional[float] = None, end: Optional[float] = None) -> Iterator[Sample]:
+    """Yield valid samples with start <= ts < end, like log_reader.iter_log_file."""
+    with _records(path) as view:
+        if view is None:
+            return
+        lo = 0
+        if start is not None:
+            # Records are in time order: bisect to the first one at or after start
+            hi = len(view) // RECORD.size
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if RECORD.unpack_from(view, mid * RECORD.size)[0] < start:
+                    lo = mid + 1
+                else:
+                    hi = mid
+        recs = view[lo * RECORD.size:]
+        try:
+            for ts, temp, vr, err, freq, vcore in RECORD.iter_unpack(recs):
+                if math.isnan(temp) or math.isnan(vr) or math.isnan(err):
+                    continue
+                if start is not None and ts < start:
+                    continue
+                if end is not None and ts >= end:
+                    return
+                yield Sample(ts=ts, temp=_decode(temp), vr_temp=_decode(vr), err=_decode(err), freq=freq, vcore=vcore)
+        finally:
+            recs.release()
+
+@contextmanager
+def open_columns(path: Union[str, Path]) -> Iterator[Dict[str, Any]]:
+    """Zero-copy numpy column views over a memory-mapped .bin file (raw float32 values).
+
+    with open_columns(p) as cols: ... - the views are only valid inside the block;
+    copy what must outlive it (indexing with a mask copies).
+    """
+    import numpy as np
+    with _records(path) as view:
+        arr = np.zeros(0, dtype=_dtype()) if view is None else np.frombuffer(view, dtype=_dtype())
+        cols = {name: arr[name] for name in arr.dtype.names}
+        cols["valid"] = ~(np.isnan(arr["temp"]) | np.isnan(arr["vr_temp"]) | np.isnan(arr["err"]))
+        try:
+            yield cols
+        finally:
+            # Drop every view of the mapping so it can be closed
+            cols.clear()
+            del arr
+
+def load_columns(paths: List[Path], start: Optional[float] = None, end: Optional[float] = None) -> Dict[str, Any]:
+    """Valid samples of several .bin files as decoded float64/int64 columns (backtest_numpy layout)."""
+    import numpy as np
+    parts: Dict[str, list] = {k: [] for k in ("ts", "temp", "vr_temp", "err", "freq", "vcore")}
+    for p in paths:
+        with open_columns(p) as c:
+            keep = c["valid"]
+            if start is not None:
+                keep = keep & (c["ts"] >= start)
+            if end is not None:
+                keep = keep & (c["ts"] < end)
+            parts["ts"].append(c["ts"][keep])
+            for k in ("temp", "vr_temp", "err"):
+                parts[k].append(np.round(c[k][keep].astype(np.float64) * _DEC) / _DEC)
+            for k in ("freq", "vcore"):
+                parts[k].append(c[k][keep].astype(np.int64))
+    empty = {"ts": np.float64, "temp": np.float64, "vr_temp": np.float64, "err": np.float64, "freq": np.int64, "vcore": np.int64}
+    return {k: np.concatenate(v) if v else np.zeros(0, dtype=empty[k]) for k, v in parts.items()}
+
+def convert_file(src: Path, dst: Optional[Path] = None) -> Path:
+    dst = dst or src.with_suffix(".bin")
+    tmp = dst.with_suffix(".bin.tmp")
+    with open(src, "r", encoding="utf-8") as fin, open(tmp, "wb") as fout:
+        fin.readline()  # header
+        fout.write(MAGIC)
+        for line in fin:
+            parts = line.rstrip("\n").split(";")
+            if len(parts) != 6:
+                continue
+            fout.write(pack_row(parse_ts(parts[0]), parts[1:]))
+    tmp.replace(dst)
+    return dst
+
+def main():
+    p = argparse.ArgumentParser(description="BitaxeLiveOptimizer - binary metrics tools")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    c = sub.add_parser("convert", help="Convert text metrics logs to .bin (written next to each .log)")
+    c.add_argument("path", help="A YYYYMMDD.log file or a device folder")
+    args = p.parse_args()
+
+    src = Path(args.path)
+    files = daily_files(src) if src.is_dir() else [src]
+    for f in files:
+        dst = convert_file(f)
+        print(f"{f} ({f.stat().st_size} B) -> {dst} ({dst.stat().st_size} B)")
+
+if __name__ == "__main__":
+    main()
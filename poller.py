@@ -0,0 +1,46 @@
+# poller.py
+# Concurrent fleet polling for main.py.
+# get_status is fanned out to every device on a bounded thread pool and the tick
+# only waits until a deadline: a slow or unreachable miner costs its own sample,
+# never the samples of the other devices.
+from __future__ import annotations
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Optional
+
+from bitaxe_api import BitaxeAPI
+from instrument import STATS
+
+class FleetPoller:
+    def __init__(self, max_workers: int):
+        self._pool = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="bitaxe-poll")
+        self._inflight: Dict[str, Future] = {}
+
+    def poll(self, apis: Dict[str, BitaxeAPI], deadline_s: float) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Return {name: status} for every device; None means failed or missed the deadline."""
+        pending: Dict[Future, str] = {}
+        for name, api in apis.items():
+            prev = self._inflight.get(name)
+            if prev is not None and not prev.done():
+                # Still stuck on an earlier tick: do not pile up requests on a dead miner
+                STATS.inc("bitaxe_poll_skipped_total", device=name)
+                continue
+            fut = self._pool.submit(api.get_status)
+            self._inflight[name] = fut
+            pending[fut] = name
+
+        wait(pending, timeout=max(0.0, deadline_s))
+
+        out: Dict[str, Optional[Dict[str, Any]]] = {name: None for name in apis}
+        for fut, name in pending.items():
+            if not fut.done():
+                STATS.inc("bitaxe_poll_late_total", device=name)
+            elif fut.exception() is None:
+                out[name] = fut.result()
+        return out
+
+    def submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+        return self._pool.submit(fn, *args, **kwargs)
+
+    def close(self) -> None:
+        # Wait for in-flight applies so writers are not closed under them
+        self._pool.shutdown(wait=True, cancel_futures=True)
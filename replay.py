@@ -0,0 +1,234 @@
+# replay.py
+# Time-warp replay of the full live loop (main.run) from recorded metrics logs.
+#
+# Unlike backtest.py, which only re-runs decide(), this drives main.py's real control
+# flow: decision counters, the apply queues and their retries through BitaxeAPI (with
+# optional injected failures), writer rollover at midnight, rollup, warm-start state. Nothing waits on
+# the wall clock:
+# - the ticks are the recorded poll timestamps (rows of all devices within half a
+#   poll interval are one tick), and the loop's clock jumps from one to the next;
+# - each BitaxeAPI talks to a fake HTTP session that answers status requests with
+#   the device's recorded row of the current tick (NA or no row = timeout) and
+#   accepts settings POSTs;
+# - polls and applies run inline on the loop thread, so every run is identical.
+# Given the metrics log written by a live main.py run ("log_metrics"), the replayed
+# decisions log is byte-identical to the live one, as long as the live applies
+# succeeded and the replay starts where the live run started (decision counter phase).
+# The recorded frequency/voltage are served as recorded (open loop, like backtest.py).
+#
+# Usage:
+#   python3 replay.py --config config.json --logs bitaxe_logs --out /tmp/replay
+#   python3 replay.py --config config.json --logs bitaxe_logs --out /tmp/replay --from 2026-01-10 --to 2026-01-17 --fail-rate 0.05
+#   python3 replay.py --config config.json --logs bitaxe_logs --out /tmp/replay --expect bitaxe_logs/decisions
+from __future__ import annotations
+import argparse
+import bisect
+import copy
+import random
+import sys
+import time
+from concurrent.futures import Future
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import requests
+
+from bitaxe_api import BitaxeAPI
+from config_loader import load_config
+from log_index import iter_lines
+from log_reader import daily_files, parse_when
+
+Row = Optional[List[str]]
+
+class ReplayDone(Exception):
+    """Raised by ReplayClock.wait() after the last recorded tick; ends main.run."""
+
+class ReplayClock:
+    """Wall clock and tick scheduler of the replayed loop (main.run clock= and ticks=)."""
+    def __init__(self, ticks: List[float]):
+        self.ticks = ticks
+        self.k = -1
+        self.t = ticks[0] if ticks else 0.0
+
+    def __call__(self) -> float:
+        return self.t
+
+    def wait(self) -> Tuple[float, int]:
+        self.k += 1
+        if self.k >= len(self.ticks):
+            raise ReplayDone()
+        self.t = self.ticks[self.k]
+        return self.t, 0
+
+class _Response:
+    def __init__(self, payload: Dict[str, Any]):
+        self._payload = payload
+
+    def raise_for_status(self) -> None:
+        pass
+
+    def json(self) -> Dict[str, Any]:
+        return self._payload
+
+class ReplaySession:
+    """requests.Session stand-in serving one device's recorded rows, indexed by tick."""
+    def __init__(self, rows: Dict[int, Row], clock: ReplayClock, fail_rate: float = 0.0,
+                 rng: Optional[random.Random] = None):
+        self.rows = rows
+        self.clock = clock
+        self.fail_rate = fail_rate
+        self.rng = rng or random.Random(0)
+        self.answered = 0
+        self.applied: List[Tuple[float, Dict[str, Any]]] = []
+        self.failed = 0
+
+    def get(self, url: str, timeout: Optional[float] = None) -> _Response:
+        row = self.rows.get(self.clock.k)
+        if row is None:
+            raise requests.Timeout(f"{url}: no recorded answer")
+        temp, vr, err, freq, vcore = row
+        self.answered += 1
+        return _Response({"temp": float(temp), "vrTemp": float(vr), "errorPercentage": float(err),
+                          "frequency": int(freq), "coreVoltage": int(vcore), "version": "replay"})
+
+    def post(self, url: str, json: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None) -> _Response:
+        if self.fail_rate > 0 and self.rng.random() < self.fail_rate:
+            self.failed += 1
+            raise requests.ConnectionError(f"{url}: injected failure")
+        self.applied.append((self.clock.t, dict(json or {})))
+        return _Response({})
+
+    def close(self) -> None:
+        pass
+
+class InlinePoller:
+    """FleetPoller stand-in: polls and applies run on the calling thread, in device order."""
+    def poll(self, apis: Dict[str, BitaxeAPI], deadline_s: float) -> Dict[str, Optional[Dict[str, Any]]]:
+        out: Dict[str, Optional[Dict[str, Any]]] = {}
+        for name, api in apis.items():
+            try:
+                out[name] = api.get_status()
+            except Exception:
+                out[name] = None
+        return out
+
+    def submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+        fut: Future = Future()
+        try:
+            fut.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            fut.set_exception(e)
+        return fut
+
+    def close(self) -> None:
+        pass
+
+def load_rows(folder: Path, start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[Tuple[float, Row]]:
+    """(ts, [temp, vr, err, freq, vcore] or None for NA) of every recorded poll, in order."""
+    out: List[Tuple[float, Row]] = []
+    t0 = start.timestamp() if start else None
+    t1 = end.timestamp() if end else None
+    for p in daily_files(folder, start, end):
+        for ts, line in iter_lines(p, t0, t1):
+            parts = line.split(";")
+            if len(parts) != 6:
+                continue
+            out.append((ts, None if "NA" in parts else parts[1:6]))
+    return out
+
+def group_ticks(stamps: List[float], tol_s: float) -> List[float]:
+    """Sorted tick times: timestamps closer than tol_s to the tick before them join it."""
+    ticks: List[float] = []
+    for ts in sorted(set(stamps)):
+        if not ticks or ts - ticks[-1] >= tol_s:
+            ticks.append(ts)
+    return ticks
+
+def replay(cfg: Dict[str, Any], logs_dir: Path, out_dir: Path, start: Optional[datetime] = None,
+           end: Optional[datetime] = None, fail_rate: float = 0.0, seed: int = 0) -> Dict[str, Any]:
+    """Run main.run over the recorded logs into out_dir; return a summary."""
+    import main
+
+    cfg = copy.deepcopy(cfg)
+    cfg["logs_dir"] = str(out_dir)
+    cfg.pop("metrics", None)
+    if cfg.get("warm_start") is not None:
+        cfg["warm_start"]["state_file"] = str(out_dir / "state.json")
+    poll_interval_s = float(cfg.get("poll_interval_s", 5.0))
+
+    recorded = {d["name"]: load_rows(logs_dir / d["name"], start, end) for d in cfg["devices"]}
+    ticks = group_ticks([ts for rows in recorded.values() for ts, _ in rows], poll_interval_s / 2)
+    clock = ReplayClock(ticks)
+    sessions: Dict[str, ReplaySession] = {}
+    for name, rows in recorded.items():
+        by_tick: Dict[int, Row] = {}
+        for ts, row in rows:
+            by_tick[bisect.bisect_right(ticks, ts) - 1] = row
+        sessions[name] = ReplaySession(by_tick, clock, fail_rate, random.Random(f"{seed}:{name}"))
+
+    def make_api(d: Dict[str, Any]) -> BitaxeAPI:
+        return BitaxeAPI(d["ip"], timeout_s=0.0, session=sessions[d["name"]], name=d["name"])
+
+    t0 = time.perf_counter()
+    try:
+        main.run(cfg, clock=clock, ticks=clock, make_api=make_api, poller=InlinePoller())
+    except ReplayDone:
+        pass
+    return {
+        "ticks": len(ticks),
+        "span_s": ticks[-1] - ticks[0] if ticks else 0.0,
+        "elapsed_s": time.perf_counter() - t0,
+        "polls_answered": sum(s.answered for s in sessions.values()),
+        "applies": sum(len(s.applied) for s in sessions.values()),
+        "apply_requests_failed": sum(s.failed for s in sessions.values()),
+        "devices_without_logs": [name for name, rows in recorded.items() if not rows],
+    }
+
+def compare_dirs(got: Path, expected: Path) -> List[str]:
+    """Relative paths of daily logs that differ between two decisions folders."""
+    diffs = []
+    names = {p.relative_to(got) for p in got.glob("*/*.log")} | {p.relative_to(expected) for p in expected.glob("*/*.log")}
+    for rel in sorted(names):
+        a, b = got / rel, expected / rel
+        if not a.exists() or not b.exists() or a.read_bytes() != b.read_bytes():
+            diffs.append(str(rel))
+    return diffs
+
+def main():
+    p = argparse.ArgumentParser(description="BitaxeLiveOptimizer - replay the live loop from recorded logs")
+    p.add_argument("--config", default="config.json", help="Config of the replayed run (devices, engine, cadence)")
+    p.add_argument("--logs", required=True, help="Recorded logs_dir (<name>/YYYYMMDD.log metrics logs)")
+    p.add_argument("--out", required=True, help="Empty folder for the replayed logs")
+    p.add_argument("--from", dest="start", default=None, help="YYYY-MM-DD[ HH:MM[:SS]]")
+    p.add_argument("--to", dest="end", default=None, help="YYYY-MM-DD[ HH:MM[:SS]] (a bare date includes that day)")
+    p.add_argument("--fail-rate", type=float, default=0.0, help="Probability that a settings request fails")
+    p.add_argument("--seed", type=int, default=0, help="Seed of the injected failures")
+    p.add_argument("--expect", default=None, help="Decisions folder the replayed one must match byte for byte")
+    args = p.parse_args()
+
+    cfg = load_config(Path(args.config))
+    if cfg.get("adaptive_poll") is not None:
+        p.error("replay follows the recorded fixed-rate ticks; remove adaptive_poll from the config")
+    out = Path(args.out)
+    if out.exists() and any(out.iterdir()):
+        p.error(f"{out} is not empty")
+    start = parse_when(args.start) if args.start else None
+    end = parse_when(args.end, end=True) if args.end else None
+
+    s = replay(cfg, Path(args.logs), out, start, end, args.fail_rate, args.seed)
+    if s["devices_without_logs"]:
+        print(f"[replay] no recorded rows for: {', '.join(s['devices_without_logs'])}", file=sys.stderr)
+    print(f"{s['ticks']} ticks ({s['span_s'] / 86400:.2f} days) replayed in {s['elapsed_s']:.2f}s, "
+          f"{s['polls_answered']} polls answered, {s['applies']} applies, "
+          f"{s['apply_requests_failed']} failed settings requests")
+
+    if args.expect:
+        diffs = compare_dirs(out / "decisions", Path(args.expect))
+        for rel in diffs:
+            print(f"DIFF {rel}")
+        print("decisions identical" if not diffs else f"{len(diffs)} file(s) differ")
+        sys.exit(1 if diffs else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# rolling.py
+# Incremental rolling-window statistics for the decision engine.
+# Running sums (Σt, Σt², Σy, Σty per metric) are updated as samples are pushed and
+# evicted, so the mean and least-squares slope of the window cost O(1) per call
+# whatever the window length (hours of 1-10s samples are fine).
+#
+# Tolerance vs the two-pass reference (sum(ys)/n and decision_engine._linreg_slope):
+#   |mean - ref| <= 1e-9 * max(1, |ref|)
+#   |slope - ref| <= 1e-9 * max(1e-6, |ref|)   (°C/s)
+# Timestamps are summed relative to an origin inside the window, and all sums are
+# rebuilt from the samples every maxlen pushes, so rounding error cannot build up
+# over a long-running process. A window whose timestamps are all equal has slope 0.
+from __future__ import annotations
+from collections import deque
+from typing import Deque, Dict, Iterator
+
+from models import Sample
+
+METRICS = ("temp", "vr_temp", "err")
+
+class RollingWindow:
+    def __init__(self, maxlen: int):
+        if maxlen < 1:
+            raise ValueError("maxlen must be >= 1")
+        self.maxlen = maxlen
+        self._samples: Deque[Sample] = deque()
+        self._t0 = 0.0
+        self._st = 0.0
+        self._stt = 0.0
+        self._sy: Dict[str, float] = {m: 0.0 for m in METRICS}
+        self._sty: Dict[str, float] = {m: 0.0 for m in METRICS}
+        self._since_resync = 0
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def __iter__(self) -> Iterator[Sample]:
+        return iter(self._samples)
+
+    def __getitem__(self, i: int) -> Sample:
+        return self._samples[i]
+
+    def append(self, s: Sample) -> None:
+        if not self._samples:
+            self._t0 = s.ts
+        elif len(self._samples) == self.maxlen:
+            old = self._samples.popleft()
+            t = old.ts - self._t0
+            self._st -= t
+            self._stt -= t * t
+            for m in METRICS:
+                y = getattr(old, m)
+                self._sy[m] -= y
+                self._sty[m] -= t * y
+
+        self._samples.append(s)
+        t = s.ts - self._t0
+        self._st += t
+        self._stt += t * t
+        for m in METRICS:
+            y = getattr(s, m)
+            self._sy[m] += y
+            self._sty[m] += t * y
+
+        self._since_resync += 1
+        if self._since_resync >= self.maxlen:
+            self._resync()
+
+    def clear(self) -> None:
+        self._samples.clear()
+        self._resync()
+
+    def _resync(self) -> None:
+        # Exact rebuild, amortized O(1): runs once every maxlen pushes
+        self._since_resync = 0
+        self._t0 = self._samples[0].ts if self._samples else 0.0
+        self._st = self._stt = 0.0
+        self._sy = {m: 0.0 for m in METRICS}
+        self._sty = {m: 0.0 for m in METRICS}
+        for s in self._samples:
+            t = s.ts - self._t0
+            self._st += t
+            self._stt += t * t
+            for m in METRICS:
+                y = getattr(s, m)
+                self._sy[m] += y
+                self._sty[m] += t * y
+
+    def mean(self, metric: str) -> float:
+        n = len(self._samples)
+        return self._sy[metric] / n if n else 0.0
+
+    def slope(self, metric: str) -> float:
+        """Least-squares slope of metric over time (units per second)."""
+        n = len(self._samples)
+        if n < 2:
+            return 0.0
+        den = n * self._stt - self._st * self._st
+        # All timestamps equal (up to rounding): same answer as _linreg_slope's den == 0
+        if den <= 1e-12 * n * self._stt:
+            return 0.0
+        return (n * self._sty[metric] - self._st * self._sy[metric]) / den
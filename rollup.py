@@ -0,0 +1,356 @@
+# rollup.py
+# Compaction of expiring daily logs into long-lived aggregate tiers, and a query
+# tool that reads across the raw and rolled-up tiers.
+#
+# Before DailyFileWriter deletes a daily file older than keep_days (see the
+# "rollup" section of config.json), it is rolled into:
+#   <logs_dir>/<name>/1m/YYYYMM.log              per-minute metrics   (~115 KB/day)
+#   <logs_dir>/<name>/1h/YYYY.log                per-hour metrics     (~0.8 MB/year)
+#   <logs_dir>/decisions/<name>/1h/YYYY.log      per-hour decision counts
+# Buckets are whole local minutes/hours, so none spans two daily files (also with
+# +05:30-style UTC offsets).
+# Metric rows: timestamp (bucket start);samples;temp mean/min/max;vrTemp mean/min/max;
+# errorPercentage mean/min/max;frequency;coreVoltage (most frequent in the bucket).
+# Per-minute files older than keep_1m_months are deleted; per-hour files are kept.
+# Appends resume after the last bucket already in a tier file, so compacting a day
+# twice (crash between rollup and delete) does not duplicate rows.
+#
+# Usage:
+#   python3 rollup.py compact --device-dir bitaxe_logs/<name> --before 2026-01-01 [--delete]
+#   python3 rollup.py query --device-dir bitaxe_logs/<name> --from 2025-01-01 --to 2025-12-31 \
+#       --res 1h --by month,frequency --out temp_vs_freq.csv
+# query reads the tier for days that have been rolled up and aggregates the raw
+# daily files still on disk at the same resolution, so a range can span both.
+from __future__ import annotations
+import argparse
+import csv
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from log_reader import daily_files, iter_samples, parse_ts, parse_when
+from log_utils import fmt_ts
+from models import Sample
+
+# tier -> (bucket seconds, file period as strftime)
+TIERS: Dict[str, Tuple[int, str]] = {"1m": (60, "%Y%m"), "1h": (3600, "%Y")}
+
+ROLLUP_HEADER = (
+    "timestamp;samples;tempMean;tempMin;tempMax;vrTempMean;vrTempMin;vrTempMax;"
+    "errMean;errMin;errMax;frequency;coreVoltage"
+)
+DECISIONS_ROLLUP_HEADER = "timestamp;decisions;FREQ_DOWN;FREQ_UP;VCORE_DOWN;VCORE_UP;NO_CHANGE;applyFailed;frequency;coreVoltage"
+ACTIONS = ("FREQ_DOWN", "FREQ_UP", "VCORE_DOWN", "VCORE_UP", "NO_CHANGE")
+
+# Aggregate row: [bucket ts, n, temp mean/min/max, vr mean/min/max, err mean/min/max, freq, vcore]
+Row = list
+
+class _Bucket:
+    __slots__ = ("start", "n", "sums", "mins", "maxs", "freqs", "vcores")
+
+    def __init__(self, start: float):
+        self.start = start
+        self.n = 0
+        self.sums = [0.0, 0.0, 0.0]
+        self.mins = [float("inf")] * 3
+        self.maxs = [float("-inf")] * 3
+        self.freqs: Counter = Counter()
+        self.vcores: Counter = Counter()
+
+    def add(self, s: Sample) -> None:
+        self.n += 1
+        for i, y in enumerate((s.temp, s.vr_temp, s.err)):
+            self.sums[i] += y
+            if y < self.mins[i]:
+                self.mins[i] = y
+            if y > self.maxs[i]:
+                self.maxs[i] = y
+        self.freqs[s.freq] += 1
+        self.vcores[s.vcore] += 1
+
+    def row(self) -> Row:
+        out: Row = [self.start, self.n]
+        for i in range(3):
+            out += [round(self.sums[i] / self.n, 3), self.mins[i], self.maxs[i]]
+        out += [self.freqs.most_common(1)[0][0], self.vcores.most_common(1)[0][0]]
+        return out
+
+def bucket_start(ts: float, res_s: int) -> float:
+    """Start of the res_s bucket holding ts, aligned on local wall-clock time.
+
+    Epoch alignment would put hour boundaries at :30 in a +05:30 zone, and the bucket
+    across local midnight would then span two daily files.
+    """
+    off = time.localtime(ts).tm_gmtoff
+    return (ts + off) // res_s * res_s - off
+
+def aggregate(samples: Iterable[Sample], res_s: int) -> Iterator[Row]:
+    """Aggregate time-ordered samples into res_s buckets (whole local minutes/hours)."""
+    b: Optional[_Bucket] = None
+    for s in samples:
+        if b is None or not b.start <= s.ts < b.start + res_s:
+            if b is not None:
+                yield b.row()
+            b = _Bucket(bucket_start(s.ts, res_s))
+        b.add(s)
+    if b is not None:
+        yield b.row()
+
+def _format_row(r: Row) -> str:
+    return fmt_ts(datetime.fromtimestamp(r[0])) + ";" + ";".join(str(x) for x in r[1:])
+
+def _last_ts(path: Path) -> Optional[float]:
+    """Timestamp of the last row of a tier file (None if missing or header only)."""
+    if not path.exists():
+        return None
+    with open(path, "rb") as f:
+        f.seek(0, 2)
+        size = f.tell()
+        f.seek(max(0, size - 4096))
+        lines = f.read().decode("utf-8", "replace").rstrip("\n").split("\n")
+    last = lines[-1]
+    if not last or last.startswith("timestamp"):
+        return None
+    return parse_ts(last.split(";", 1)[0])
+
+class _TierAppender:
+    """Appends rows to period files of a tier, skipping rows not newer than what is there."""
+    def __init__(self, folder: Path, period_fmt: str, header: str):
+        self.folder = folder
+        self.period_fmt = period_fmt
+        self.header = header
+        self._period: Optional[str] = None
+        self._fh = None
+        self._after: Optional[float] = None
+
+    def write(self, ts: float, line: str) -> None:
+        period = datetime.fromtimestamp(ts).strftime(self.period_fmt)
+        if period != self._period:
+            self.close()
+            self.folder.mkdir(parents=True, exist_ok=True)
+            path = self.folder / f"{period}.log"
+            self._after = _last_ts(path)
+            new_file = not path.exists()
+            self._fh = open(path, "a", encoding="utf-8", newline="\n")
+            if new_file:
+                self._fh.write(self.header + "\n")
+            self._period = period
+        if self._after is not None and ts <= self._after:
+            return
+        self._fh.write(line + "\n")
+
+    def close(self) -> None:
+        if self._fh is not None:
+            self._fh.close()
+        self._fh = None
+        self._period = None
+
+def compact_metrics(path: Union[str, Path], keep_1m_months: int = 12) -> None:
+    """Roll one daily metrics file (.log or .bin) into the 1m and 1h tiers of its device folder."""
+    path = Path(path)
+    device_dir = path.parent
+    appenders = {tier: _TierAppender(device_dir / tier, fmt, ROLLUP_HEADER) for tier, (_, fmt) in TIERS.items()}
+    buckets: Dict[str, Optional[_Bucket]] = {tier: None for tier in TIERS}
+    try:
+        # One pass over the day feeds every tier
+        for s in iter_samples(path):
+            for tier, (res_s, _) in TIERS.items():
+                b = buckets[tier]
+                if b is None or not b.start <= s.ts < b.start + res_s:
+                    if b is not None:
+                        appenders[tier].write(b.start, _format_row(b.row()))
+                    b = buckets[tier] = _Bucket(bucket_start(s.ts, res_s))
+                b.add(s)
+        for tier, b in buckets.items():
+            if b is not None:
+                appenders[tier].write(b.start, _format_row(b.row()))
+    finally:
+        for a in appenders.values():
+            a.close()
+    if keep_1m_months > 0:
+        _prune_tier(device_dir / "1m", keep_1m_months)
+
+def _prune_tier(folder: Path, keep_months: int) -> None:
+    now = datetime.now()
+    k = now.year * 12 + now.month - 1 - keep_months
+    oldest = f"{k // 12:04d}{k % 12 + 1:02d}"
+    for p in folder.glob("*.log"):
+        if len(p.stem) == 6 and p.stem.isdigit() and p.stem < oldest:
+            try:
+                p.unlink()
+            except OSError:
+                pass
+
+def compact_decisions(path: Union[str, Path]) -> None:
+    """Roll one daily decisions file into per-hour counts (<decisions>/<name>/1h/YYYY.log)."""
+    path = Path(path)
+    appender = _TierAppender(path.parent / "1h", TIERS["1h"][1], DECISIONS_ROLLUP_HEADER)
+    hour: Optional[float] = None
+    counts: Counter = Counter()
+    freq = vcore = "NA"
+
+    def flush() -> None:
+        row = [counts["total"]] + [counts[a] for a in ACTIONS] + [counts["apply_failed"], freq, vcore]
+        appender.write(hour, fmt_ts(datetime.fromtimestamp(hour)) + ";" + ";".join(str(x) for x in row))
+
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            f.readline()  # header
+            for line in f:
+                parts = line.rstrip("\n").split(";")
+                if len(parts) != 11:
+                    continue
+                h = bucket_start(parse_ts(parts[0]), 3600)
+                if hour is not None and h != hour:
+                    flush()
+                    counts.clear()
+                hour = h
+                # "apply_failed" outcome lines; before the apply queues, "<reason>|apply_failed"
+                # decisions. apply_failed_verify (sent, miner kept other settings) is not counted.
+                if parts[10] == "apply_failed" or parts[10].endswith("|apply_failed"):
+                    counts["apply_failed"] += 1
+                if parts[7] == "APPLY":
+                    continue  # outcome of an earlier decision (main.py), not a decision
+                counts["total"] += 1
+                counts[parts[7]] += 1
+                if parts[5] != "NA":
+                    freq, vcore = parts[5], parts[6]
+        if hour is not None:
+            flush()
+    finally:
+        appender.close()
+
+def _tier_files(folder: Path, fmt: str, start: Optional[datetime], end: Optional[datetime]) -> List[Path]:
+    lo = start.strftime(fmt) if start else None
+    hi = end.strftime(fmt) if end else None
+    out = []
+    for p in sorted(folder.glob("*.log")):
+        if not p.stem.isdigit():
+            continue
+        if (lo is not None and p.stem < lo) or (hi is not None and p.stem > hi):
+            continue
+        out.append(p)
+    return out
+
+def _parse_row(parts: List[str]) -> Row:
+    return [parse_ts(parts[0]), int(parts[1])] + [float(x) for x in parts[2:11]] + [int(parts[11]), int(parts[12])]
+
+def iter_rows(device_dir: Union[str, Path], res: str = "1h", start: Optional[datetime] = None,
+              end: Optional[datetime] = None, suffix: str = ".log") -> Iterator[Row]:
+    """Aggregate rows at resolution res over [start, end): rolled-up tier first, then raw daily files."""
+    device_dir = Path(device_dir)
+    res_s, fmt = TIERS[res]
+    t0 = start.timestamp() if start else None
+    t1 = end.timestamp() if end else None
+    raw = daily_files(device_dir, start, end, suffix)
+    # Raw days still on disk win over the tier (their rows may not be rolled up yet)
+    raw_from = datetime.strptime(raw[0].stem, "%Y%m%d").timestamp() if raw else None
+    for p in _tier_files(device_dir / res, fmt, start, end):
+        with open(p, "r", encoding="utf-8") as f:
+            f.readline()
+            for line in f:
+                parts = line.rstrip("\n").split(";")
+                if len(parts) != 13:
+                    continue
+                r = _parse_row(parts)
+                if (t0 is not None and r[0] < t0) or (t1 is not None and r[0] >= t1):
+                    continue
+                if raw_from is not None and r[0] >= raw_from:
+                    break
+                yield r
+    for p in raw:
+        yield from aggregate(iter_samples(p, t0, t1), res_s)
+
+_GROUP_KEYS = {
+    "month": lambda r: datetime.fromtimestamp(r[0]).strftime("%Y-%m"),
+    "day": lambda r: datetime.fromtimestamp(r[0]).strftime("%Y-%m-%d"),
+    "hour_of_day": lambda r: datetime.fromtimestamp(r[0]).hour,
+    "frequency": lambda r: r[11],
+    "coreVoltage": lambda r: r[12],
+}
+
+def group_rows(rows: Iterable[Row], by: List[str]) -> Tuple[List[str], List[list]]:
+    """Sample-weighted means and overall min/max per group."""
+    acc: Dict[tuple, list] = {}
+    for r in rows:
+        key = tuple(_GROUP_KEYS[k](r) for k in by)
+        a = acc.get(key)
+        if a is None:
+            a = acc[key] = [0, 0.0, float("inf"), float("-inf"), 0.0, float("inf"), float("-inf"), 0.0, float("inf"), float("-inf")]
+        n = r[1]
+        a[0] += n
+        for i in range(3):
+            a[1 + 3 * i] += r[2 + 3 * i] * n
+            a[2 + 3 * i] = min(a[2 + 3 * i], r[3 + 3 * i])
+            a[3 + 3 * i] = max(a[3 + 3 * i], r[4 + 3 * i])
+    header = by + ROLLUP_HEADER.split(";")[1:11]
+    out = []
+    for key in sorted(acc):
+        a = acc[key]
+        vals = [a[0]]
+        for i in range(3):
+            vals += [round(a[1 + 3 * i] / a[0], 3), a[2 + 3 * i], a[3 + 3 * i]]
+        out.append(list(key) + vals)
+    return header, out
+
+def main():
+    p = argparse.ArgumentParser(description="BitaxeLiveOptimizer - log rollup and long-range queries")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    c = sub.add_parser("compact", help="Roll raw daily files into the 1m/1h tiers (backfill)")
+    c.add_argument("--device-dir", required=True, help="Device folder (<logs_dir>/<name> or <logs_dir>/decisions/<name>)")
+    c.add_argument("--before", required=True, help="Roll days before this date (YYYY-MM-DD)")
+    c.add_argument("--format", choices=["log", "bin"], default="log", help="Raw metrics format (default log)")
+    c.add_argument("--decisions", action="store_true", help="The folder holds decisions files")
+    c.add_argument("--keep-1m-months", type=int, default=12, help="Per-minute tier retention (default 12, 0 = forever)")
+    c.add_argument("--delete", action="store_true", help="Delete raw files once rolled up")
+    q = sub.add_parser("query", help="Aggregate metrics over the raw and rolled-up tiers")
+    q.add_argument("--device-dir", required=True, help="Device folder (<logs_dir>/<name>)")
+    q.add_argument("--from", dest="start", default=None, help="Start, inclusive (YYYY-MM-DD[ HH:MM:SS])")
+    q.add_argument("--to", dest="end", default=None, help="End, exclusive; a bare date includes that day")
+    q.add_argument("--res", choices=sorted(TIERS), default="1h", help="Resolution (default 1h)")
+    q.add_argument("--format", choices=["log", "bin"], default="log", help="Raw daily file format (default log)")
+    q.add_argument("--by", default="", help=f"Group by comma-separated keys: {', '.join(_GROUP_KEYS)} (default: no grouping)")
+    q.add_argument("--out", default=None, help="Output CSV (default stdout)")
+    args = p.parse_args()
+
+    if args.cmd == "compact":
+        before = parse_when(args.before)
+        files = [f for f in daily_files(args.device_dir, None, None, "." + args.format)
+                 if f.stem < before.strftime("%Y%m%d")]
+        for f in files:
+            if args.decisions:
+                compact_decisions(f)
+            else:
+                compact_metrics(f, args.keep_1m_months)
+            if args.delete:
+                f.unlink()
+                f.with_suffix(".idx").unlink(missing_ok=True)
+        print(f"{len(files)} daily file(s) rolled up" + (" and deleted" if args.delete else ""))
+        return
+
+    start = parse_when(args.start) if args.start else None
+    end = parse_when(args.end, end=True) if args.end else None
+    by = [k.strip() for k in args.by.split(",") if k.strip()]
+    unknown = set(by) - set(_GROUP_KEYS)
+    if unknown:
+        p.error(f"unknown --by key(s): {', '.join(sorted(unknown))}")
+    rows = iter_rows(args.device_dir, args.res, start, end, "." + args.format)
+    if by:
+        header, table = group_rows(rows, by)
+    else:
+        header = ROLLUP_HEADER.split(";")
+        table = ([fmt_ts(datetime.fromtimestamp(r[0]))] + r[1:] for r in rows)
+    f = open(args.out, "w", newline="", encoding="utf-8") if args.out else sys.stdout
+    try:
+        w = csv.writer(f)
+        w.writerow(header)
+        w.writerows(table)
+    finally:
+        if args.out:
+            f.close()
+
+if __name__ == "__main__":
+    main()
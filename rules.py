@@ -0,0 +1,229 @@
+# rules.py
+# Declarative decision rules (config.json engine.rules), compiled once at startup.
+#
+# A rule is a JSON object, evaluated in table order; the first rule that produces a
+# change wins, otherwise the decision is NO_CHANGE "stable":
+#   {"reason": "temp_hard",                                   # reason written to the log
+#    "all": [["err_avg", ">=", "err_crit"]],                  # every condition must hold
+#    "any": [["temp_avg", ">=", "asic_hard"], ...],           # at least one (if given)
+#    "try": ["freq_down", "vcore_down"],                      # first action that changes a value
+#    "at_limit": "at_min_limits_temp_hard",                   # optional: stop with NO_CHANGE when none can
+#    "enabled": "allow_ramp_up"}                              # optional: engine key or true/false
+# Conditions are [metric, op, threshold]; the threshold is a number or an engine key.
+# Metrics: temp_avg, vr_avg, err_avg, slope (max of ASIC/VR), freq, vcore, and
+# drift_temp / drift_vr (averages projected drift_horizon_s ahead along the
+# long-horizon slope; -inf while the drift rule is off or its history too short).
+# Ops: >= > <= < == !=. Actions: freq_down, vcore_down, freq_up, vcore_up (steps and
+# limits from the engine section).
+#
+# DEFAULT_RULES is decision_engine.decide() as a table: without engine.rules the
+# compiled engine makes exactly the same decisions.
+#
+# Usage:
+#   engine = compile_rules(cfg["engine"])          # ValueError on an invalid table
+#   decisions = engine.evaluate_batch([window_stats(w, cfg["engine"], h) for w, h in devices])
+from __future__ import annotations
+import math
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+from decision_engine import _linreg_slope
+from history import MultiResHistory
+from models import Decision, Sample
+from rolling import RollingWindow
+
+DEFAULT_RULES: List[Dict[str, Any]] = [
+    {"reason": "temp_hard", "any": [["temp_avg", ">=", "asic_hard"], ["vr_avg", ">=", "vr_hard"]],
+     "try": ["freq_down", "vcore_down"], "at_limit": "at_min_limits_temp_hard"},
+    {"reason": "slope_exceeded", "all": [["slope", ">=", "slope_limit"]],
+     "any": [["temp_avg", ">=", "asic_soft"], ["vr_avg", ">=", "vr_soft"]], "try": ["freq_down"]},
+    {"reason": "err_crit", "all": [["err_avg", ">=", "err_crit"]],
+     "try": ["freq_down", "vcore_down"], "at_limit": "at_min_limits_err_crit"},
+    {"reason": "err_high", "all": [["err_avg", ">=", "err_high"]], "try": ["freq_down"]},
+    {"reason": "drift", "any": [["drift_temp", ">=", "asic_hard"], ["drift_vr", ">=", "vr_hard"]], "try": ["freq_down"]},
+    {"reason": "margin", "enabled": "allow_ramp_up",
+     "all": [["err_avg", "<=", "err_low"], ["temp_avg", "<=", "asic_soft"], ["vr_avg", "<=", "vr_soft"],
+             ["slope", "<", "slope_limit"], ["drift_temp", "<", "asic_soft"], ["drift_vr", "<", "vr_soft"]],
+     "try": ["freq_up"]},
+]
+
+OPS = (">=", ">", "<=", "<", "==", "!=")
+
+# Action -> (Decision action, setting, step sign)
+ACTIONS: Dict[str, Tuple[str, str, int]] = {
+    "freq_down": ("FREQ_DOWN", "freq", -1),
+    "vcore_down": ("VCORE_DOWN", "vcore", -1),
+    "freq_up": ("FREQ_UP", "freq", 1),
+    "vcore_up": ("VCORE_UP", "vcore", 1),
+}
+
+class WindowStats:
+    """Per-device inputs of the rules, computed once per decision."""
+    __slots__ = ("temp_avg", "vr_avg", "err_avg", "slope", "freq", "vcore", "drift_temp", "drift_vr")
+
+    def __init__(self, temp_avg: float, vr_avg: float, err_avg: float, slope: float, freq: int, vcore: int,
+                 drift_temp: float = -math.inf, drift_vr: float = -math.inf):
+        self.temp_avg = temp_avg
+        self.vr_avg = vr_avg
+        self.err_avg = err_avg
+        self.slope = slope
+        self.freq = freq
+        self.vcore = vcore
+        self.drift_temp = drift_temp
+        self.drift_vr = drift_vr
+
+METRICS = WindowStats.__slots__
+
+def window_stats(window: Union[List[Sample], RollingWindow], cfg: Dict[str, Any],
+                 history: Optional[MultiResHistory] = None) -> Optional[WindowStats]:
+    """Same statistics as decide(); None when the window has too few samples."""
+    if len(window) < cfg["window_n_min_valid"]:
+        return None
+    if isinstance(window, RollingWindow):
+        temp_avg = window.mean("temp")
+        vr_avg = window.mean("vr_temp")
+        err_avg = window.mean("err")
+        slope = max(window.slope("temp"), window.slope("vr_temp"))
+    else:
+        n = len(window)
+        ts = [s.ts for s in window]
+        temps = [s.temp for s in window]
+        vrs = [s.vr_temp for s in window]
+        temp_avg = sum(temps) / n
+        vr_avg = sum(vrs) / n
+        err_avg = sum(s.err for s in window) / n
+        slope = max(_linreg_slope(ts, temps), _linreg_slope(ts, vrs))
+    cur = window[-1]
+    st = WindowStats(temp_avg, vr_avg, err_avg, slope, cur.freq, cur.vcore)
+    horizon = cfg.get("drift_horizon_s", 0)
+    if history is not None and horizon > 0:
+        level = cfg.get("drift_level", "15m")
+        a = history.stats(level, "temp")
+        v = history.stats(level, "vr_temp")
+        if a is not None and v is not None and a.buckets >= cfg.get("drift_min_buckets", 4):
+            st.drift_temp = temp_avg + max(0.0, a.slope) * horizon
+            st.drift_vr = vr_avg + max(0.0, v.slope) * horizon
+    return st
+
+class RuleEngine:
+    """A compiled rule table.
+
+    The table becomes one Python function with thresholds, steps and limits inlined as
+    literals (source kept in .source), so a decision costs about what the hand-written
+    cascade does. Only whitelisted metrics, ops and actions and validated numbers and
+    reason strings ever reach the generated code.
+    """
+    __slots__ = ("rules", "source", "_fn")
+
+    def __init__(self, rules: List[Dict[str, Any]], source: str):
+        self.rules = rules
+        self.source = source
+        scope: Dict[str, Any] = {"Decision": Decision}
+        exec(compile(source, "<engine.rules>", "exec"), scope)
+        self._fn = scope["evaluate"]
+
+    def evaluate(self, st: Optional[WindowStats]) -> Decision:
+        return self._fn(st) if st is not None else _INSUFFICIENT
+
+    def evaluate_batch(self, stats: Sequence[Optional[WindowStats]]) -> List[Decision]:
+        """Decisions for many devices in one call, in input order."""
+        fn = self._fn
+        return [fn(st) if st is not None else _INSUFFICIENT for st in stats]
+
+    def decide(self, window: Union[List[Sample], RollingWindow], cfg: Dict[str, Any],
+               history: Optional[MultiResHistory] = None) -> Decision:
+        """Drop-in for decision_engine.decide with this rule table."""
+        return self.evaluate(window_stats(window, cfg, history))
+
+_INSUFFICIENT = Decision(action="NO_CHANGE", reason="window_insufficient")
+
+def _generate(rules: List[Tuple[str, Tuple, Tuple, Tuple, Optional[str]]], cfg: Dict[str, Any]) -> str:
+    # Values as configured, so the arithmetic is decide()'s
+    lim = {
+        "freq": (cfg["freq_min"], cfg["freq_max"], cfg["freq_step"]),
+        "vcore": (cfg["vcore_min"], cfg["vcore_max"], cfg["vcore_step"]),
+    }
+    stats = "temp_avg, vr_avg, err_avg, slope"
+    used = sorted({m for _, all_, any_, _, _ in rules for m, _, _ in all_ + any_}
+                  | {"temp_avg", "vr_avg", "err_avg", "slope", "freq", "vcore"})
+    out = ["def evaluate(st):"]
+    out += [f"    {m} = st.{m}" for m in used]
+    for reason, all_, any_, actions, at_limit in rules:
+        conds = [f"{m} {op} {x!r}" for m, op, x in all_]
+        if any_:
+            conds.append("(" + " or ".join(f"{m} {op} {x!r}" for m, op, x in any_) + ")")
+        out.append(f"    if {' and '.join(conds)}:")
+        for action, setting, sign in actions:
+            lo, hi, step = lim[setting]
+            out.append(f"        new = max({lo!r}, min({hi!r}, {setting} {'+' if sign > 0 else '-'} {step!r}))")
+            out.append(f"        if new != {setting}:")
+            args = "new, None" if setting == "freq" else "None, new"
+            out.append(f"            return Decision({action!r}, {args}, {reason!r}, {stats})")
+        if at_limit is not None:
+            out.append(f"        return Decision('NO_CHANGE', None, None, {at_limit!r}, {stats})")
+    out.append(f"    return Decision('NO_CHANGE', None, None, 'stable', {stats})")
+    return "\n".join(out) + "\n"
+
+def _conditions(where: str, conds: Any, cfg: Dict[str, Any]) -> Tuple:
+    if not isinstance(conds, list):
+        raise ValueError(f"{where}: expected a list of [metric, op, threshold]")
+    out = []
+    for c in conds:
+        if not isinstance(c, list) or len(c) != 3:
+            raise ValueError(f"{where}: {c!r} is not [metric, op, threshold]")
+        metric, op, x = c
+        if metric not in METRICS:
+            raise ValueError(f"{where}: unknown metric {metric!r} (one of {', '.join(METRICS)})")
+        if op not in OPS:
+            raise ValueError(f"{where}: unknown op {op!r} (one of {' '.join(OPS)})")
+        if isinstance(x, str):
+            if not isinstance(cfg.get(x), (int, float)) or isinstance(cfg.get(x), bool):
+                raise ValueError(f"{where}: threshold {x!r} is not a numeric engine key")
+            x = cfg[x]
+        elif not isinstance(x, (int, float)) or isinstance(x, bool):
+            raise ValueError(f"{where}: threshold {x!r} must be a number or an engine key")
+        if not math.isfinite(float(x)):
+            raise ValueError(f"{where}: threshold {x!r} must be finite")
+        out.append((metric, op, float(x)))
+    return tuple(out)
+
+def compile_rules(cfg: Dict[str, Any]) -> RuleEngine:
+    """Validate cfg["rules"] (default: DEFAULT_RULES) against the engine section and compile it."""
+    table = cfg.get("rules", DEFAULT_RULES)
+    if not isinstance(table, list):
+        raise ValueError("engine.rules must be a list of rules")
+    for key in ("freq_min", "freq_max", "freq_step", "vcore_min", "vcore_max", "vcore_step"):
+        v = cfg.get(key)
+        if not isinstance(v, (int, float)) or isinstance(v, bool) or not math.isfinite(v):
+            raise ValueError(f"engine.{key} is missing or not a number")
+    rules = []
+    for i, r in enumerate(table):
+        where = f"engine.rules[{i}]"
+        if not isinstance(r, dict):
+            raise ValueError(f"{where}: expected an object")
+        unknown = set(r) - {"reason", "all", "any", "try", "at_limit", "enabled"}
+        if unknown:
+            raise ValueError(f"{where}: unknown key(s) {', '.join(sorted(unknown))}")
+        reason = r.get("reason")
+        if not isinstance(reason, str) or not reason or ";" in reason:
+            raise ValueError(f"{where}: reason must be a non-empty string without ';'")
+        where = f"{where} ({reason})"
+        enabled = r.get("enabled", True)
+        if isinstance(enabled, str):
+            enabled = cfg.get(enabled, False)
+        if not isinstance(enabled, bool):
+            raise ValueError(f"{where}: enabled must be true/false or the name of a boolean engine key")
+        all_ = _conditions(f"{where}.all", r.get("all", []), cfg)
+        any_ = _conditions(f"{where}.any", r.get("any", []), cfg)
+        if not all_ and not any_:
+            raise ValueError(f"{where}: needs at least one condition in all/any")
+        actions = r.get("try", [])
+        if not isinstance(actions, list) or any(a not in ACTIONS for a in actions):
+            raise ValueError(f"{where}: try must list actions from {', '.join(ACTIONS)}")
+        at_limit = r.get("at_limit")
+        if at_limit is not None and (not isinstance(at_limit, str) or not at_limit or ";" in at_limit):
+            raise ValueError(f"{where}: at_limit must be a non-empty reason string without ';'")
+        if not actions and at_limit is None:
+            raise ValueError(f"{where}: needs actions in try or an at_limit reason")
+        if enabled:
+            rules.append((reason, all_, any_, tuple(ACTIONS[a] for a in actions), at_limit))
+    return RuleEngine(table, _generate(rules, cfg))
@@ -0,0 +1,107 @@
+# scheduler.py
+# Drift-free fixed-rate scheduling on the monotonic clock.
+# Ticks fire at start + phase + k * interval, whatever the work in between costs.
+# When the caller falls behind by a whole interval or more, the late ticks are
+# skipped and reported as missed instead of silently sliding the schedule.
+from __future__ import annotations
+import heapq
+import itertools
+import time
+from typing import Callable, Dict, Hashable, List, Tuple
+
+class FixedRateScheduler:
+    def __init__(self, interval_s: float, phase_s: float = 0.0,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        if interval_s <= 0:
+            raise ValueError("interval_s must be > 0")
+        self.interval_s = interval_s
+        self._clock = clock
+        self._sleep = sleep
+        self._next = clock() + phase_s
+        self.missed = 0
+
+    def wait(self) -> Tuple[float, int]:
+        """Sleep until the next tick; return (scheduled monotonic time, ticks missed before it)."""
+        now = self._clock()
+        missed = 0
+        if now < self._next:
+            self._sleep(self._next - now)
+        else:
+            missed = int((now - self._next) // self.interval_s)
+            self._next += missed * self.interval_s
+        tick = self._next
+        self._next += self.interval_s
+        self.missed += missed
+        return tick, missed
+
+class FleetScheduler:
+    """One fixed-rate schedule per key (device), served from a single thread.
+
+    Keys may have different intervals and phases (e.g. staggered across the
+    interval so requests do not all leave at once).
+    """
+    def __init__(self, clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        self._clock = clock
+        self._sleep = sleep
+        self._heap: List[Tuple[float, int, Hashable]] = []
+        self._seq = itertools.count()
+        self._interval: Dict[Hashable, float] = {}
+        self._due: Dict[Hashable, float] = {}
+        self.missed: Dict[Hashable, int] = {}
+
+    def add(self, key: Hashable, interval_s: float, phase_s: float = 0.0) -> None:
+        if interval_s <= 0:
+            raise ValueError("interval_s must be > 0")
+        due = self._clock() + phase_s
+        self._interval[key] = interval_s
+        self._due[key] = due
+        self.missed.setdefault(key, 0)
+        heapq.heappush(self._heap, (due, next(self._seq), key))
+
+    def remove(self, key: Hashable) -> None:
+        # Heap entries of removed keys are dropped lazily in wait()
+        self._interval.pop(key, None)
+        self._due.pop(key, None)
+
+    def set_interval(self, key: Hashable, interval_s: float, reschedule: bool = False) -> None:
+        """Change a key's period from its next tick on (already scheduled tick is kept).
+
+        With reschedule, the already scheduled tick moves too: it becomes the last
+        tick + interval_s (so a shorter period takes effect immediately).
+        """
+        if key in self._interval and interval_s > 0:
+            if reschedule:
+                due = self._due[key] - self._interval[key] + interval_s
+                self._due[key] = due
+                heapq.heappush(self._heap, (due, next(self._seq), key))
+            self._interval[key] = interval_s
+
+    def wait(self) -> List[Tuple[Hashable, float, int]]:
+        """Sleep until the earliest tick; return [(key, scheduled time, missed ticks)] due by then."""
+        while self._heap:
+            due, _, key = self._heap[0]
+            if self._due.get(key) != due:
+                heapq.heappop(self._heap)  # stale entry (removed or rescheduled key)
+                continue
+            now = self._clock()
+            if now < due:
+                self._sleep(due - now)
+                now = self._clock()
+            break
+        else:
+            return []
+
+        fired = []
+        while self._heap and self._heap[0][0] <= now:
+            due, _, key = heapq.heappop(self._heap)
+            if self._due.get(key) != due:
+                continue
+            interval = self._interval[key]
+            missed = int((now - due) // interval)
+            tick = due + missed * interval
+            self.missed[key] += missed
+            nxt = tick + interval
+            self._due[key] = nxt
+            heapq.heappush(self._heap, (nxt, next(self._seq), key))
+            fired.append((key, tick, missed))
+        return fired
@@ -0,0 +1,276 @@
+# simulator.py
+# Local stand-in for AxeOS miners, for load and latency tests without hardware.
+# Every simulated miner listens on its own localhost port and serves the endpoints
+# BitaxeAPI uses (GET /api/system/status, POST /api/system/settings).
+#
+# Thermal/error model (per miner, advanced lazily at each request):
+#   power  = k * freq * vcore_V^2                      (~15 W at 525 MHz / 1150 mV)
+#   temp   -> ambient + r_asic * power                 first-order lag, time constant tau_s
+#   vrTemp -> ambient + r_vr * power                   same lag
+#   error% = 0.2 + 0.4 * max(0, (freq - f_stable) / 25)^2 + noise
+#   f_stable = 450 + 0.75 * (vcore - 1000) - 6 * max(0, temp - 60)
+#   ambient = ambient_c + swing_c * sin(2*pi * t / day_s)   (t = simulated seconds)
+# --speed runs simulated time faster than wall time (e.g. 60 = one hour per minute).
+#
+# Usage:
+#   python3 simulator.py --count 100 --base-port 18000 --write-config sim_config.json
+#   python3 main.py --config sim_config.json
+from __future__ import annotations
+import argparse
+import json
+import math
+import random
+import signal
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+@dataclass
+class SimMiner:
+    name: str
+    freq: int = 525
+    vcore: int = 1150
+    ambient_c: float = 25.0
+    swing_c: float = 0.0
+    day_s: float = 86400.0
+    speed: float = 1.0
+    tau_s: float = 60.0
+    k_power: float = 0.0216
+    r_asic: float = 2.4
+    r_vr: float = 3.2
+    noise: float = 0.2
+    latency_ms: float = 5.0
+    jitter_ms: float = 2.0
+    timeout_rate: float = 0.0
+    stall_s: float = 30.0
+    hot_c: float = 68.0
+    seed: Optional[int] = None
+
+    temp: float = 0.0
+    vr_temp: float = 0.0
+    requests: int = 0
+    stalls: int = 0
+    changes: int = 0
+    lags: List[float] = field(default_factory=list)
+
+    _t0: float = 0.0
+    _last: float = 0.0
+    _hot_since: Optional[float] = None
+    _rng: random.Random = field(default_factory=random.Random)
+    _lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def __post_init__(self):
+        self._rng = random.Random(self.seed)
+        self._t0 = self._last = time.monotonic()
+        amb = self.ambient()
+        p = self.power()
+        self.temp = amb + self.r_asic * p
+        self.vr_temp = amb + self.r_vr * p
+
+    def sim_time(self, now: Optional[float] = None) -> float:
+        return ((now if now is not None else time.monotonic()) - self._t0) * self.speed
+
+    def ambient(self, now: Optional[float] = None) -> float:
+        return self.ambient_c + self.swing_c * math.sin(2 * math.pi * self.sim_time(now) / self.day_s)
+
+    def power(self) -> float:
+        v = self.vcore / 1000.0
+        return self.k_power * self.freq * v * v
+
+    def _advance(self, now: float) -> None:
+        dt = (now - self._last) * self.speed
+        self._last = now
+        amb = self.ambient(now)
+        p = self.power()
+        decay = math.exp(-dt / self.tau_s) if dt > 0 else 1.0
+        self.temp = amb + self.r_asic * p + (self.temp - amb - self.r_asic * p) * decay
+        self.vr_temp = amb + self.r_vr * p + (self.vr_temp - amb - self.r_vr * p) * decay
+        if self.temp >= self.hot_c:
+            if self._hot_since is None:
+                self._hot_since = now
+        else:
+            self._hot_since = None
+
+    def error_pct(self) -> float:
+        f_stable = 450 + 0.75 * (self.vcore - 1000) - 6 * max(0.0, self.temp - 60)
+        over = max(0.0, (self.freq - f_stable) / 25)
+        return max(0.0, 0.2 + 0.4 * over * over + self._rng.gauss(0, self.noise / 4))
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            self._advance(time.monotonic())
+            self.requests += 1
+            return {
+                "temp": round(self.temp + self._rng.gauss(0, self.noise), 2),
+                "vrTemp": round(self.vr_temp + self._rng.gauss(0, self.noise), 2),
+                "errorPercentage": round(self.error_pct(), 3),
+                "frequency": self.freq,
+                "coreVoltage": self.vcore,
+                "power": round(self.power(), 2),
+                "hostname": self.name,
+                "version": "sim-1",
+            }
+
+    def apply(self, payload: Dict[str, Any]) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self._advance(now)
+            old = (self.freq, self.vcore)
+            if "frequency" in payload:
+                self.freq = int(payload["frequency"])
+            if "coreVoltage" in payload:
+                self.vcore = int(payload["coreVoltage"])
+            if (self.freq, self.vcore) != old:
+                self.changes += 1
+                # Decision lag: how long the miner ran hot before it was turned down
+                if self._hot_since is not None and (self.freq < old[0] or self.vcore < old[1]):
+                    self.lags.append(now - self._hot_since)
+                    self._hot_since = None
+
+    def maybe_stall(self) -> bool:
+        """Request latency; True when this request should time out (no answer)."""
+        if self.timeout_rate and self._rng.random() < self.timeout_rate:
+            self.stalls += 1
+            time.sleep(self.stall_s)
+            return True
+        time.sleep(max(0.0, self._rng.gauss(self.latency_ms, self.jitter_ms)) / 1000.0)
+        return False
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "_MinerServer"
+
+    def _send(self, code: int, body: Optional[Dict[str, Any]] = None) -> None:
+        data = json.dumps(body or {}).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        miner = self.server.miner
+        if miner.maybe_stall():
+            return
+        if self.path in ("/api/system/status", "/api/system/info"):
+            self._send(200, miner.status())
+        else:
+            self._send(404)
+
+    def do_POST(self):
+        miner = self.server.miner
+        if miner.maybe_stall():
+            return
+        if self.path not in ("/api/system/settings", "/api/system"):
+            self._send(404)
+            return
+        try:
+            n = int(self.headers.get("Content-Length", 0))
+            miner.apply(json.loads(self.rfile.read(n) or b"{}"))
+        except (ValueError, TypeError):
+            self._send(400)
+            return
+        self._send(200)
+
+    do_PATCH = do_POST
+
+    def log_message(self, *args):
+        pass
+
+class _MinerServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, addr, miner: SimMiner):
+        super().__init__(addr, _Handler)
+        self.miner = miner
+
+class SimFleet:
+    """N simulated miners on consecutive localhost ports, each served by its own thread."""
+    def __init__(self, count: int, base_port: int = 18000, host: str = "127.0.0.1", **miner_kw: Any):
+        self.host = host
+        self.miners: List[SimMiner] = []
+        self._servers: List[_MinerServer] = []
+        seed = miner_kw.pop("seed", None)
+        for i in range(count):
+            m = SimMiner(name=f"sim-{i:03d}", seed=None if seed is None else seed + i, **miner_kw)
+            srv = _MinerServer((host, base_port + i), m)
+            threading.Thread(target=srv.serve_forever, name=f"sim-{i:03d}", daemon=True).start()
+            self.miners.append(m)
+            self._servers.append(srv)
+
+    def devices(self) -> List[Dict[str, str]]:
+        return [{"name": m.name, "ip": f"{self.host}:{srv.server_address[1]}"} for m, srv in zip(self.miners, self._servers)]
+
+    def summary(self) -> str:
+        reqs = sum(m.requests for m in self.miners)
+        lags = [x for m in self.miners for x in m.lags]
+        temps = [m.temp for m in self.miners]
+        lag = f"lag mean {sum(lags) / len(lags):.1f}s max {max(lags):.1f}s" if lags else "lag n/a"
+        return (
+            f"{len(self.miners)} miners | requests {reqs} | stalls {sum(m.stalls for m in self.miners)} | "
+            f"changes {sum(m.changes for m in self.miners)} | temp {min(temps):.1f}-{max(temps):.1f}C | "
+            f"hot turn-downs {len(lags)} {lag}"
+        )
+
+    def stop(self) -> None:
+        for srv in self._servers:
+            srv.shutdown()
+            srv.server_close()
+
+def main():
+    p = argparse.ArgumentParser(description="BitaxeLiveOptimizer - local fake AxeOS miners")
+    p.add_argument("--count", type=int, default=3, help="Number of simulated miners (default 3)")
+    p.add_argument("--base-port", type=int, default=18000, help="Port of the first miner (default 18000)")
+    p.add_argument("--freq", type=int, default=525, help="Initial frequency MHz (default 525)")
+    p.add_argument("--vcore", type=int, default=1150, help="Initial core voltage mV (default 1150)")
+    p.add_argument("--ambient", type=float, default=25.0, help="Mean ambient temperature C (default 25)")
+    p.add_argument("--swing", type=float, default=0.0, help="Day/night ambient amplitude C (default 0)")
+    p.add_argument("--day", type=float, default=86400.0, help="Ambient cycle period in simulated seconds (default 86400)")
+    p.add_argument("--speed", type=float, default=1.0, help="Simulated seconds per wall second (default 1)")
+    p.add_argument("--latency-ms", type=float, default=5.0, help="Mean request latency (default 5ms)")
+    p.add_argument("--jitter-ms", type=float, default=2.0, help="Latency standard deviation (default 2ms)")
+    p.add_argument("--timeout-rate", type=float, default=0.0, help="Fraction of requests left unanswered (default 0)")
+    p.add_argument("--stall", type=float, default=30.0, help="How long an unanswered request hangs (default 30s)")
+    p.add_argument("--seed", type=int, default=None, help="Random seed (default: random)")
+    p.add_argument("--write-config", default=None, help="Write a config.json for main.py/collector.py pointing at the miners")
+    p.add_argument("--report", type=float, default=30.0, help="Print a fleet summary every N seconds (0 = never)")
+    args = p.parse_args()
+
+    fleet = SimFleet(
+        args.count, args.base_port,
+        freq=args.freq, vcore=args.vcore, ambient_c=args.ambient, swing_c=args.swing, day_s=args.day,
+        speed=args.speed, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        timeout_rate=args.timeout_rate, stall_s=args.stall, seed=args.seed,
+    )
+    if args.write_config:
+        from backtest import DEFAULT_CFG
+        cfg = {
+            "logs_dir": "sim_logs",
+            "poll_interval_s": 5,
+            "timeout_s": 2,
+            "window_n": 12,
+            "apply_every_n": 12,
+            "devices": fleet.devices(),
+            "engine": dict(DEFAULT_CFG),
+        }
+        with open(args.write_config, "w", encoding="utf-8") as f:
+            json.dump(cfg, f, indent=2)
+        print(f"Config for {args.count} miners written to {args.write_config}")
+
+    print(f"Serving {args.count} miners on {fleet.host}:{args.base_port}-{args.base_port + args.count - 1} (Ctrl+C to stop)")
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        while True:
+            time.sleep(args.report if args.report > 0 else 3600)
+            if args.report > 0:
+                print(fleet.summary(), flush=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(fleet.summary())
+        fleet.stop()
+
+if __name__ == "__main__":
+    main()
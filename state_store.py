@@ -0,0 +1,35 @@
+# state_store.py
+# Small per-device state that main.py keeps across restarts (decision counter
+# phase, next adaptive decision time), as one JSON file.
+# Saves are atomic (temp file + rename), so a crash mid-save leaves the previous
+# state intact; a missing or unreadable file loads as empty state.
+from __future__ import annotations
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, Union
+
+class StateStore:
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        """{device name: {..., "saved_at": epoch}}"""
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+        return data.get("devices", {}) if isinstance(data, dict) else {}
+
+    def save(self, devices: Dict[str, Dict[str, Any]]) -> None:
+        # Entries that already carry "saved_at" (supervisor.py relays shard saves) keep it
+        now = time.time()
+        data = {"devices": {name: {"saved_at": now, **fields} for name, fields in devices.items()}}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=1)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
@@ -0,0 +1,302 @@
+# supervisor.py
+# Sharded live optimizer for large fleets: cfg["devices"] is split into shards and
+# each shard runs main.py's loop (main.run) in its own worker process, so status
+# decoding and decide() spread over several cores.
+#
+# - Workers send their decision / metrics lines to the supervisor (one queue per shard);
+#   the supervisor owns every log file (one writer per device, as in main.py).
+# - Per-device state (decision counter phase) is relayed
+#   the same way and kept by the supervisor for the whole fleet, so a shard
+#   restarts where it stopped; its windows are re-seeded from the metrics log
+#   ("log_metrics", or collector.py), which is flushed before every restart.
+#   With a "warm_start" section that state is also saved to one state file.
+# - A worker that exits or stops sending its per-tick heartbeat (hang_s) is
+#   killed and restarted with exponential backoff; the other shards keep running.
+# - With a "metrics" port, shard k serves its own /metrics on port + k.
+#
+# Config (optional):
+#   "supervisor": { "shards": 4, "hang_s": 120 }
+#
+# Usage:
+#   python3 supervisor.py --config config.json [--shards 4] [--profile]
+from __future__ import annotations
+import argparse
+import copy
+import multiprocessing as mp
+import os
+import queue
+import signal
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from config_loader import load_config
+from log_utils import flush_policy
+from state_store import StateStore
+
+class _Sink:
+    """Worker side: writers and state saves become messages to the supervisor."""
+    def __init__(self, q: Any, shard: int):
+        self._q = q
+        self._shard = shard
+        self._ppid = os.getppid()
+
+    def writer(self, kind: str, name: str) -> "_SinkWriter":
+        return _SinkWriter(self._q, kind, name)
+
+    def heartbeat(self) -> None:
+        if os.getppid() != self._ppid:
+            # Supervisor gone: nobody reads the queue any more
+            sys.exit(0)
+        self._q.put(("beat", self._shard, None, None))
+
+class _SinkWriter:
+    def __init__(self, q: Any, kind: str, name: str):
+        self._q = q
+        self._key = (kind, name)
+
+    def write(self, now, line: str) -> None:
+        self._q.put((self._key, None, now, line))
+
+    def close(self) -> None:
+        pass  # the supervisor owns the files
+
+class _SinkStore:
+    """load() returns the supervisor's state of this shard; save() relays it."""
+    def __init__(self, q: Any, saved: Dict[str, Dict[str, Any]]):
+        self._q = q
+        self._saved = saved
+
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        return self._saved
+
+    def save(self, devices: Dict[str, Dict[str, Any]]) -> None:
+        now = time.time()
+        self._q.put(("state", None, None, {name: {**fields, "saved_at": now} for name, fields in devices.items()}))
+
+def _worker(shard: int, cfg: Dict[str, Any], saved: Dict[str, Dict[str, Any]], q: Any, profile: bool) -> None:
+    import main
+    sink = _Sink(q, shard)
+    try:
+        main.run(cfg, profile, sink=sink, store=_SinkStore(q, saved), on_tick=sink.heartbeat)
+    except KeyboardInterrupt:
+        pass  # Ctrl+C reaches the whole process group; the supervisor decides what happens next
+
+def split(devices: List[Dict[str, Any]], shards: int) -> List[List[Dict[str, Any]]]:
+    """Round-robin split into at most `shards` non-empty shards of near-equal size."""
+    shards = max(1, min(shards, len(devices)))
+    return [devices[k::shards] for k in range(shards)]
+
+class Supervisor:
+    def __init__(self, cfg: Dict[str, Any], shards: int, profile: bool = False, settings: Any = None):
+        """settings: main._Settings of cfg when the caller has validated it already."""
+        from main import _Settings, open_writers
+
+        if settings is None:
+            settings = _Settings(cfg)
+        sup_cfg = cfg.get("supervisor") or {}
+        self.cfg = cfg
+        self.profile = profile
+        self.shards = split(cfg["devices"], shards)
+        self.hang_s = float(sup_cfg.get("hang_s", max(60.0, 10 * settings.poll_interval_s)))
+        self._ctx = mp.get_context()
+        # One queue per shard: a worker killed mid-put can only wedge its own queue
+        self._queues: List[Optional[Any]] = [None] * len(self.shards)
+        self._procs: List[Optional[Any]] = [None] * len(self.shards)
+        self._beat = [0.0] * len(self.shards)
+        self._started = [0.0] * len(self.shards)
+        self._restarts = [0] * len(self.shards)
+        self._due = [0.0] * len(self.shards)
+
+        warm_cfg = cfg.get("warm_start")
+        outdir = Path(cfg.get("logs_dir", "bitaxe_logs"))
+        self._store = StateStore(warm_cfg.get("state_file", outdir / "state.json")) if warm_cfg is not None else None
+        self._state: Dict[str, Dict[str, Any]] = self._store.load() if self._store is not None else {}
+        self._state_dirty = False
+        self._state_saved = time.monotonic()
+
+        flush_kw = flush_policy(cfg.get("log_flush"))
+        self._writers: Dict[Tuple[str, str], Any] = {}
+        for d in cfg["devices"]:
+            decisions_writer, metrics_writer = open_writers(cfg, d["name"], flush_kw)
+            self._writers[("decisions", d["name"])] = decisions_writer
+            if metrics_writer is not None:
+                self._writers[("metrics", d["name"])] = metrics_writer
+
+    def _shard_cfg(self, k: int, restart: bool) -> Dict[str, Any]:
+        cfg = copy.deepcopy(self.cfg)
+        cfg["devices"] = self.shards[k]
+        cfg.pop("supervisor", None)
+        if restart and cfg.get("warm_start") is None:
+            # Restarts always warm start; the state only lives in the supervisor
+            cfg["warm_start"] = {}
+        metrics_cfg = cfg.get("metrics")
+        if metrics_cfg and metrics_cfg.get("port"):
+            metrics_cfg["port"] = int(metrics_cfg["port"]) + k
+        return cfg
+
+    def _start(self, k: int) -> None:
+        restart = self._procs[k] is not None
+        if restart:
+            # The restarted worker seeds its windows from the metrics log tail
+            self._flush()
+        names = {d["name"] for d in self.shards[k]}
+        saved = {name: fields for name, fields in self._state.items() if name in names}
+        q = self._ctx.Queue()
+        p = self._ctx.Process(target=_worker, name=f"shard-{k}",
+                              args=(k, self._shard_cfg(k, restart), saved, q, self.profile), daemon=True)
+        p.start()
+        self._queues[k] = q
+        self._procs[k] = p
+        self._started[k] = self._beat[k] = time.monotonic()
+        print(f"[supervisor] shard {k}: pid {p.pid}, {len(self.shards[k])} device(s)", file=sys.stderr)
+
+    def _handle(self, item: Any) -> None:
+        key, shard, now, payload = item
+        if key == "beat":
+            self._beat[shard] = time.monotonic()
+        elif key == "state":
+            self._state.update(payload)
+            self._state_dirty = True
+        else:
+            try:
+                self._writers[key].write(now, payload)
+            except Exception as e:
+                print(f"[supervisor] write failed for {key[0]}/{key[1]}: {e}", file=sys.stderr)
+
+    def _check(self) -> None:
+        now = time.monotonic()
+        for k, p in enumerate(self._procs):
+            if p is None:
+                continue
+            if p.is_alive():
+                if now - self._beat[k] <= self.hang_s:
+                    continue
+                print(f"[supervisor] shard {k}: no heartbeat for {now - self._beat[k]:.0f}s, killing", file=sys.stderr)
+                p.kill()
+                p.join(5.0)
+            if self._due[k] == 0.0:
+                self._retire(k)
+                # A worker that ran for a while gets a fresh backoff
+                if now - self._started[k] > 300:
+                    self._restarts[k] = 0
+                delay = min(60.0, 2.0 ** self._restarts[k])
+                self._restarts[k] += 1
+                self._due[k] = now + delay
+                print(f"[supervisor] shard {k}: exited ({p.exitcode}), restart in {delay:.0f}s", file=sys.stderr)
+            elif now >= self._due[k]:
+                self._due[k] = 0.0
+                self._start(k)
+
+    def _flush(self) -> None:
+        for w in self._writers.values():
+            try:
+                w.flush()
+            except Exception:
+                pass
+
+    def _save_state(self, force: bool = False) -> None:
+        if self._store is None or not self._state_dirty:
+            return
+        if force or time.monotonic() - self._state_saved >= 5.0:
+            self._store.save(self._state)
+            self._state_dirty = False
+            self._state_saved = time.monotonic()
+
+    def _retire(self, k: int) -> None:
+        """Read what an exited worker left in its queue, then drop the queue."""
+        p, q = self._procs[k], self._queues[k]
+        if q is None:
+            return
+        self._queues[k] = None
+        # Killed by a signal it may have died mid-message; reading could block forever
+        if p.exitcode is not None and p.exitcode >= 0:
+            while self._drain_one(q):
+                pass
+        q.close()
+        q.cancel_join_thread()
+
+    def _drain_one(self, q: Any) -> bool:
+        try:
+            item = q.get_nowait()
+        except queue.Empty:
+            return False
+        self._handle(item)
+        return True
+
+    def _drain(self, timeout_s: float) -> None:
+        deadline = time.monotonic() + timeout_s
+        while True:
+            got = False
+            for q in self._queues:
+                # Bounded batch per queue so one chatty shard cannot starve the others
+                for _ in range(1000):
+                    if q is None or not self._drain_one(q):
+                        break
+                    got = True
+            if not got:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    return
+                time.sleep(min(0.02, left))
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        for k in range(len(self.shards)):
+            self._start(k)
+        next_check = time.monotonic() + 0.5
+        try:
+            while True:
+                self._drain(0.5)
+                if time.monotonic() >= next_check:
+                    next_check = time.monotonic() + 0.5
+                    self._check()
+                    for w in self._writers.values():
+                        w.maybe_flush()
+                    self._save_state()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def stop(self, timeout_s: float = 15.0) -> None:
+        for p in self._procs:
+            if p is not None and p.is_alive():
+                p.terminate()
+        # Keep reading while workers unwind: their last lines and state are still in flight
+        deadline = time.monotonic() + timeout_s
+        while any(p is not None and p.is_alive() for p in self._procs) and time.monotonic() < deadline:
+            self._drain(0.1)
+        for k, p in enumerate(self._procs):
+            if p is None:
+                continue
+            if p.is_alive():
+                p.kill()
+                p.join(5.0)
+            self._retire(k)
+        self._save_state(force=True)
+        for w in self._writers.values():
+            w.close()
+
+def main():
+    p = argparse.ArgumentParser(description="BitaxeLiveOptimizer - sharded LIVE optimizer (one process per shard)")
+    p.add_argument("--config", default="config.json", help="Path to config.json (default ./config.json)")
+    p.add_argument("--shards", type=int, default=None, help="Worker processes (default: supervisor.shards or CPU count)")
+    p.add_argument("--profile", action="store_true", help="Per-phase timings of every shard on stderr")
+    args = p.parse_args()
+
+    from main import _Settings
+
+    cfg = load_config(Path(args.config))
+    try:
+        # The whole config, checked here once; otherwise every worker would crash on it
+        # and restart forever
+        settings = _Settings(cfg)
+    except (KeyError, TypeError, ValueError) as e:
+        p.error(f"invalid config: {e}")
+    shards = args.shards or int((cfg.get("supervisor") or {}).get("shards", os.cpu_count() or 1))
+    Supervisor(cfg, shards, args.profile, settings).run()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+# sweep.py
+# Parallel parameter sweep over the backtest engine.
+# Logs are parsed once in the parent and shared with the worker processes
+# (inherited on fork, pickled once per worker elsewhere), then every parameter
+# combination is replayed on all logs and ranked.
+#
+# Usage:
+#   python3 sweep.py --spec sweep.json --log a.log --log b.log --out sweep.csv
+#
+# Spec (JSON), either a full grid:
+#   {"grid": {"asic_soft": [63, 65], "err_high": [0.8, 1.0], "window": [12, 24]}}
+# or a random search (numeric [lo, hi] ranges, ints when both bounds are ints):
+#   {"random": {"n": 2000, "seed": 1, "params": {"slope_limit": [0.005, 0.02], "apply_every": [6, 24]}}}
+# Optional keys: "base" (engine overrides applied to every combination) and
+# "rank_by" (columns to sort on, ascending; default temp_hard, freq_down, vcore_down).
+# The backtest is open loop (recorded temperatures do not react to the replayed
+# decisions), so recorded_soft_s - time the recorded miners spent at or above
+# asic_soft/vr_soft - describes the logs, not the parameters: it is reported
+# next to each combination but cannot be ranked on.
+# Parameters are engine keys (see backtest.DEFAULT_CFG) plus "window" and "apply_every";
+# "rules" (a rule table, see rules.py) may be set in "base" or swept as a list of tables.
+from __future__ import annotations
+import argparse
+import csv
+import itertools
+import json
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from backtest import DEFAULT_CFG, read_samples, scalar_rows
+from models import Sample
+
+SWEEP_KEYS = set(DEFAULT_CFG) | {"window", "apply_every", "window_n_min_valid", "drift_level", "drift_min_buckets", "rules"}
+RESULT_COLS = ["decisions", "freq_down", "vcore_down", "temp_hard"]
+# Properties of the recorded data under a combination's soft limits (not rankable)
+DATA_COLS = ["recorded_soft_s"]
+
+# Worker-side state, set once per process by _init_worker
+_LOGS: List[Any] = []
+_ENGINE = "scalar"
+_MAX_GAP_S = 60.0
+_SOFT_CACHE: Dict[Any, float] = {}
+
+def _combinations(spec: Dict[str, Any]) -> List[Dict[str, Any]]:
+    if "grid" in spec:
+        keys = list(spec["grid"])
+        return [dict(zip(keys, vals)) for vals in itertools.product(*(spec["grid"][k] for k in keys))]
+    if "random" in spec:
+        r = spec["random"]
+        rng = random.Random(r.get("seed"))
+        out = []
+        for _ in range(int(r["n"])):
+            combo = {}
+            for k, (lo, hi) in r["params"].items():
+                combo[k] = rng.randint(lo, hi) if isinstance(lo, int) and isinstance(hi, int) else rng.uniform(lo, hi)
+            out.append(combo)
+        return out
+    raise ValueError("Spec needs a 'grid' or a 'random' section")
+
+def _init_worker(logs: List[Any], engine: str, max_gap_s: float) -> None:
+    global _LOGS, _ENGINE, _MAX_GAP_S
+    _LOGS = logs
+    _ENGINE = engine
+    _MAX_GAP_S = max_gap_s
+
+def _soft_seconds(samples: List[Sample], asic_soft: float, vr_soft: float, max_gap_s: float) -> float:
+    # Time until the next sample, capped so collector outages do not count
+    total = 0.0
+    for a, b in zip(samples, samples[1:]):
+        if a.temp >= asic_soft or a.vr_temp >= vr_soft:
+            total += min(b.ts - a.ts, max_gap_s)
+    return total
+
+def _run(combo: Dict[str, Any], base: Dict[str, Any]) -> Dict[str, Any]:
+    cfg = dict(DEFAULT_CFG)
+    for src in (base, combo):
+        cfg.update({k: v for k, v in src.items() if k not in ("window", "apply_every")})
+    window = int(combo.get("window", base.get("window", 12)))
+    apply_every = int(combo.get("apply_every", base.get("apply_every", 12)))
+    cfg.setdefault("window_n_min_valid", max(8, window // 2))
+
+    res: Dict[str, Any] = {k: 0 for k in RESULT_COLS}
+    res["recorded_soft_s"] = 0.0
+    for samples, cols in _LOGS:
+        if _ENGINE == "numpy":
+            from backtest_numpy import numpy_rows
+            rows = numpy_rows(cols, cfg, window, apply_every)
+        else:
+            rows = scalar_rows(samples, cfg, window, apply_every)
+        for row in rows:
+            action, reason = row[7], row[10]
+            res["decisions"] += 1
+            if action == "FREQ_DOWN":
+                res["freq_down"] += 1
+            elif action == "VCORE_DOWN":
+                res["vcore_down"] += 1
+            if reason in ("temp_hard", "at_min_limits_temp_hard"):
+                res["temp_hard"] += 1
+    for i, (samples, _) in enumerate(_LOGS):
+        # Only depends on the soft limits, which repeat across most combinations
+        key = (i, cfg["asic_soft"], cfg["vr_soft"])
+        if key not in _SOFT_CACHE:
+            _SOFT_CACHE[key] = _soft_seconds(samples, cfg["asic_soft"], cfg["vr_soft"], _MAX_GAP_S)
+        res["recorded_soft_s"] += _SOFT_CACHE[key]
+    return res
+
+def _run_one(args) -> Dict[str, Any]:
+    combo, base = args
+    return _run(combo, base)
+
+def main():
+    p = argparse.ArgumentParser(description="BitaxeLiveOptimizer - parallel parameter sweep over backtest logs")
+    p.add_argument("--spec", required=True, help="Sweep spec (JSON, see header of sweep.py)")
+    p.add_argument("--log", action="append", required=True, help="Metrics log file (repeatable)")
+    p.add_argument("--out", default="sweep.csv", help="Ranked summary CSV (default sweep.csv)")
+    p.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    p.add_argument("--engine", choices=["scalar", "numpy"], default="scalar", help="Backtest engine (default scalar)")
+    p.add_argument("--max-gap", type=float, default=60.0, help="Cap per-sample duration for soft-limit time (default 60s)")
+    p.add_argument("--top", type=int, default=10, help="Print the N best combinations (default 10)")
+    args = p.parse_args()
+
+    with open(args.spec, "r", encoding="utf-8") as f:
+        spec = json.load(f)
+    combos = _combinations(spec)
+    base: Dict[str, Any] = spec.get("base", {})
+    rank_by: List[str] = spec.get("rank_by", ["temp_hard", "freq_down", "vcore_down"])
+    unknown = ({k for c in combos for k in c} | set(base)) - SWEEP_KEYS
+    if unknown:
+        p.error(f"Unknown sweep parameters: {', '.join(sorted(unknown))}")
+    if not combos:
+        p.error("Spec produces no combinations")
+    if args.engine == "numpy" and any(c.get("drift_horizon_s", base.get("drift_horizon_s", 0)) > 0 for c in combos):
+        p.error("drift_horizon_s > 0 needs --engine scalar")
+    if args.engine == "numpy" and any("rules" in c or "rules" in base for c in combos):
+        p.error("a custom rule table needs --engine scalar")
+    param_cols = sorted({k for c in combos for k in c})
+    if set(rank_by) & set(DATA_COLS):
+        p.error(f"{', '.join(DATA_COLS)} describes the recorded logs (open-loop backtest), not the parameters; it cannot be ranked on")
+    bad_rank = set(rank_by) - set(param_cols) - set(RESULT_COLS)
+    if bad_rank:
+        p.error(f"Unknown rank_by columns: {', '.join(sorted(bad_rank))}")
+
+    logs = []
+    for path in args.log:
+        samples = read_samples(path)
+        cols: Optional[Dict[str, Any]] = None
+        if args.engine == "numpy":
+            try:
+                from backtest_numpy import load_columns
+            except ImportError:
+                p.error("--engine numpy requires numpy (pip install numpy)")
+            cols = load_columns(samples)
+        logs.append((samples, cols))
+
+    workers = args.workers or os.cpu_count() or 1
+    chunksize = max(1, len(combos) // (workers * 8))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(logs, args.engine, args.max_gap)) as ex:
+        results = list(ex.map(_run_one, ((c, base) for c in combos), chunksize=chunksize))
+
+    table = [{**c, **r} for c, r in zip(combos, results)]
+    table.sort(key=lambda row: tuple(row[k] for k in rank_by))
+
+    with open(args.out, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["rank"] + param_cols + RESULT_COLS + DATA_COLS)
+        for rank, row in enumerate(table, start=1):
+            w.writerow([rank] + [row.get(k) for k in param_cols] + [row[k] for k in RESULT_COLS + DATA_COLS])
+
+    print(f"{len(combos)} combinations x {len(logs)} logs on {workers} workers -> {args.out}")
+    for rank, row in enumerate(table[: args.top], start=1):
+        params = ", ".join(f"{k}={row[k]}" for k in param_cols)
+        print(f"#{rank}: {params} | " + " ".join(f"{k}={row[k]}" for k in RESULT_COLS + DATA_COLS))
+
+if __name__ == "__main__":
+    main()
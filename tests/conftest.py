@@ -0,0 +1,6 @@
+# conftest.py
+# The modules live flat in the repository root; make them importable from tests/.
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,80 @@
+# test_applier.py
+# Apply queue outcomes: every change ends confirmed, failed_verify, failed or
+# superseded, including the changes still pending when a miner is removed.
+from concurrent.futures import Future
+
+from applier import DeviceApplier
+from bitaxe_api import BitaxeAPI
+from models import Sample
+
+_API = BitaxeAPI("192.0.2.1")  # never called: the stand-in poller only records submits
+
+class _Poller:
+    """submit() stand-in: futures stay pending until finish() is called."""
+    def __init__(self):
+        self.futures = []
+
+    def submit(self, fn, *args):
+        fut = Future()
+        self.futures.append(fut)
+        return fut
+
+    def finish(self, error=None):
+        fut = self.futures[-1]
+        if error is None:
+            fut.set_result(None)
+        else:
+            fut.set_exception(error)
+
+def _sample(freq, vcore):
+    return Sample(ts=0.0, temp=60.0, vr_temp=60.0, err=0.1, freq=freq, vcore=vcore)
+
+def test_confirm_and_verify_mismatch():
+    poller = _Poller()
+    a = DeviceApplier(_API, poller.submit)
+    assert a.request({"frequency": 500}, 0.0) == []
+    poller.finish()
+    assert a.step(_sample(490, 1150), 5.0) == []
+    assert a.step(_sample(500, 1150), 10.0) == [("confirmed", {"frequency": 500})]
+    a.request({"core_voltage": 1100}, 15.0)
+    poller.finish()
+    a.step(None, 20.0)
+    assert a.step(_sample(500, 1150), 25.0) == [("failed_verify", {"core_voltage": 1100})]
+    assert a.pending() == {}
+
+def test_retries_then_failed():
+    poller = _Poller()
+    a = DeviceApplier(_API, poller.submit, retries=1, backoff_s=5.0)
+    a.request({"frequency": 500}, 0.0)
+    poller.finish(OSError("down"))
+    assert a.step(None, 1.0) == []
+    assert len(poller.futures) == 1  # backoff: no retry before t=6
+    assert a.step(None, 6.0) == []
+    poller.finish(OSError("down"))
+    assert a.step(None, 7.0) == [("failed", {"frequency": 500})]
+    assert a.pending() == {}
+
+def test_newer_change_supersedes_queued():
+    poller = _Poller()
+    a = DeviceApplier(_API, poller.submit)
+    a.request({"frequency": 500}, 0.0)
+    assert a.request({"frequency": 490}, 5.0) == []
+    assert a.request({"frequency": 480}, 10.0) == [("superseded", {"frequency": 490})]
+    assert a.pending() == {"frequency": 480}
+
+def test_abandon_reports_everything_pending():
+    poller = _Poller()
+    a = DeviceApplier(_API, poller.submit)
+    a.request({"frequency": 500}, 0.0)
+    poller.finish()
+    a.step(None, 5.0)                              # sent, waiting for verification
+    a.request({"core_voltage": 1100}, 6.0)         # in flight
+    a.request({"core_voltage": 1090}, 7.0)         # queued behind it
+    assert sorted(a.abandon(), key=str) == sorted([
+        ("superseded", {"frequency": 500}),
+        ("superseded", {"core_voltage": 1100}),
+        ("superseded", {"core_voltage": 1090}),
+    ], key=str)
+    assert a.pending() == {}
+    poller.finish()
+    assert a.step(_sample(500, 1100), 10.0) == []
@@ -0,0 +1,90 @@
+# test_backtest_numpy.py
+# The vectorized backtest must write the rows of the scalar one (backtest.scalar_rows):
+# same decision points, actions, settings and reasons, averages within 1e-9 relative
+# and slopes within 1e-10 °C/s. Windows sitting exactly on a threshold exercise the
+# _GUARD fallback to decide().
+import math
+import random
+from datetime import datetime
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from backtest import _engine_cfg, scalar_rows
+from backtest_numpy import evaluate, load_columns, numpy_rows
+from log_reader import iter_log_file
+from log_utils import METRICS_HEADER, fmt_ts
+
+WINDOW = 12
+T0 = datetime(2026, 3, 1).timestamp()
+
+def _segments(cfg, rng):
+    """(temp, vr, err, temp rise per sample, freq, vcore) blocks of two windows each."""
+    on = []
+    for k in ("asic_soft", "asic_hard"):
+        on.append((cfg[k], 60.0, 0.3, 0.0, 500, 1150))
+    for k in ("vr_soft", "vr_hard"):
+        on.append((55.0, cfg[k], 0.3, 0.0, 500, 1150))
+    for k in ("err_low", "err_high", "err_crit"):
+        on.append((55.0, 60.0, cfg[k], 0.0, 500, 1150))
+    # Slope exactly at slope_limit (5s polls) above the soft limit
+    on.append((cfg["asic_soft"] + 0.5, 60.0, 0.3, cfg["slope_limit"] * 5, 500, 1150))
+    # At the minimum limits, where the at_min_limits_* reasons apply
+    on.append((cfg["asic_hard"], 60.0, 0.3, 0.0, cfg["freq_min"], cfg["vcore_min"]))
+    on.append((55.0, 60.0, cfg["err_crit"], 0.0, cfg["freq_min"], cfg["vcore_min"]))
+    on.append((55.0, 60.0, cfg["err_crit"], 0.0, cfg["freq_min"], cfg["vcore_min"] + 10))
+    # At the maximum, where ramp-up stops
+    on.append((50.0, 60.0, 0.1, 0.0, cfg["freq_max"], 1150))
+    noisy = [(rng.uniform(50, 70), rng.uniform(60, 85), rng.uniform(0, 1.6), rng.uniform(-0.1, 0.1),
+              rng.choice([400, 425, 500, 1100]), rng.choice([1000, 1150])) for _ in range(40)]
+    blocks = on + noisy
+    rng.shuffle(blocks)
+    return blocks
+
+def _write_log(path, cfg, rng):
+    lines = [METRICS_HEADER]
+    t = T0
+    for temp, vr, err, rise, freq, vcore in _segments(cfg, rng):
+        for k in range(2 * WINDOW):
+            t += 5
+            if rng.random() < 0.02:
+                lines.append(f"{fmt_ts(datetime.fromtimestamp(t))};NA;NA;NA;NA;NA")
+                continue
+            lines.append(f"{fmt_ts(datetime.fromtimestamp(t))};{temp + rise * k!r};{vr!r};{err!r};{freq};{vcore}")
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+def _close(a, b, rel):
+    if a is None or b is None:
+        return a is b
+    return math.isclose(a, b, rel_tol=rel, abs_tol=rel)
+
+@pytest.mark.parametrize("ramp_up", [False, True])
+@pytest.mark.parametrize("apply_every", [1, 5, WINDOW])
+@pytest.mark.parametrize("seed", [0, 1])
+def test_rows_match_scalar(tmp_path, ramp_up, apply_every, seed):
+    rng = random.Random(seed)
+    cfg = _engine_cfg(WINDOW)
+    cfg["allow_ramp_up"] = ramp_up
+    log = tmp_path / "20260301.log"
+    _write_log(log, cfg, rng)
+
+    scalar = list(scalar_rows(iter_log_file(log), cfg, WINDOW, apply_every))
+    vector = list(numpy_rows(iter_log_file(log), cfg, WINDOW, apply_every))
+    assert len(scalar) == len(vector) > 0
+    for a, b in zip(scalar, vector):
+        assert a[0] == b[0]
+        assert a[5:] == b[5:], a[0]  # freq, vcore, action, new settings, reason
+        for k in (1, 2, 3):
+            assert _close(a[k], b[k], 1e-9), (a[0], k)
+        assert _close(a[4], b[4], 1e-10), a[0]
+
+def test_test_data_reaches_every_branch(tmp_path):
+    # Guards the test data itself: the on-threshold blocks must reach each branch
+    cfg = _engine_cfg(WINDOW)
+    log = tmp_path / "20260301.log"
+    _write_log(log, cfg, random.Random(0))
+    reasons = {row[10] for row in scalar_rows(iter_log_file(log), cfg, WINDOW, WINDOW)}
+    assert {"temp_hard", "at_min_limits_temp_hard", "slope_exceeded", "err_crit",
+            "at_min_limits_err_crit", "err_high", "stable"} <= reasons
+    assert evaluate(load_columns(iter_log_file(log)), cfg, WINDOW, WINDOW)["near"].any()
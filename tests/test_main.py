@@ -0,0 +1,118 @@
+# test_main.py
+# Config validation of the live loop (main._Settings): what it rejects must never
+# reach run(), where it would only fail once the loop is running. A hot reload is
+# applied whole or not at all.
+import json
+import os
+import signal
+import time
+
+import pytest
+
+from backtest import DEFAULT_CFG
+from bitaxe_api import BitaxeAPI
+from decision_engine import POLL_INTERVAL_KEYS
+from main import _Settings
+from replay import InlinePoller
+
+def _cfg(**kw):
+    cfg = {"devices": [{"name": "a", "ip": "192.0.2.1"}], "engine": dict(DEFAULT_CFG)}
+    cfg.update(kw)
+    return cfg
+
+@pytest.mark.parametrize("key", POLL_INTERVAL_KEYS)
+def test_adaptive_poll_needs_its_engine_keys(key):
+    # A custom table without soft-limit rules compiles without these keys
+    cfg = _cfg(adaptive_poll={})
+    cfg["engine"]["rules"] = [{"reason": "temp_hard", "all": [["temp_avg", ">=", "asic_hard"]], "try": ["freq_down"]}]
+    del cfg["engine"][key]
+    _Settings({k: v for k, v in cfg.items() if k != "adaptive_poll"})
+    with pytest.raises(ValueError, match=key):
+        _Settings(cfg)
+    cfg["engine"][key] = "high"
+    with pytest.raises(ValueError, match=key):
+        _Settings(cfg)
+
+class _Session:
+    """requests.Session stand-in: a healthy miner at 500 MHz / 1150 mV."""
+    def __init__(self, closed, ip):
+        self.closed, self.ip = closed, ip
+
+    def get(self, url, timeout=None):
+        from replay import _Response
+        return _Response({"temp": 60.0, "vrTemp": 55.0, "errorPercentage": 0.1,
+                          "frequency": 500, "coreVoltage": 1150})
+
+    def post(self, url, json=None, timeout=None):
+        raise AssertionError("no settings change expected")
+
+    def close(self):
+        self.closed.append(self.ip)
+
+class _Done(Exception):
+    pass
+
+class _Ticks:
+    """Tick scheduler stand-in: on_change(k) runs before tick k, the loop ends after n ticks."""
+    def __init__(self, n, on_change):
+        self.n, self.k, self.on_change = n, 0, on_change
+
+    def wait(self):
+        self.k += 1
+        if self.k > self.n:
+            raise _Done()
+        self.on_change(self.k)
+        return time.time(), 0
+
+def _run_with_reload(tmp_path, new_cfg):
+    """main.run over miners a and b; before tick 3 the config file becomes new_cfg."""
+    import main
+
+    closed = []
+    path = tmp_path / "config.json"
+    cfg = _cfg(logs_dir=str(tmp_path / "logs"), window_n=4, apply_every_n=2,
+               devices=[{"name": "a", "ip": "192.0.2.1"}, {"name": "b", "ip": "192.0.2.2"}])
+    path.write_text(json.dumps(cfg), encoding="utf-8")
+
+    def make_api(d):
+        if d["ip"] == "bad":
+            raise ValueError("bad ip")
+        return BitaxeAPI(d["ip"], timeout_s=0.0, session=_Session(closed, d["ip"]), name=d["name"])
+
+    def on_change(k):
+        if k == 3:
+            path.write_text(json.dumps(new_cfg(cfg)), encoding="utf-8")
+            os.utime(path, ns=(time.time_ns() + 10 ** 9,) * 2)
+
+    sigterm = signal.getsignal(signal.SIGTERM)
+    try:
+        main.run(cfg, ticks=_Ticks(6, on_change), make_api=make_api, poller=InlinePoller(), cfg_path=path)
+    except _Done:
+        pass
+    finally:
+        signal.signal(signal.SIGTERM, sigterm)
+    return closed
+
+def test_reload_swaps_devices(tmp_path, capsys):
+    closed = _run_with_reload(tmp_path, lambda cfg: dict(cfg, devices=[{"name": "a", "ip": "192.0.2.9"},
+                                                                      {"name": "c", "ip": "192.0.2.3"}]))
+    assert "config reloaded: 2 device(s) (+1 -1)" in capsys.readouterr().err
+    # b removed and a's old session at reload; a and c at exit
+    assert closed == ["192.0.2.2", "192.0.2.1", "192.0.2.9", "192.0.2.3"]
+
+@pytest.mark.parametrize("change, closed_at_reload", [
+    # An added miner whose API cannot be built
+    (lambda cfg: dict(cfg, devices=cfg["devices"] + [{"name": "c", "ip": "bad"}]), []),
+    # A moved miner whose API cannot be built, after an added one was prepared
+    (lambda cfg: dict(cfg, devices=[{"name": "c", "ip": "192.0.2.3"}, {"name": "a", "ip": "bad"}]), ["192.0.2.3"]),
+    # adaptive_poll with a rules table that leaves out poll_interval()'s keys
+    (lambda cfg: dict(cfg, adaptive_poll={}, engine={k: v for k, v in cfg["engine"].items() if k != "asic_soft"}), []),
+])
+def test_failed_reload_keeps_running_config(tmp_path, capsys, change, closed_at_reload):
+    closed = _run_with_reload(tmp_path, change)
+    assert "config reload rejected, keeping the running config" in capsys.readouterr().err
+    # Nothing half-migrated: a miner already prepared is closed at once, a and b keep
+    # their sessions and writers to the end
+    assert closed == closed_at_reload + ["192.0.2.1", "192.0.2.2"]
+    lines = (tmp_path / "logs" / "decisions" / "a").glob("*.log")
+    assert sum(len(p.read_text(encoding="utf-8").splitlines()) - 1 for p in lines) == 3
@@ -0,0 +1,68 @@
+# test_rolling.py
+# RollingWindow against the two-pass reference (sum(ys)/n, decision_engine._linreg_slope)
+# within the tolerance documented in rolling.py, over long streams with NA gaps.
+import random
+from collections import deque
+
+import pytest
+
+from decision_engine import _linreg_slope
+from models import Sample
+from rolling import METRICS, RollingWindow
+
+def _stream(rng, n, t0=1.77e9, step=5.0, na_rate=0.2):
+    """Polls every step seconds with jitter; NA polls are skipped, as main.py does."""
+    temp, vr, err = 55.0, 65.0, 0.5
+    t = t0
+    for _ in range(n):
+        t += step + rng.uniform(-0.4, 0.4)
+        if rng.random() < na_rate:
+            if rng.random() < 0.05:
+                t += rng.uniform(60, 600)  # miner unreachable for a while
+            continue
+        temp += rng.gauss(0, 0.3)
+        vr += rng.gauss(0, 0.4)
+        err = max(0.0, err + rng.gauss(0, 0.05))
+        yield Sample(ts=t, temp=temp, vr_temp=vr, err=err, freq=500, vcore=1150)
+
+def _check(window, ref):
+    ts = [s.ts for s in ref]
+    for m in METRICS:
+        ys = [getattr(s, m) for s in ref]
+        mean = sum(ys) / len(ys)
+        slope = _linreg_slope(ts, ys)
+        assert abs(window.mean(m) - mean) <= 1e-9 * max(1.0, abs(mean)), m
+        assert abs(window.slope(m) - slope) <= 1e-9 * max(1e-6, abs(slope)), m
+
+@pytest.mark.parametrize("maxlen", [1, 2, 12, 97, 720])
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_matches_two_pass_reference(maxlen, seed):
+    rng = random.Random(seed * 1000 + maxlen)
+    window = RollingWindow(maxlen)
+    ref = deque(maxlen=maxlen)
+    # Enough samples to wrap past maxlen (and resync) many times
+    for s in _stream(rng, 6 * maxlen + 50):
+        window.append(s)
+        ref.append(s)
+        assert len(window) == len(ref)
+        _check(window, ref)
+
+def test_equal_timestamps_slope_zero():
+    window = RollingWindow(4)
+    for k in range(6):
+        window.append(Sample(ts=1.77e9, temp=50.0 + k, vr_temp=60.0, err=0.1, freq=500, vcore=1150))
+    assert window.slope("temp") == 0.0
+
+def test_clear_then_refill():
+    rng = random.Random(7)
+    window = RollingWindow(10)
+    ref = deque(maxlen=10)
+    samples = list(_stream(rng, 60))
+    for s in samples[:25]:
+        window.append(s)
+    window.clear()
+    assert len(window) == 0
+    for s in samples[25:]:
+        window.append(s)
+        ref.append(s)
+        _check(window, ref)
@@ -0,0 +1,75 @@
+# test_rollup.py
+# Tier compaction: hour buckets follow local wall-clock hours (also in zones with a
+# half-hour UTC offset), APPLY outcome lines are not decisions, and applyFailed counts
+# failed requests only (apply_failed, or a pre-queue "<reason>|apply_failed" decision).
+import os
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import log_reader
+from log_utils import DECISIONS_HEADER, METRICS_HEADER, fmt_ts
+from rollup import DECISIONS_ROLLUP_HEADER, compact_decisions, compact_metrics
+
+@pytest.fixture
+def ist():
+    """Local time +05:30 (POSIX TZ string, no tz database needed)."""
+    if not hasattr(time, "tzset"):
+        pytest.skip("time.tzset() is Unix only")
+    old = os.environ.get("TZ")
+    os.environ["TZ"] = "IST-5:30"
+    time.tzset()
+    log_reader._HOUR_BASE.clear()
+    yield
+    if old is None:
+        del os.environ["TZ"]
+    else:
+        os.environ["TZ"] = old
+    time.tzset()
+    log_reader._HOUR_BASE.clear()
+
+def _write_day(folder, header, stamps, body):
+    path = folder / f"{stamps[0]:%Y%m%d}.log"
+    path.write_text(header + "\n" + "".join(f"{fmt_ts(t)};{body}\n" for t in stamps), encoding="utf-8")
+    return path
+
+def test_compact_decisions_counts(tmp_path):
+    t = datetime(2026, 3, 1, 10, 0, 0)
+    lines = [
+        "80;60;0.1;0;500;1150;FREQ_DOWN;490;NA;temp_hard",
+        "80;60;0.1;0;490;1150;FREQ_DOWN;480;NA;temp_hard|apply_failed",
+        "NA;NA;NA;NA;490;1150;APPLY;480;NA;apply_failed",
+        "NA;NA;NA;NA;490;1150;APPLY;490;NA;apply_failed_verify",
+        "NA;NA;NA;NA;490;1150;APPLY;490;NA;apply_confirmed",
+        "55;50;0.1;0;490;1150;FREQ_UP;500;NA;margin",
+        "60;55;0.5;0;500;1150;NO_CHANGE;NA;NA;stable",
+    ]
+    day = tmp_path / "decisions" / "a" / "20260301.log"
+    day.parent.mkdir(parents=True)
+    day.write_text(DECISIONS_HEADER + "\n" + "".join(f"{fmt_ts(t)};{l}\n" for l in lines), encoding="utf-8")
+    compact_decisions(day)
+    header, row = (day.parent / "1h" / "2026.log").read_text(encoding="utf-8").splitlines()
+    assert header == DECISIONS_ROLLUP_HEADER
+    assert row == f"{fmt_ts(t)};4;2;1;0;0;1;2;500;1150"
+
+def test_hour_buckets_follow_local_midnight(tmp_path, ist):
+    # Two daily files around local midnight, rolled up one after the other: neither
+    # file's hour may straddle midnight, or the second day's first hour is dropped
+    before = [datetime(2026, 3, 1, 23, 0) + timedelta(minutes=5 * k) for k in range(12)]
+    after = [datetime(2026, 3, 2, 0, 0) + timedelta(minutes=5 * k) for k in range(12)]
+    device = tmp_path / "a"
+    device.mkdir()
+    for stamps in (before, after):
+        compact_metrics(_write_day(device, METRICS_HEADER, stamps, "60;55;0.1;500;1150"), keep_1m_months=0)
+    rows = (device / "1h" / "2026.log").read_text(encoding="utf-8").splitlines()[1:]
+    assert [r.split(";")[:2] for r in rows] == [["2026-03-01 23:00:00", "12"], ["2026-03-02 00:00:00", "12"]]
+    minutes = (device / "1m" / "202603.log").read_text(encoding="utf-8").splitlines()[1:]
+    assert minutes[0].startswith("2026-03-01 23:00:00;1;") and len(minutes) == 24
+
+    decisions = tmp_path / "decisions" / "a"
+    decisions.mkdir(parents=True)
+    for stamps in (before, after):
+        compact_decisions(_write_day(decisions, DECISIONS_HEADER, stamps, "60;55;0.1;0;500;1150;NO_CHANGE;NA;NA;stable"))
+    rows = (decisions / "1h" / "2026.log").read_text(encoding="utf-8").splitlines()[1:]
+    assert [r.split(";")[:2] for r in rows] == [["2026-03-01 23:00:00", "12"], ["2026-03-02 00:00:00", "12"]]
@@ -0,0 +1,91 @@
+# test_rules.py
+# The compiled default rule table must decide exactly what decision_engine.decide()
+# does: same action, new settings, reason and stats, for list and RollingWindow
+# windows, with and without ramp-up and the drift rule.
+import random
+
+import pytest
+
+from backtest import DEFAULT_CFG
+from config_loader import load_config
+from decision_engine import decide
+from history import MultiResHistory
+from models import Sample
+from rolling import RollingWindow
+from rules import DEFAULT_RULES, compile_rules
+
+def _cfg(rng):
+    cfg = dict(DEFAULT_CFG, window_n_min_valid=8)
+    cfg["allow_ramp_up"] = rng.random() < 0.5
+    if rng.random() < 0.5:
+        cfg.update(drift_horizon_s=rng.choice([1800, 7200]), drift_level="1m", drift_min_buckets=4)
+    return cfg
+
+def _value(rng, cfg, keys, lo, hi):
+    # A third of the values sit exactly on a threshold
+    return cfg[rng.choice(keys)] if rng.random() < 0.33 else rng.uniform(lo, hi)
+
+def _stream(rng, cfg, n):
+    t = 1.77e9
+    freq = rng.choice([cfg["freq_min"], cfg["freq_min"] + 25, 500, cfg["freq_max"]])
+    vcore = rng.choice([cfg["vcore_min"], cfg["vcore_min"] + 10, 1150, cfg["vcore_max"]])
+    temp = _value(rng, cfg, ("asic_soft", "asic_hard"), 50, 72)
+    vr = _value(rng, cfg, ("vr_soft", "vr_hard"), 60, 86)
+    err = _value(rng, cfg, ("err_low", "err_high", "err_crit"), 0, 1.6)
+    rise = rng.choice([0.0, cfg["slope_limit"] * 5, rng.uniform(-0.1, 0.1)])
+    flat = rng.random() < 0.3  # constant values: averages land exactly on the threshold
+    out = []
+    for k in range(n):
+        t += 5
+        noise = 0.0 if flat else rng.gauss(0, 0.2)
+        out.append(Sample(ts=t, temp=temp + rise * k + noise, vr_temp=vr + noise, err=max(0.0, err + noise / 10),
+                          freq=freq, vcore=vcore))
+    return out
+
+@pytest.mark.parametrize("seed", range(6))
+def test_default_table_matches_decide(seed):
+    rng = random.Random(seed)
+    checked = 0
+    for _ in range(500):
+        cfg = _cfg(rng)
+        engine = compile_rules(cfg)
+        window_n = rng.choice([4, 12, 30])
+        samples = _stream(rng, cfg, rng.randint(1, 400))
+        history = MultiResHistory()
+        for s in samples:
+            history.append(s)
+        window = samples[-window_n:]
+        rolling = RollingWindow(window_n)
+        for s in samples:
+            rolling.append(s)
+        assert engine.decide(window, cfg, history) == decide(window, cfg, history)
+        assert engine.decide(rolling, cfg, history) == decide(rolling, cfg, history)
+        assert engine.decide(window, cfg) == decide(window, cfg)
+        checked += 1
+    assert checked == 500
+
+def test_batch_matches_single():
+    rng = random.Random(42)
+    cfg = _cfg(rng)
+    engine = compile_rules(cfg)
+    windows = [_stream(rng, cfg, 12) for _ in range(200)]
+    from rules import window_stats
+    stats = [window_stats(w, cfg) for w in windows]
+    assert engine.evaluate_batch(stats) == [decide(w, cfg) for w in windows]
+
+def test_shipped_config_table_is_default():
+    cfg = load_config("config.json")
+    assert cfg["engine"]["rules"] == DEFAULT_RULES
+
+@pytest.mark.parametrize("table", [
+    [{"reason": "x", "all": [["temp_avg", ">=", "__import__('os')"]], "try": ["freq_down"]}],
+    [{"reason": "x", "all": [["temp_avg", "is", 60]], "try": ["freq_down"]}],
+    [{"reason": "x", "all": [["nope", ">=", 60]], "try": ["freq_down"]}],
+    [{"reason": "x", "all": [["temp_avg", ">=", float("nan")]], "try": ["freq_down"]}],
+    [{"reason": "x;y", "all": [["temp_avg", ">=", 60]], "try": ["freq_down"]}],
+    [{"reason": "x", "all": [["temp_avg", ">=", 60]], "try": ["reboot"]}],
+    [{"reason": "x", "all": [["temp_avg", ">=", 60]]}],
+])
+def test_invalid_tables_rejected(table):
+    with pytest.raises(ValueError):
+        compile_rules(dict(DEFAULT_CFG, rules=table))